@@ -0,0 +1,85 @@
+"""
+Бенчмарк создания согласия для классов разного размера (models.consent.create_consent_for_classes).
+
+В базе из DB_* у первого учителя создаются классы из --sizes учеников, и для каждого
+--repeat раз создается согласие. Для каждого размера выводятся задержки и число запросов
+к базе данных за вызов: оно не должно зависеть от числа учеников.
+Запуск (данные добавляются в базу - используйте тестовую базу с benchmarks.dataset):
+    python -m benchmarks.create_consent_bench --sizes 30 300 3000 --repeat 10
+"""
+import os
+
+# Число запросов считают замеряющие подключения utils.metrics
+os.environ.setdefault('METRICS_ENABLED', '1')
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.webhook_harness import percentiles
+from db.connection import close_pool, db_connection
+from models.consent import create_consent_for_classes
+from utils import metrics
+
+SIZES = (30, 300, 3000)
+
+
+def create_classes(sizes) -> dict:
+    """Создает по классу с заданным числом учеников у первого учителя из данных; возвращает {размер: class_id}."""
+    class_ids = {}
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT teacher_id FROM classes ORDER BY id LIMIT 1;")
+            teacher_id = cursor.fetchone()['teacher_id']
+            for size in sizes:
+                cursor.execute("INSERT INTO classes (name, teacher_id) VALUES (%s, %s) RETURNING id;",
+                               (f"Бенчмарк, {size} учеников", teacher_id))
+                class_ids[size] = cursor.fetchone()['id']
+                cursor.execute("""
+                    INSERT INTO students (full_name, class_id)
+                    SELECT 'Ученик ' || n, %s FROM generate_series(1, %s) AS n;
+                """, (class_ids[size], size))
+        conn.commit()
+    return class_ids
+
+
+def run(sizes=SIZES, repeat: int = 10) -> list:
+    """Замеряет create_consent_for_classes для каждого размера класса; возвращает список результатов."""
+    deadline = (datetime.now(timezone.utc) + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+    results = []
+    for size, class_id in create_classes(sizes).items():
+        durations = []
+        queries = 0
+        for i in range(repeat):
+            # Вызов в этом же потоке: счетчик запросов хранится в contextvar
+            with metrics.count_queries() as counter:
+                started = time.perf_counter()
+                create_consent_for_classes(f"Бенчмарк {size}-{i}", "bench/create.pdf", deadline, [class_id])
+                durations.append(time.perf_counter() - started)
+            queries = max(queries, counter[0])
+        results.append({
+            'name': f"create_consent_for_classes[{size}_students]",
+            'iterations': len(durations),
+            **percentiles(durations),
+            'queries': queries if metrics.METRICS_ENABLED else None,
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк создания согласия для классов разного размера")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(SIZES), help="число учеников в классах")
+    parser.add_argument('--repeat', type=int, default=10, help="число согласий на каждый размер")
+    args = parser.parse_args()
+    try:
+        print(json.dumps(run(args.sizes, args.repeat), ensure_ascii=False, indent=2))
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Генератор синтетических данных школы для бенчмарков.
+
+Создает N школ: учителя, классы, ученики, родители (часть - незарегистрированные "заглушки",
+часть - родители нескольких учеников), история согласий за год и записи о сдаче с
+реалистичным распределением статусов. Генерация детерминирована (--seed): одинаковые
+параметры дают одинаковые данные, и результаты бенчмарков разных коммитов сравнимы.
+
+Данные загружаются через COPY в базу из DB_* (.env). Все прежние данные пользователей,
+классов и согласий удаляются, поэтому используйте отдельную базу, например:
+    DB_NAME=consent_pro_bench python -m benchmarks.dataset --schools 5 --seed 42 --reset
+Схема должна быть создана заранее (db/init.sql и python -m db.migrate).
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.connection import get_db_connection
+
+TEACHER_ROLE_ID = 2
+PARENT_ROLE_ID = 3
+
+# Распределение статусов: у обработанных (истекших) согласий и у открытых
+EXPIRED_STATUSES = (('Сдано', 0.78), ('Отказался', 0.05), ('Не идет', 0.02), ('Просрочено', 0.15))
+OPEN_STATUSES = (('Сдано', 0.55), ('Отказался', 0.04), ('Не идет', 0.01), ('Не сдано', 0.40))
+
+LAST_NAMES = ("Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+              "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров")
+FIRST_NAMES = ("Александр", "Мария", "Михаил", "Анна", "Артем", "София", "Иван", "Виктория",
+               "Дмитрий", "Полина", "Максим", "Алиса", "Лев", "Ева", "Матвей", "Варвара")
+CONSENT_NAMES = ("Экскурсия в музей", "Поездка в театр", "Медицинский осмотр", "Спортивные соревнования",
+                 "Олимпиада", "Выездной лагерь", "Фотосъемка класса", "Обработка персональных данных")
+
+# Таблицы, которые очищаются перед загрузкой (зависимые таблицы очищаются каскадом)
+_TRUNCATE_TABLES = ('consent_submissions', 'consents', 'parents', 'students', 'classes', 'users',
+                    'analytics_dirty_consents')
+
+
+def _pick_status(rng: random.Random, distribution: tuple) -> str:
+    value = rng.random()
+    for status, share in distribution:
+        value -= share
+        if value < 0:
+            return status
+    return distribution[-1][0]
+
+
+def generate(schools: int = 5, teachers_per_school: int = 10, classes_per_teacher: int = 2,
+             students_per_class: int = 25, consents_per_class: int = 30, seed: int = 42,
+             now: datetime = None) -> dict:
+    """
+    Генерирует данные в памяти. Возвращает словарь таблиц (списки кортежей в порядке столбцов COPY)
+    и границу processed_until для deadline_expiry_state.
+    """
+    rng = random.Random(seed)
+    # Время сдачи - отдельным генератором, чтобы остальные данные не зависели от него
+    timing_rng = random.Random(seed + 1)
+    now = now or datetime.now(timezone.utc).replace(microsecond=0)
+    tables = {name: [] for name in ('users', 'classes', 'students', 'parents', 'consents',
+                                    'consent_submissions', 'consent_expirations')}
+    # Дедлайны старше этой границы уже обработаны check_deadlines; более поздние он обработает при замере
+    processed_until = now - timedelta(days=2)
+    user_id = class_id = student_id = consent_id = submission_id = 0
+    telegram_id = 100_000_000
+
+    for school in range(schools):
+        for _ in range(teachers_per_school):
+            user_id += 1
+            telegram_id += 1
+            teacher_id = user_id
+            tables['users'].append((teacher_id, telegram_id, TEACHER_ROLE_ID))
+
+            for class_index in range(classes_per_teacher):
+                class_id += 1
+                grade = rng.randint(1, 11)
+                tables['classes'].append((class_id, f"Школа {school + 1}, {grade}{'АБВГ'[class_index % 4]}", teacher_id))
+
+                class_students = []
+                previous_parent = None
+                for _ in range(students_per_class):
+                    student_id += 1
+                    class_students.append(student_id)
+                    tables['students'].append((
+                        student_id,
+                        f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {student_id}",
+                        class_id,
+                    ))
+                    # Примерно у 10% учеников тот же родитель, что у предыдущего (братья и сестры в классе)
+                    if previous_parent is not None and rng.random() < 0.10:
+                        tables['parents'].append((previous_parent, student_id))
+                        continue
+                    # От одного до двух родителей; ~15% еще не зарегистрированы в боте
+                    for _ in range(1 if rng.random() < 0.6 else 2):
+                        user_id += 1
+                        if rng.random() < 0.15:
+                            parent_telegram_id = 0
+                        else:
+                            telegram_id += 1
+                            parent_telegram_id = telegram_id
+                        tables['users'].append((user_id, parent_telegram_id, PARENT_ROLE_ID))
+                        tables['parents'].append((user_id, student_id))
+                        previous_parent = user_id
+
+                for consent_index in range(consents_per_class):
+                    consent_id += 1
+                    if consent_index == 0:
+                        # Дедлайн через 3 дня: попадает в check_upcoming_deadlines
+                        deadline = now + timedelta(days=3)
+                    elif consent_index == 1:
+                        # Дедлайн прошел после processed_until: его обработает check_deadlines
+                        deadline = now - timedelta(hours=rng.randint(1, 40))
+                    else:
+                        deadline = now - timedelta(days=rng.randint(-30, 365))
+                    created_at = deadline - timedelta(days=rng.randint(7, 21), seconds=rng.randint(0, 86400))
+                    tables['consents'].append((
+                        consent_id,
+                        f"{rng.choice(CONSENT_NAMES)} №{consent_id}",
+                        f"bench/{consent_id:06d}.pdf",
+                        deadline.isoformat(),
+                        class_id,
+                        created_at.isoformat(),
+                    ))
+                    expired = deadline <= processed_until
+                    if expired:
+                        tables['consent_expirations'].append((consent_id, now.isoformat()))
+                    for student in class_students:
+                        submission_id += 1
+                        status = _pick_status(rng, EXPIRED_STATUSES if expired else OPEN_STATUSES)
+                        submitted = f"bench/{consent_id:06d}-{student}.pdf" if status in ('Сдано', 'Отказался') else None
+                        if submitted:
+                            # Большинство сдает в первые дни, остальные - ближе к дедлайну
+                            window = max(0.0, (min(deadline, now) - created_at).total_seconds())
+                            updated_at = created_at + timedelta(seconds=window * timing_rng.random() ** 2)
+                        elif status == 'Просрочено':
+                            updated_at = deadline
+                        else:
+                            updated_at = created_at
+                        tables['consent_submissions'].append((submission_id, student, consent_id, status, submitted,
+                                                              updated_at.isoformat()))
+
+    return {'tables': tables, 'processed_until': processed_until.isoformat(), 'seed': seed, 'now': now.isoformat()}
+
+
+_COPY_COLUMNS = {
+    'users': 'users (id, telegram_id, role_id)',
+    'classes': 'classes (id, name, teacher_id)',
+    'students': 'students (id, full_name, class_id)',
+    'parents': 'parents (user_id, student_id)',
+    'consents': 'consents (id, name, file_path, deadline, class_id, created_at)',
+    'consent_submissions': 'consent_submissions (id, student_id, consent_id, status, submitted_file_path, updated_at)',
+    'consent_expirations': 'consent_expirations (consent_id, summary_sent_at)',
+}
+_SEQUENCE_TABLES = ('users', 'classes', 'students', 'consents', 'consent_submissions')
+
+
+def _copy(cursor, table: str, rows: list):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join('\\N' if value is None else str(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    cursor.copy_expert(f"COPY {_COPY_COLUMNS[table]} FROM STDIN", buffer)
+
+
+def load(dataset: dict, reset: bool = False) -> dict:
+    """
+    Загружает сгенерированные данные в базу одной транзакцией.
+    Без reset отказывается работать, если в базе уже есть пользователи.
+    Возвращает число строк по таблицам.
+    """
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM users) AS has_users;")
+            if cursor.fetchone()['has_users'] and not reset:
+                raise RuntimeError("База данных не пуста. Укажите --reset, чтобы удалить данные (только для тестовой базы!).")
+            cursor.execute(f"TRUNCATE {', '.join(_TRUNCATE_TABLES)} RESTART IDENTITY CASCADE;")
+            for table in _COPY_COLUMNS:
+                _copy(cursor, table, dataset['tables'][table])
+            for table in _SEQUENCE_TABLES:
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table};")
+            cursor.execute("""
+                INSERT INTO deadline_expiry_state (id, processed_until) VALUES (TRUE, %s)
+                ON CONFLICT (id) DO UPDATE SET processed_until = EXCLUDED.processed_until;
+            """, (dataset['processed_until'],))
+        conn.commit()
+        # ANALYZE вне транзакции загрузки: планировщик должен видеть реальные объемы
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("ANALYZE;")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    return {table: len(rows) for table, rows in dataset['tables'].items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка синтетических данных для бенчмарков")
+    parser.add_argument('--schools', type=int, default=5)
+    parser.add_argument('--teachers-per-school', type=int, default=10)
+    parser.add_argument('--classes-per-teacher', type=int, default=2)
+    parser.add_argument('--students-per-class', type=int, default=25)
+    parser.add_argument('--consents-per-class', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help="удалить существующие данные")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    dataset = generate(args.schools, args.teachers_per_school, args.classes_per_teacher,
+                       args.students_per_class, args.consents_per_class, args.seed)
+    counts = load(dataset, reset=args.reset)
+    print(json.dumps({'seed': args.seed, 'rows': counts, 'seconds': round(time.perf_counter() - started, 2)},
+                     ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Микробенчмарк анализа документов: прежний алгоритм (конкатенация текста и поиск
+каждого слова-маркера отдельным проходом) против постраничного однопроходного поиска
+с ранней остановкой.
+
+Синтетические PDF и DOCX на 1-200 страниц создаются во временной папке.
+Запуск: python -m benchmarks.document_analyzer_bench
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+from docx import Document
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.document_analyzer import REFUSAL_KEYWORDS, analyze_document_details
+
+PAGE_COUNTS = (1, 10, 50, 200)
+PARAGRAPHS_PER_PAGE = 12
+FILLER = (
+    "Я, законный представитель обучающегося, ознакомлен с программой мероприятия, "
+    "сроками проведения и условиями участия. Сведения о противопоказаниях сообщены классному руководителю. "
+)
+REFUSAL_SENTENCE = "Я не даю согласие на участие моего ребенка в мероприятии."
+
+
+def _page_paragraphs(page_index: int, refusal_page: int):
+    paragraphs = [f"{FILLER} Страница {page_index + 1}, пункт {i + 1}." for i in range(PARAGRAPHS_PER_PAGE)]
+    if page_index == refusal_page:
+        paragraphs.insert(1, REFUSAL_SENTENCE)
+    return paragraphs
+
+
+def make_pdf(path: str, pages: int, refusal_page: int = None):
+    doc = fitz.open()
+    for page_index in range(pages):
+        page = doc.new_page()
+        html = "".join(f"<p>{text}</p>" for text in _page_paragraphs(page_index, refusal_page))
+        page.insert_htmlbox(fitz.Rect(40, 40, 555, 800), html)
+    doc.save(path)
+    doc.close()
+
+
+def make_docx(path: str, pages: int, refusal_page: int = None):
+    doc = Document()
+    for page_index in range(pages):
+        for text in _page_paragraphs(page_index, refusal_page):
+            doc.add_paragraph(text)
+    doc.save(path)
+
+
+def legacy_analyze(file_path: str) -> str:
+    """Алгоритм analyze_document до перехода на однопроходный поиск (для сравнения)."""
+    text = ""
+    if file_path.endswith('.pdf'):
+        doc = fitz.open(file_path)
+        for page in doc:
+            text += page.get_text()
+        doc.close()
+    else:
+        doc = Document(file_path)
+        for paragraph in doc.paragraphs:
+            text += paragraph.text + "\n"
+    text_lower = text.lower()
+    for keyword in REFUSAL_KEYWORDS:
+        if keyword in text_lower:
+            return "Отказался"
+    return "Сдано"
+
+
+def _time(func, path: str, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(path)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(page_counts=PAGE_COUNTS, repeat: int = 3) -> list:
+    """Возвращает список результатов: формат, число страниц, сценарий, время старого и нового алгоритма."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for file_format, make in (('pdf', make_pdf), ('docx', make_docx)):
+            for pages in page_counts:
+                # Без отказа документ читается целиком; с отказом на первой странице - ранняя остановка
+                for scenario, refusal_page in (('no_refusal', None), ('refusal_on_first_page', 0)):
+                    path = os.path.join(tmp_dir, f"{scenario}_{pages}.{file_format}")
+                    make(path, pages, refusal_page)
+                    legacy = _time(legacy_analyze, path, repeat)
+                    current = _time(analyze_document_details, path, repeat)
+                    results.append({
+                        'name': f"analyze_document[{file_format},{pages}p,{scenario}]",
+                        'format': file_format,
+                        'pages': pages,
+                        'scenario': scenario,
+                        'legacy_seconds': round(legacy, 6),
+                        'seconds': round(current, 6),
+                        'speedup': round(legacy / current, 2) if current else None,
+                        'bytes': os.path.getsize(path),
+                    })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(run(), ensure_ascii=False, indent=2))
@@ -0,0 +1,178 @@
+"""
+Заглушка Telegram Bot API в том же процессе, что и бот (tornado на общем цикле событий).
+
+Поддерживает методы, которыми пользуется бот: getMe, getUpdates (длинный опрос из очереди
+обновлений), setWebhook/deleteWebhook, sendMessage, sendDocument, editMessageText,
+editMessageReplyMarkup, answerCallbackQuery, getFile, а также скачивание файлов по
+/file/bot<token>/<file_path>. На остальные методы отвечает успешно.
+
+Бот направляется в заглушку параметрами base_url и base_file_url (см. bot.main.build_application).
+Ответы бота запоминаются по chat_id: стенд может дождаться очередного ответа (next_reply)
+или посчитать время ответов (replies).
+"""
+import asyncio
+import json
+import socket
+import time
+from collections import defaultdict, deque
+
+from tornado.web import Application as TornadoApplication, RequestHandler
+
+FAKE_TOKEN = '123456:HARNESS'
+
+# Методы, которыми бот отвечает пользователю
+REPLY_METHODS = ('sendMessage', 'sendDocument', 'editMessageText', 'editMessageReplyMarkup')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class FakeBotApi:
+    """
+    Заглушка Bot API: на любой метод отвечает успешно, для методов отправки возвращает сообщение
+    и запоминает время ответа по chat_id.
+    """
+
+    def __init__(self, token: str = FAKE_TOKEN):
+        self.token = token
+        self.port = None
+        self.calls = defaultdict(int)
+        self.replies = defaultdict(deque)
+        self.reply_event = asyncio.Event()
+        self.files = {}
+        self._reply_queues = defaultdict(asyncio.Queue)
+        self._updates = asyncio.Queue()
+        self._server = None
+        self._message_id = 0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    @property
+    def base_file_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/file/bot"
+
+    def add_file(self, file_id: str, content: bytes, extension: str = '') -> dict:
+        """Регистрирует файл, который бот сможет получить через getFile; возвращает объект Document для обновления."""
+        file_path = f"documents/{file_id}{extension}"
+        self.files[file_id] = (file_path, content)
+        return {'file_id': file_id, 'file_unique_id': f"u{file_id}", 'file_size': len(content)}
+
+    def push_update(self, update: dict):
+        """Ставит обновление в очередь для getUpdates (режим polling)."""
+        self._updates.put_nowait(update)
+
+    async def next_reply(self, chat_id: int, timeout: float = 30.0) -> dict:
+        """Ждет очередной ответ бота в чат; возвращает {'method', 'params', 'at'}."""
+        return await asyncio.wait_for(self._reply_queues[chat_id].get(), timeout=timeout)
+
+    def _params(self, handler: RequestHandler) -> dict:
+        if handler.request.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(handler.request.body or b'{}')
+        params = {}
+        for name in handler.request.body_arguments:
+            value = handler.get_body_argument(name)
+            try:
+                params[name] = json.loads(value)
+            except ValueError:
+                params[name] = value
+        return params
+
+    def _message(self, chat_id, params: dict) -> dict:
+        self._message_id += 1
+        return {'message_id': params.get('message_id') or self._message_id, 'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'}, 'text': params.get('text', '')}
+
+    async def handle(self, handler: RequestHandler, method: str):
+        self.calls[method] += 1
+        params = self._params(handler)
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'ConsentPro', 'username': 'consentpro_harness_bot',
+                    'can_join_groups': False, 'can_read_all_group_messages': False, 'supports_inline_queries': False}
+        if method == 'getUpdates':
+            return await self._get_updates(float(params.get('timeout') or 0), int(params.get('limit') or 100))
+        if method == 'getFile':
+            file_id = params.get('file_id')
+            file_path, content = self.files[file_id]
+            return {'file_id': file_id, 'file_unique_id': f"u{file_id}", 'file_size': len(content), 'file_path': file_path}
+        if method.startswith('send') or method.startswith('edit'):
+            chat_id = params.get('chat_id')
+            replied_at = time.perf_counter()
+            self.replies[chat_id].append(replied_at)
+            self.reply_event.set()
+            self._reply_queues[chat_id].put_nowait({'method': method, 'params': params, 'at': replied_at})
+            return self._message(chat_id, params)
+        return True
+
+    async def _get_updates(self, timeout: float, limit: int) -> list:
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            return []
+        while len(updates) < limit and not self._updates.empty():
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    def listen(self, port: int = None):
+        api = self
+        self.port = port or free_port()
+
+        class MethodHandler(RequestHandler):
+            async def post(self, token, method):
+                self.write({'ok': True, 'result': await api.handle(self, method)})
+
+            get = post
+
+        class FileHandler(RequestHandler):
+            def get(self, token, file_path):
+                for path, content in api.files.values():
+                    if path == file_path:
+                        self.write(content)
+                        return
+                self.send_error(404)
+
+        self._server = TornadoApplication([
+            (r'/bot([^/]+)/(\w+)', MethodHandler),
+            (r'/file/bot([^/]+)/(.+)', FileHandler),
+        ]).listen(self.port, address='127.0.0.1')
+
+    def stop(self):
+        if self._server is not None:
+            self._server.stop()
+
+
+def message_update(update_id: int, chat_id: int, text: str = None, document: dict = None, file_name: str = None) -> dict:
+    """Обновление с сообщением пользователя: текст (команды размечаются как bot_command) или документ."""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': chat_id, 'type': 'private', 'first_name': 'Test'},
+        'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+    }
+    if text is not None:
+        message['text'] = text
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+    if document is not None:
+        message['document'] = dict(document, file_name=file_name)
+    return {'update_id': update_id, 'message': message}
+
+
+def callback_update(update_id: int, chat_id: int, data: str, message_id: int = 1) -> dict:
+    """Обновление с нажатием inline-кнопки."""
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Test'},
+            'chat_instance': str(chat_id),
+            'data': data,
+            'message': {'message_id': message_id, 'date': int(time.time()),
+                        'chat': {'id': chat_id, 'type': 'private'}, 'text': ''},
+        },
+    }
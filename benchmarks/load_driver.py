@@ -0,0 +1,294 @@
+"""
+Сценарная нагрузка на обработчики бота через заглушку Bot API (benchmarks.fake_bot_api).
+
+Бот (bot.main.build_application) запускается в этом же процессе и работает с настоящей базой
+данных; обновления доставляются через webhook или getUpdates заглушки. Каждый виртуальный
+родитель проходит сценарий:
+  1. /my_consents; если есть кнопка "Показать еще" - нажимает ее (шаг my_consents_next_page);
+  2. /submit_consent <ID>; если бот просит выбрать ребенка - выбирает первого (шаг choose_child);
+  3. отправляет подписанный PDF и ждет итогового ответа после анализа (шаг submit_file).
+Для каждого шага считаются время до ответа бота (p50/p95/p99/max) и ошибки, для всего
+прогона - пропускная способность.
+
+Сценарий my_consents (--scenario my_consents) выполняет только шаг 1: это проверка p99 задержки
+/my_consents при одновременной работе многих родителей. С --compare-serial тот же прогон
+выполняется дважды - с последовательной обработкой обновлений (BOT_CONCURRENT_UPDATES=1, как
+до переноса запросов в пул потоков) и с настройками по умолчанию; с --max-p99-ms прогон
+завершается с кодом 1, если p99 /my_consents при настройках по умолчанию больше порога.
+
+Родители берутся из базы (зарегистрированные пользователи с ролью "Родитель"), поэтому
+сначала загрузите данные: DB_NAME=consent_pro_bench python -m benchmarks.dataset --reset
+Сценарий меняет статусы сдачи, используйте отдельную базу.
+
+Запуск:
+    DB_NAME=consent_pro_bench python -m benchmarks.load_driver --parents 2000 --concurrency 200
+    DB_NAME=consent_pro_bench python -m benchmarks.load_driver --mode polling --persistence memory
+    DB_NAME=consent_pro_bench python -m benchmarks.load_driver --scenario my_consents --parents 200 \
+        --concurrency 200 --compare-serial --max-p99-ms 500
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import fitz  # PyMuPDF
+import httpx
+from telegram.ext import DictPersistence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_bot_api import FAKE_TOKEN, FakeBotApi, callback_update, free_port, message_update
+from benchmarks.webhook_harness import WEBHOOK_PATH, WEBHOOK_SECRET, percentiles
+
+STEPS = ('my_consents', 'my_consents_next_page', 'submit_consent', 'choose_child', 'submit_file')
+SCENARIOS = ('full', 'my_consents')
+
+
+def load_parents(count: int) -> list:
+    """Зарегистрированные родители и по одному согласию их ребенка (предпочтительно еще не сданному)."""
+    from db.connection import db_connection
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT * FROM (
+                    SELECT DISTINCT ON (u.id) u.telegram_id, cs.consent_id
+                    FROM users u
+                    JOIN roles r ON r.id = u.role_id AND r.name = 'Родитель'
+                    JOIN parents p ON p.user_id = u.id
+                    JOIN consent_submissions cs ON cs.student_id = p.student_id
+                    WHERE u.telegram_id <> 0
+                    ORDER BY u.id, (cs.status = 'Не сдано') DESC, cs.consent_id DESC
+                ) AS candidates
+                ORDER BY telegram_id
+                LIMIT %s;
+            """, (count,))
+            return cursor.fetchall()
+
+
+def make_signed_pdf(label: str) -> bytes:
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), f"Согласие подписано. {label}", fontsize=12)
+    content = doc.tobytes()
+    doc.close()
+    return content
+
+
+class LoadDriver:
+    """Прогоняет сценарии родителей и собирает время шагов."""
+
+    def __init__(self, api: FakeBotApi, deliver, step_timeout: float = 60.0, scenario: str = 'full'):
+        self.api = api
+        self.scenario = scenario
+        self.deliver = deliver
+        self.step_timeout = step_timeout
+        self.durations = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._update_ids = itertools.count(1)
+
+    async def step(self, name: str, chat_id: int, update: dict, until) -> dict:
+        """Отправляет обновление и ждет ответа бота, удовлетворяющего until; возвращает ответ или None."""
+        started = time.perf_counter()
+        await self.deliver(update)
+        deadline = started + self.step_timeout
+        try:
+            while True:
+                reply = await self.api.next_reply(chat_id, timeout=max(0.0, deadline - time.perf_counter()))
+                if until(reply):
+                    self.durations[name].append(reply['at'] - started)
+                    return reply
+        except asyncio.TimeoutError:
+            self.errors[name] += 1
+            return None
+
+    async def parent_flow(self, parent: dict, document: dict):
+        chat_id = parent['telegram_id']
+        is_message = lambda reply: reply['method'] in ('sendMessage', 'sendDocument')
+        reply = await self.step('my_consents', chat_id,
+                                message_update(next(self._update_ids), chat_id, '/my_consents'), is_message)
+        if reply is None:
+            return False
+        if self.scenario == 'my_consents':
+            return True
+
+        next_page = _button(reply, prefix='my_consents:')
+        if next_page:
+            await self.step('my_consents_next_page', chat_id,
+                            callback_update(next(self._update_ids), chat_id, next_page), is_message)
+
+        reply = await self.step('submit_consent', chat_id,
+                                message_update(next(self._update_ids), chat_id, f"/submit_consent {parent['consent_id']}"),
+                                is_message)
+        if reply is None:
+            return False
+        child = _button(reply)
+        if child:
+            reply = await self.step('choose_child', chat_id, callback_update(next(self._update_ids), chat_id, child),
+                                    lambda r: r['method'] == 'editMessageText')
+            if reply is None:
+                return False
+        if 'Отправьте' not in reply['params'].get('text', ''):
+            self.errors['submit_consent'] += 1
+            return False
+
+        # Первый ответ - подтверждение получения; ждем итогового ответа после анализа
+        reply = await self.step('submit_file', chat_id,
+                                message_update(next(self._update_ids), chat_id, document=document, file_name='signed.pdf'),
+                                lambda r: is_message(r) and 'идет проверка' not in r['params'].get('text', ''))
+        return reply is not None
+
+
+def _button(reply: dict, prefix: str = None):
+    markup = reply['params'].get('reply_markup') or {}
+    for row in markup.get('inline_keyboard', []):
+        for button in row:
+            data = button.get('callback_data')
+            if data and (prefix is None or data.startswith(prefix)):
+                return data
+    return None
+
+
+async def run(parents_count: int = 1000, concurrency: int = 100, mode: str = 'webhook',
+              persistence: str = 'postgres', unique_files: bool = False, step_timeout: float = 60.0,
+              scenario: str = 'full', concurrent_updates: int = None) -> dict:
+    """
+    Запускает заглушку Bot API и бота, прогоняет сценарии родителей и возвращает сводку.
+    concurrent_updates - сколько обновлений бот обрабатывает одновременно (по умолчанию - как в
+    рабочем режиме, BOT_CONCURRENT_UPDATES).
+    """
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', FAKE_TOKEN)
+    # Загруженные файлы - во временной папке
+    uploads_dir = tempfile.mkdtemp(prefix='consentpro-load-')
+    os.environ.setdefault('UPLOADS_DIR', uploads_dir)
+    from bot.main import build_application, BOT_CONCURRENT_UPDATES
+    if concurrent_updates is None:
+        concurrent_updates = BOT_CONCURRENT_UPDATES
+
+    parents = load_parents(parents_count)
+    if not parents:
+        raise RuntimeError("В базе нет зарегистрированных родителей: загрузите данные benchmarks.dataset.")
+
+    api = FakeBotApi()
+    api.listen()
+    shared_document = api.add_file('signed', make_signed_pdf('shared'), '.pdf')
+    documents = [api.add_file(f"signed-{i}", make_signed_pdf(str(i)), '.pdf') if unique_files else shared_document
+                 for i in range(len(parents))]
+
+    application = build_application(token=FAKE_TOKEN, base_url=api.base_url, base_file_url=api.base_file_url,
+                                    persistence=DictPersistence() if persistence == 'memory' else None,
+                                    concurrent_updates=concurrent_updates)
+    await application.initialize()
+    await application.start()
+
+    client = None
+    if mode == 'webhook':
+        webhook_port = free_port()
+        webhook_url = f"http://127.0.0.1:{webhook_port}/{WEBHOOK_PATH}"
+        await application.updater.start_webhook(listen='127.0.0.1', port=webhook_port, url_path=WEBHOOK_PATH,
+                                                webhook_url=webhook_url, secret_token=WEBHOOK_SECRET,
+                                                max_connections=100)
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        client = httpx.AsyncClient(limits=limits, timeout=30)
+
+        async def deliver(update):
+            await client.post(webhook_url, json=update, headers={'X-Telegram-Bot-Api-Secret-Token': WEBHOOK_SECRET})
+    else:
+        await application.updater.start_polling(poll_interval=0, timeout=1)
+
+        async def deliver(update):
+            api.push_update(update)
+
+    driver = LoadDriver(api, deliver, step_timeout, scenario)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def guarded(parent, document):
+        async with semaphore:
+            return await driver.parent_flow(parent, document)
+
+    started = time.perf_counter()
+    try:
+        outcomes = await asyncio.gather(*(guarded(parent, document) for parent, document in zip(parents, documents)))
+        duration = time.perf_counter() - started
+    finally:
+        if client is not None:
+            await client.aclose()
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        api.stop()
+
+    completed = sum(1 for outcome in outcomes if outcome)
+    updates = sum(len(durations) for durations in driver.durations.values()) + sum(driver.errors.values())
+    return {
+        'name': 'load_driver',
+        'mode': mode,
+        'persistence': persistence,
+        'parents': len(parents),
+        'concurrency': concurrency,
+        'unique_files': unique_files,
+        'scenario': scenario,
+        'concurrent_updates': concurrent_updates,
+        'duration_seconds': round(duration, 3),
+        'flows_completed': completed,
+        'flows_per_sec': round(completed / duration, 2) if duration else None,
+        'updates_per_sec': round(updates / duration, 1) if duration else None,
+        'steps': {
+            name: {'count': len(driver.durations[name]), 'errors': driver.errors[name], **percentiles(driver.durations[name])}
+            for name in STEPS if driver.durations[name] or driver.errors[name]
+        },
+        'bot_api_calls': dict(api.calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сценарная нагрузка родителей на бота через заглушку Bot API")
+    parser.add_argument('--parents', type=int, default=1000, help="число виртуальных родителей")
+    parser.add_argument('--concurrency', type=int, default=100, help="сколько родителей действуют одновременно")
+    parser.add_argument('--mode', choices=('webhook', 'polling'), default='webhook', help="способ доставки обновлений")
+    parser.add_argument('--persistence', choices=('postgres', 'memory'), default='postgres',
+                        help="где хранить состояние разговоров")
+    parser.add_argument('--unique-files', action='store_true',
+                        help="у каждого родителя свой файл (без попаданий в кэш анализа)")
+    parser.add_argument('--step-timeout', type=float, default=60.0, help="сколько секунд ждать ответа на шаг")
+    parser.add_argument('--scenario', choices=SCENARIOS, default='full',
+                        help="полный сценарий или только /my_consents")
+    parser.add_argument('--bot-concurrency', type=int, default=None,
+                        help="сколько обновлений бот обрабатывает одновременно (по умолчанию BOT_CONCURRENT_UPDATES)")
+    parser.add_argument('--compare-serial', action='store_true',
+                        help="сначала прогнать с последовательной обработкой обновлений, затем с заданной")
+    parser.add_argument('--max-p99-ms', type=float, default=None,
+                        help="код выхода 1, если p99 шага my_consents больше порога (мс)")
+    args = parser.parse_args()
+
+    def run_once(concurrent_updates):
+        return asyncio.run(run(args.parents, args.concurrency, args.mode, args.persistence, args.unique_files,
+                               args.step_timeout, args.scenario, concurrent_updates))
+
+    if args.compare_serial:
+        before = run_once(1)
+        after = run_once(args.bot_concurrency)
+        result = {'before': before, 'after': after}
+        before_p99 = before['steps'].get('my_consents', {}).get('p99_ms')
+        after_p99 = after['steps'].get('my_consents', {}).get('p99_ms')
+        if before_p99 and after_p99:
+            result['my_consents_p99_ratio'] = round(after_p99 / before_p99, 3)
+    else:
+        result = after = run_once(args.bot_concurrency)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    if args.max_p99_ms is not None:
+        step = after['steps'].get('my_consents', {})
+        p99 = step.get('p99_ms')
+        if p99 is None or step.get('errors') or p99 > args.max_p99_ms:
+            print(f"p99 /my_consents {p99} мс (ошибок: {step.get('errors')}) - больше порога {args.max_p99_ms} мс",
+                  file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Бенчмарк масштабирования отчетов: generate_status_report и generate_class_statistics_report
+на данных benchmarks.dataset разного объема (--schools).
+
+Для каждого объема данные загружаются заново, снимки статистики пересчитываются полностью,
+и отчеты вызываются --repeat раз. Выводятся задержки и число запросов к базе данных за вызов:
+с ростом числа классов и согласий число запросов не должно меняться.
+Запуск (данные в базе удаляются - используйте отдельную базу):
+    DB_NAME=consent_pro_bench python -m benchmarks.report_scaling_bench --schools 1 5 20
+"""
+import os
+
+# Число запросов считают замеряющие подключения utils.metrics
+os.environ.setdefault('METRICS_ENABLED', '1')
+
+import argparse
+import json
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import dataset
+from benchmarks.webhook_harness import percentiles
+from db.connection import close_pool, db_connection
+from utils import metrics
+from utils.analytics import refresh_snapshots
+from utils.reports import generate_status_report, generate_class_statistics_report
+
+SCHOOLS = (1, 5, 20)
+
+
+def measure(func, args_list: list) -> dict:
+    """Вызывает func для каждого набора аргументов; возвращает задержки и наибольшее число запросов за вызов."""
+    durations = []
+    queries = 0
+    for args in args_list:
+        # Вызов в этом же потоке: счетчик запросов хранится в contextvar
+        with metrics.count_queries() as counter:
+            started = time.perf_counter()
+            func(*args)
+            durations.append(time.perf_counter() - started)
+        queries = max(queries, counter[0])
+    return {'iterations': len(durations), **percentiles(durations),
+            'queries': queries if metrics.METRICS_ENABLED else None}
+
+
+def _consent_ids(count: int, rng: random.Random) -> list:
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM consents ORDER BY id;")
+            ids = [row['id'] for row in cursor.fetchall()]
+    return rng.sample(ids, min(count, len(ids)))
+
+
+def run(schools=SCHOOLS, repeat: int = 20, seed: int = 42) -> list:
+    """Замеряет оба отчета для каждого объема данных; возвращает список результатов."""
+    results = []
+    for school_count in schools:
+        rows = dataset.load(dataset.generate(schools=school_count, seed=seed), reset=True)
+        refresh_snapshots(full=True)
+        size = {'schools': school_count, 'classes': rows['classes'], 'consents': rows['consents']}
+        consent_ids = _consent_ids(repeat, random.Random(seed))
+        results.append({'name': f"generate_status_report[schools={school_count}]", **size,
+                        **measure(generate_status_report, [(i,) for i in consent_ids])})
+        results.append({'name': f"generate_class_statistics_report[schools={school_count}]", **size,
+                        **measure(generate_class_statistics_report, [()] * repeat)})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк масштабирования отчетов")
+    parser.add_argument('--schools', type=int, nargs='+', default=list(SCHOOLS), help="объемы данных (число школ)")
+    parser.add_argument('--repeat', type=int, default=20, help="число вызовов каждого отчета на объем")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    try:
+        print(json.dumps(run(args.schools, args.repeat, args.seed), ensure_ascii=False, indent=2))
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
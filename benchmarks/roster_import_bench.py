@@ -0,0 +1,148 @@
+"""
+Бенчмарк импорта списка класса (/import_roster): разбор и проверка файлов CSV и XLSX
+и, если указан класс, вставка в базу данных одной транзакцией.
+
+Синтетические файлы на --rows строк создаются во временной папке; XLSX записывается
+вручную (общие строки, как сохраняет Excel).
+Запуск:
+    python -m benchmarks.roster_import_bench --rows 5000
+    python -m benchmarks.roster_import_bench --rows 5000 --class-id 1 --teacher-id 2
+Во втором случае ученики действительно добавляются в класс (используйте тестовую базу).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+import zipfile
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.roster_import import parse_roster
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Список" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>'
+    '</Relationships>'
+)
+
+
+def make_rows(count: int) -> list:
+    """Строки списка с заголовком; имена уникальны в пределах запуска."""
+    run = uuid.uuid4().hex[:6]
+    rows = [['ФИО ученика', 'ФИО родителя']]
+    for i in range(count):
+        rows.append([f"Ученик Тестовый {run}-{i + 1}", f"Родитель Тестовый {run}-{i + 1}"])
+    return rows
+
+
+def make_csv(path: str, rows: list):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        csv.writer(f, delimiter=';').writerows(rows)
+
+
+def make_xlsx(path: str, rows: list):
+    shared = {}
+    sheet_rows = []
+    for row_index, row in enumerate(rows, start=1):
+        cells = []
+        for column_index, value in enumerate(row):
+            string_index = shared.setdefault(value, len(shared))
+            cells.append(f'<c r="{chr(ord("A") + column_index)}{row_index}" t="s"><v>{string_index}</v></c>')
+        sheet_rows.append(f'<row r="{row_index}">{"".join(cells)}</row>')
+    sheet = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             f'<sheetData>{"".join(sheet_rows)}</sheetData></worksheet>')
+    strings = "".join(f'<si><t>{escape(value)}</t></si>' for value in shared)
+    shared_strings = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                      '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                      f'count="{len(shared)}" uniqueCount="{len(shared)}">{strings}</sst>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archive.writestr('xl/worksheets/sheet1.xml', sheet)
+        archive.writestr('xl/sharedStrings.xml', shared_strings)
+
+
+def run(rows_count: int = 5000, class_id: int = None, teacher_id: int = None, repeat: int = 3) -> dict:
+    """Замеряет разбор CSV и XLSX (лучшее из repeat запусков) и, если указан класс, импорт в базу."""
+    results = {'name': 'roster_import', 'rows': rows_count, 'parse': {}}
+    rows = make_rows(rows_count)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        parsed = None
+        for extension, writer in (('.csv', make_csv), ('.xlsx', make_xlsx)):
+            path = os.path.join(tmp_dir, f"roster{extension}")
+            writer(path, rows)
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                parsed, rejected = parse_roster(path, max_rows=rows_count)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            results['parse'][extension.lstrip('.')] = {
+                'file_bytes': os.path.getsize(path),
+                'seconds': round(best, 4),
+                'rows_per_sec': round(len(parsed) / best, 1) if best else None,
+                'accepted': len(parsed),
+                'rejected': len(rejected),
+            }
+
+    if class_id is not None:
+        from models.student import import_students
+        started = time.perf_counter()
+        imported = import_students(class_id, teacher_id, parsed)
+        elapsed = time.perf_counter() - started
+        results['import'] = {
+            'seconds': round(elapsed, 4),
+            'rows_per_sec': round(imported['imported'] / elapsed, 1) if imported and elapsed else None,
+            'imported': imported['imported'] if imported else None,
+            'submissions': imported['submissions'] if imported else None,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк импорта списка класса")
+    parser.add_argument('--rows', type=int, default=5000, help="число учеников в файле")
+    parser.add_argument('--repeat', type=int, default=3, help="число повторов разбора")
+    parser.add_argument('--class-id', type=int, help="класс для вставки в базу данных (без него замеряется только разбор)")
+    parser.add_argument('--teacher-id', type=int, help="id учителя класса (users.id)")
+    args = parser.parse_args()
+    if args.class_id is not None and args.teacher_id is None:
+        parser.error("--class-id требует --teacher-id")
+
+    print(json.dumps(run(args.rows, args.class_id, args.teacher_id, args.repeat), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
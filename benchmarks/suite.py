@@ -0,0 +1,323 @@
+"""
+Набор бенчмарков путей данных бота с результатами в JSON.
+
+Загружает синтетические данные (benchmarks.dataset) в тестовую базу из DB_* и замеряет:
+  * get_consents_by_parent - первая и следующая страница для случайных родителей;
+  * refresh_snapshots - полный пересчет снимков статистики, пересчет после изменения части согласий
+    и запуск без изменений;
+  * generate_status_report, generate_progress_report, generate_class_statistics_report (по снимкам);
+    по --report-scaling - оба отчета на 1, 5 и 20 школах с числом запросов (benchmarks.report_scaling_bench);
+  * check_upcoming_deadlines - выборка согласий и подготовка напоминаний;
+  * check_deadlines - первый запуск (истечение дедлайнов) и повторный (обрабатывать нечего);
+  * create_consent - создание согласия с записями о сдаче для всего класса;
+  * create_consent_for_classes - то же для классов из 30, 300 и 3000 учеников (время и число запросов,
+    benchmarks.create_consent_bench);
+  * export_submissions - выгрузка всей школы в CSV и XLSX (время и пик памяти Python);
+  * analyze_document и разбор списка класса (без базы данных; benchmarks.document_analyzer_bench
+    и benchmarks.roster_import_bench);
+  * по --webhook - пропускную способность webhook-режима (benchmarks.webhook_harness).
+Сообщения не отправляются: вместо Telegram используется заглушка, лимиты рассылки сняты.
+
+Запуск (используйте отдельную базу - данные в ней удаляются):
+    DB_NAME=consent_pro_bench python -m benchmarks.suite --seed 42 --output results.json
+    python -m benchmarks.suite --skip-db --output results.json
+    python -m benchmarks.suite --compare old.json new.json
+"""
+import os
+
+# Рассылка не замеряется: ограничения частоты диспетчера снимаются до импорта utils.dispatcher
+os.environ.setdefault('NOTIFY_GLOBAL_RATE', '1000000')
+os.environ.setdefault('NOTIFY_PER_CHAT_RATE', '1000000')
+# Число запросов к базе данных считают замеряющие подключения utils.metrics
+os.environ.setdefault('METRICS_ENABLED', '1')
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.webhook_harness import percentiles
+
+
+class _NullBot:
+    """Заглушка бота для рассылок: считает сообщения и ничего не отправляет."""
+
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+class _JobContext:
+    """Минимальный контекст задачи JobQueue: задачам планировщика нужен только context.bot."""
+
+    def __init__(self, bot):
+        self.bot = bot
+
+
+def _timings(name: str, durations: list, **extra) -> dict:
+    result = {'name': name, 'iterations': len(durations)}
+    result.update(percentiles(durations))
+    if durations:
+        result['mean_ms'] = round(sum(durations) / len(durations) * 1000, 3)
+    result.update(extra)
+    return result
+
+
+def _measure(func, args_list: list) -> list:
+    durations = []
+    for args in args_list:
+        started = time.perf_counter()
+        func(*args)
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def _sample_ids(query: str, count: int, rng: random.Random) -> list:
+    from db.connection import db_connection
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query)
+            ids = [row['id'] for row in cursor.fetchall()]
+    return rng.sample(ids, min(count, len(ids)))
+
+
+async def _run_scheduler_benchmarks(repeat: int) -> list:
+    """Задачи планировщика в одном цикле событий (диспетчер рассылок общий для процесса)."""
+    from utils.scheduler import check_deadlines, check_upcoming_deadlines
+
+    results = []
+    bot = _NullBot()
+    context = _JobContext(bot)
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await check_upcoming_deadlines(context)
+        durations.append(time.perf_counter() - started)
+    results.append(_timings('check_upcoming_deadlines', durations, messages=bot.sent // repeat))
+
+    # Первый запуск обрабатывает согласия, истекшие после processed_until; повторные - нет
+    bot.sent = 0
+    started = time.perf_counter()
+    await check_deadlines(context)
+    results.append(_timings('check_deadlines[first_run]', [time.perf_counter() - started], messages=bot.sent))
+    durations = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await check_deadlines(context)
+        durations.append(time.perf_counter() - started)
+    results.append(_timings('check_deadlines[nothing_due]', durations))
+    return results
+
+
+def _run_export_benchmarks() -> list:
+    """Выгрузка всей школы: время одного прогона и пик памяти Python (отдельный прогон под tracemalloc)."""
+    from utils.export import export_submissions
+
+    results = []
+    for file_format in ('csv', 'xlsx'):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            file_path = os.path.join(tmp_dir, f"export.{file_format}")
+            started = time.perf_counter()
+            rows = export_submissions('school', file_format, file_path)
+            duration = time.perf_counter() - started
+            file_size = os.path.getsize(file_path)
+            tracemalloc.start()
+            try:
+                export_submissions('school', file_format, file_path)
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        results.append(_timings(f"export_submissions[school,{file_format}]", [duration], rows=rows,
+                                file_kb=file_size // 1024, peak_memory_kb=peak // 1024))
+    return results
+
+
+def _touch_consents(consent_ids: list):
+    """Отмечает согласия измененными для снимков статистики, не меняя данных."""
+    from db.connection import db_connection
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE consent_submissions SET updated_at = updated_at WHERE consent_id = ANY(%s);",
+                           (consent_ids,))
+        conn.commit()
+
+
+def _run_snapshot_benchmarks(consent_ids: list, rounds: int) -> list:
+    from utils.analytics import refresh_snapshots
+
+    results = []
+    started = time.perf_counter()
+    counts = refresh_snapshots(full=True)
+    results.append(_timings('refresh_snapshots[full]', [time.perf_counter() - started], **(counts or {})))
+
+    durations = []
+    batch = consent_ids[:20]
+    for _ in range(rounds):
+        _touch_consents(batch)
+        started = time.perf_counter()
+        counts = refresh_snapshots()
+        durations.append(time.perf_counter() - started)
+    results.append(_timings('refresh_snapshots[20_changed]', durations, **(counts or {})))
+    results.append(_timings('refresh_snapshots[nothing_changed]', _measure(refresh_snapshots, [()] * rounds)))
+    return results
+
+
+def run_db_benchmarks(iterations: int, rng: random.Random) -> list:
+    """Замеры на загруженных данных. Порядок важен: изменяющие данные замеры идут последними."""
+    from models.consent import get_consents_by_parent, create_consent
+    from benchmarks import create_consent_bench, report_scaling_bench
+    from utils.reports import generate_status_report, generate_progress_report, generate_class_statistics_report
+
+    results = []
+    parent_ids = _sample_ids("SELECT DISTINCT user_id AS id FROM parents ORDER BY 1;", iterations, rng)
+    consent_ids = _sample_ids("SELECT id FROM consents ORDER BY 1;", iterations, rng)
+    class_ids = _sample_ids("SELECT id FROM classes ORDER BY 1;", iterations, rng)
+
+    # Небольшие страницы, чтобы у части родителей была следующая страница
+    first_pages = []
+    durations = []
+    for parent_id in parent_ids:
+        started = time.perf_counter()
+        first_pages.append(get_consents_by_parent(parent_id, 10))
+        durations.append(time.perf_counter() - started)
+    results.append(_timings('get_consents_by_parent[first_page]', durations))
+    next_args = [(parent_id, 10, page['next_cursor'])
+                 for parent_id, page in zip(parent_ids, first_pages) if page['next_cursor']]
+    results.append(_timings('get_consents_by_parent[next_page]', _measure(get_consents_by_parent, next_args)))
+
+    results.extend(_run_snapshot_benchmarks(consent_ids, max(1, iterations // 10)))
+    # Отчеты по согласию и по классам - с числом запросов за вызов
+    results.append({'name': 'generate_status_report',
+                    **report_scaling_bench.measure(generate_status_report, [(i,) for i in consent_ids])})
+    results.append(_timings('generate_progress_report', _measure(generate_progress_report, [(i,) for i in consent_ids])))
+    results.append({'name': 'generate_class_statistics_report',
+                    **report_scaling_bench.measure(generate_class_statistics_report, [()] * max(1, iterations // 10))})
+
+    results.extend(_run_export_benchmarks())
+    results.extend(asyncio.run(_run_scheduler_benchmarks(max(1, iterations // 10))))
+
+    deadline = (datetime.now(timezone.utc) + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
+    create_args = [(f"Бенчмарк {i}", "bench/create.pdf", deadline, class_id) for i, class_id in enumerate(class_ids)]
+    results.append(_timings('create_consent', _measure(create_consent, create_args)))
+    results.extend(create_consent_bench.run(repeat=max(1, iterations // 20)))
+    return results
+
+
+def run_file_benchmarks() -> list:
+    """Замеры без базы данных: анализ документов и разбор списка класса."""
+    from benchmarks import document_analyzer_bench, roster_import_bench
+    results = document_analyzer_bench.run(page_counts=(1, 10, 50), repeat=3)
+    roster = roster_import_bench.run(5000)
+    for file_format, parse in roster['parse'].items():
+        results.append({'name': f"roster_parse[{file_format},{roster['rows']}rows]", **parse})
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(seed: int = 42, schools: int = 5, iterations: int = 200, skip_db: bool = False,
+        no_load: bool = False, webhook: bool = False, report_scaling: bool = False) -> dict:
+    rng = random.Random(seed)
+    report = {
+        'meta': {
+            'commit': _git_commit(),
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'seed': seed,
+            'schools': schools,
+            'iterations': iterations,
+        },
+        'results': [],
+    }
+    if not skip_db:
+        from benchmarks import dataset
+        from db.connection import close_pool
+        if not no_load:
+            started = time.perf_counter()
+            report['meta']['dataset_rows'] = dataset.load(dataset.generate(schools=schools, seed=seed), reset=True)
+            report['meta']['dataset_load_seconds'] = round(time.perf_counter() - started, 2)
+        try:
+            report['results'].extend(run_db_benchmarks(iterations, rng))
+            if report_scaling:
+                # Перезагружает данные, поэтому идет после остальных замеров
+                from benchmarks import report_scaling_bench
+                report['results'].extend(report_scaling_bench.run(seed=seed))
+        finally:
+            close_pool()
+    report['results'].extend(run_file_benchmarks())
+    if webhook:
+        from benchmarks.webhook_harness import run_local, make_updates
+        report['results'].append(asyncio.run(run_local(make_updates(2000), concurrency=50)))
+    return report
+
+
+def compare(old_path: str, new_path: str) -> list:
+    """Сравнивает два файла результатов по p50 (или seconds); возвращает строки с отношением нового к старому."""
+    def key_metric(result):
+        for field in ('p50_ms', 'seconds', 'processed_updates_per_sec'):
+            if result.get(field) is not None:
+                return field, result[field]
+        return None, None
+
+    with open(old_path, encoding='utf-8') as f:
+        old = {result['name']: result for result in json.load(f)['results']}
+    with open(new_path, encoding='utf-8') as f:
+        new = json.load(f)['results']
+    rows = []
+    for result in new:
+        field, value = key_metric(result)
+        previous = old.get(result['name'])
+        if previous is None or field is None or not previous.get(field):
+            continue
+        rows.append({'name': result['name'], 'metric': field, 'old': previous[field], 'new': value,
+                     'ratio': round(value / previous[field], 3)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Набор бенчмарков ConsentPro")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--schools', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=200, help="число вызовов на замер")
+    parser.add_argument('--skip-db', action='store_true', help="только замеры без базы данных")
+    parser.add_argument('--no-load', action='store_true', help="не перезагружать данные (уже загружены benchmarks.dataset)")
+    parser.add_argument('--webhook', action='store_true', help="добавить замер webhook-режима")
+    parser.add_argument('--report-scaling', action='store_true',
+                        help="добавить замер отчетов на 1, 5 и 20 школах (перезагружает данные)")
+    parser.add_argument('--output', help="файл для результатов JSON (по умолчанию - вывод в консоль)")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="сравнить два файла результатов")
+    args = parser.parse_args()
+
+    if args.compare:
+        print(json.dumps(compare(*args.compare), ensure_ascii=False, indent=2))
+        return
+
+    report = run(args.seed, args.schools, args.iterations, args.skip_db, args.no_load, args.webhook,
+                 args.report_scaling)
+    text = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
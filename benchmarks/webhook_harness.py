@@ -0,0 +1,200 @@
+"""
+Стенд для замера пропускной способности (обновлений в секунду) и задержек бота в режиме webhook
+без обращения к сети.
+
+Поднимает в одном процессе:
+  * заглушку Bot API (benchmarks.fake_bot_api) - бот обращается к ней вместо api.telegram.org;
+  * webhook-сервер бота (bot.main.build_application + Updater.start_webhook).
+Затем отправляет на webhook записанные или синтетические обновления и измеряет:
+  * ack - время ответа webhook-сервера (прием обновления в очередь);
+  * end_to_end - время от отправки обновления до ответа бота в заглушку Bot API.
+
+Синтетические обновления - команда /help из разных чатов (обработчик не обращается к базе данных).
+Записанные обновления передаются файлом JSON Lines (одно обновление Telegram в строке).
+
+Запуск:
+    python -m benchmarks.webhook_harness --count 2000 --concurrency 50 --duplicates 0.1
+    python -m benchmarks.webhook_harness --updates recorded.jsonl
+    python -m benchmarks.webhook_harness --url http://127.0.0.1:8443/<WEBHOOK_PATH_SECRET> --secret <WEBHOOK_SECRET_TOKEN>
+В последнем случае обновления отправляются уже запущенному боту и замеряется только ack.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict, deque
+
+import httpx
+from telegram.ext import DictPersistence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_bot_api import FAKE_TOKEN, FakeBotApi, free_port, message_update
+WEBHOOK_PATH = 'harness-webhook'
+WEBHOOK_SECRET = 'harness-secret'
+
+
+def percentiles(values: list) -> dict:
+    """Возвращает p50/p95/p99/max (в миллисекундах) для списка длительностей в секундах."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {'p50_ms': pick(0.50), 'p95_ms': pick(0.95), 'p99_ms': pick(0.99), 'max_ms': round(ordered[-1] * 1000, 3)}
+
+
+def make_updates(count: int, text: str = '/help', first_update_id: int = 1) -> list:
+    """Синтетические обновления: по одной команде из отдельного чата."""
+    return [message_update(first_update_id + i, 1_000_000 + i, text) for i in range(count)]
+
+
+def load_updates(path: str) -> list:
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _chat_id(update: dict):
+    for key in ('message', 'edited_message', 'callback_query'):
+        if key in update:
+            payload = update[key]
+            message = payload.get('message', payload)
+            return message.get('chat', {}).get('id')
+    return None
+
+
+async def post_updates(url: str, updates: list, concurrency: int, secret: str = None) -> dict:
+    """Отправляет обновления на webhook с ограниченной параллельностью; возвращает времена отправки и ack."""
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    queue = deque(updates)
+    sent_at = defaultdict(deque)
+    ack = []
+    errors = 0
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal errors
+            while queue:
+                update = queue.popleft()
+                started = time.perf_counter()
+                sent_at[_chat_id(update)].append(started)
+                try:
+                    response = await client.post(url, json=update, headers=headers)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                ack.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        duration = time.perf_counter() - started
+    return {'sent_at': sent_at, 'ack': ack, 'errors': errors, 'duration': duration}
+
+
+async def run_local(updates: list, concurrency: int = 20, duplicates: float = 0.0,
+                    max_connections: int = 40, wait_timeout: float = 30.0) -> dict:
+    """Запускает заглушку Bot API и webhook-сервер бота, отправляет обновления и возвращает сводку."""
+    os.environ.setdefault('TELEGRAM_BOT_TOKEN', FAKE_TOKEN)
+    from bot.main import build_application
+
+    # Часть обновлений отправляется повторно (как при повторной доставке Telegram)
+    payload = list(updates)
+    if duplicates:
+        payload += random.Random(0).sample(updates, int(len(updates) * duplicates))
+    expected_replies = len({update['update_id'] for update in updates})
+
+    webhook_port = free_port()
+    api = FakeBotApi()
+    api.listen()
+    # Состояние разговоров хранится в памяти: стенду не нужна база данных
+    application = build_application(token=FAKE_TOKEN, base_url=api.base_url, persistence=DictPersistence())
+    await application.initialize()
+    await application.start()
+    await application.updater.start_webhook(
+        listen='127.0.0.1',
+        port=webhook_port,
+        url_path=WEBHOOK_PATH,
+        webhook_url=f"http://127.0.0.1:{webhook_port}/{WEBHOOK_PATH}",
+        secret_token=WEBHOOK_SECRET,
+        max_connections=max_connections,
+    )
+    try:
+        started = time.perf_counter()
+        posted = await post_updates(f"http://127.0.0.1:{webhook_port}/{WEBHOOK_PATH}", payload, concurrency, WEBHOOK_SECRET)
+
+        # Ждем ответов бота на все уникальные обновления
+        deadline = time.perf_counter() + wait_timeout
+        while sum(len(times) for times in api.replies.values()) < expected_replies and time.perf_counter() < deadline:
+            api.reply_event.clear()
+            try:
+                await asyncio.wait_for(api.reply_event.wait(), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
+        total_duration = time.perf_counter() - started
+    finally:
+        await application.updater.stop()
+        await application.stop()
+        await application.shutdown()
+        api.stop()
+
+    end_to_end = []
+    for chat_id, replies in api.replies.items():
+        for sent, replied in zip(posted['sent_at'][chat_id], replies):
+            end_to_end.append(replied - sent)
+    replies_count = sum(len(times) for times in api.replies.values())
+    return {
+        'name': 'webhook_harness',
+        'updates': len(payload),
+        'unique_updates': expected_replies,
+        'duplicates_sent': len(payload) - len(updates),
+        'replies': replies_count,
+        'http_errors': posted['errors'],
+        'concurrency': concurrency,
+        'ack_updates_per_sec': round(len(payload) / posted['duration'], 1) if posted['duration'] else None,
+        'processed_updates_per_sec': round(replies_count / total_duration, 1) if total_duration else None,
+        'ack': percentiles(posted['ack']),
+        'end_to_end': percentiles(end_to_end),
+        'bot_api_calls': dict(api.calls),
+    }
+
+
+async def run_remote(url: str, updates: list, concurrency: int = 20, secret: str = None) -> dict:
+    """Отправляет обновления уже запущенному боту; замеряется только время ответа webhook."""
+    posted = await post_updates(url, updates, concurrency, secret)
+    return {
+        'name': 'webhook_harness_remote',
+        'updates': len(updates),
+        'http_errors': posted['errors'],
+        'concurrency': concurrency,
+        'ack_updates_per_sec': round(len(updates) / posted['duration'], 1) if posted['duration'] else None,
+        'ack': percentiles(posted['ack']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный стенд webhook-режима бота")
+    parser.add_argument('--updates', help="файл JSON Lines с записанными обновлениями")
+    parser.add_argument('--count', type=int, default=1000, help="число синтетических обновлений")
+    parser.add_argument('--concurrency', type=int, default=20, help="число параллельных HTTP-запросов")
+    parser.add_argument('--duplicates', type=float, default=0.0, help="доля повторно отправляемых обновлений")
+    parser.add_argument('--url', help="адрес webhook уже запущенного бота")
+    parser.add_argument('--secret', help="значение WEBHOOK_SECRET_TOKEN запущенного бота")
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates) if args.updates else make_updates(args.count)
+    if args.url:
+        result = asyncio.run(run_remote(args.url, updates, args.concurrency, args.secret))
+    else:
+        result = asyncio.run(run_local(updates, args.concurrency, args.duplicates))
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
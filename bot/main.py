@@ -1,5 +1,6 @@
 import logging
-from telegram.ext import Application, CommandHandler
+from telegram import Update
+from telegram.ext import Application, CommandHandler, CallbackQueryHandler, TypeHandler
 from dotenv import load_dotenv
 import os
 
@@ -20,17 +21,143 @@ if not TELEGRAM_BOT_TOKEN:
     logger.error("TELEGRAM_BOT_TOKEN не найден в переменных окружения!")
     exit(1)
 
+# Режим получения обновлений: polling (long polling) или webhook
+BOT_RUN_MODE = os.getenv('BOT_RUN_MODE', 'polling')
+# Параметры webhook. TLS завершается на прокси перед ботом, сам бот слушает HTTP.
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8443')))
+# Публичный адрес, на который Telegram отправляет обновления (например, https://bot.example.com)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+# Секретная часть пути webhook и секрет в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_PATH_SECRET = os.getenv('WEBHOOK_PATH_SECRET', '')
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN')
+# Сколько одновременных подключений Telegram может открыть к webhook (1-100)
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+# Сколько обновлений обрабатывать одновременно (обновления одного пользователя - всегда по очереди).
+# По умолчанию - по размеру пула подключений к базе данных, но не больше 32; 1 - строго по одному.
+BOT_CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES') or min(32, int(os.getenv('DB_POOL_MAX_SIZE', '10'))))
+# Адрес Bot API (для локального сервера Bot API или стенда нагрузочного тестирования)
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL')
+TELEGRAM_API_BASE_FILE_URL = os.getenv('TELEGRAM_API_BASE_FILE_URL')
+# Запущено несколько процессов бота (только в режиме webhook): состояние разговоров
+# хранится в базе данных, задачи по расписанию выполняет один ведущий процесс
+BOT_MULTI_WORKER = os.getenv('BOT_MULTI_WORKER', '0') == '1'
+
 # Импортируем обработчики
 from handlers.start import start
+from handlers.admin import add_teacher, remove_teacher
+from handlers.teacher import add_class, my_classes, add_student, import_roster_conv_handler
+from handlers.consent import upload_consent_conv_handler, get_template
+from handlers.parent import my_consents, my_consents_next_page, submit_consent_conv_handler, MY_CONSENTS_PAGE_PREFIX
+from handlers.reports import reports_conv_handler, progress, export_conv_handler
+from utils.deadline_timers import deadline_scheduler
+from db.connection import init_pool, close_pool
+from utils.analysis_pool import analysis_pool
+from utils.storage import collect_unreferenced_blobs_job
+from utils.analytics import refresh_snapshots_job, ANALYTICS_SNAPSHOT_TIME, ANALYTICS_SNAPSHOT_FIRST_DELAY
+from utils.update_dedup import drop_duplicate_updates, drop_duplicate_updates_shared, purge_processed_updates_job
+from utils.persistence import PostgresPersistence, refresh_conversations, save_after_update
+from utils.leader import LeaderElection
+from utils.user_cache_listener import user_cache_listener
+from utils.update_processor import PerUserUpdateProcessor
+from utils import metrics
 
 async def help_command(update, context):
     """Обработка команды /help"""
     await update.message.reply_text("Список доступных команд:\n/start - Начать работу\n/help - Показать список команд")
 
-def main():
-    """Запуск бота."""
-    # Создание приложения
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+# Задачи, которые должен выполнять только один процесс бота
+_LEADER_JOB_NAMES = ('storage-gc', 'processed-updates-purge', 'analytics-snapshots')
+
+async def start_leader_jobs(application: Application):
+    """Заводит таймеры дедлайнов и периодические задачи обслуживания (процесс стал ведущим)."""
+    await deadline_scheduler.start(application.job_queue)
+    # Раз в сутки удаляем из хранилища файлы, на которые больше нет ссылок
+    application.job_queue.run_repeating(collect_unreferenced_blobs_job, interval=24 * 60 * 60, first=60 * 60,
+                                        name='storage-gc')
+    # Снимки сводной статистики: раз в сутки и вскоре после получения лидерства (изменения с прошлого снимка)
+    application.job_queue.run_daily(refresh_snapshots_job, time=ANALYTICS_SNAPSHOT_TIME, name='analytics-snapshots')
+    application.job_queue.run_once(refresh_snapshots_job, when=ANALYTICS_SNAPSHOT_FIRST_DELAY, name='analytics-snapshots')
+    if BOT_MULTI_WORKER:
+        application.job_queue.run_repeating(purge_processed_updates_job, interval=60 * 60, first=60 * 60,
+                                            name='processed-updates-purge')
+
+async def stop_leader_jobs(application: Application):
+    """Снимает задачи ведущего процесса (лидерство потеряно)."""
+    deadline_scheduler.stop()
+    for name in _LEADER_JOB_NAMES:
+        for job in application.job_queue.get_jobs_by_name(name):
+            job.schedule_removal()
+
+async def post_init(application: Application):
+    """
+    Открывает пул подключений к базе данных перед началом обработки обновлений и запускает
+    выбор ведущего процесса: таймеры дедлайнов заводит только он (в одном процессе - сразу).
+    """
+    init_pool()
+    if BOT_MULTI_WORKER:
+        # Изменения пользователей в других процессах сбрасывают кэш ролей и в этом
+        user_cache_listener.start()
+    leader = LeaderElection(
+        on_elected=lambda: start_leader_jobs(application),
+        on_demoted=lambda: stop_leader_jobs(application),
+    )
+    application.bot_data['leader'] = leader
+    await leader.start(application.job_queue)
+    # Метрики (METRICS_ENABLED): HTTP /metrics и периодическая сводка в лог
+    metrics.start_http_server()
+    if metrics.METRICS_ENABLED and metrics.METRICS_LOG_INTERVAL > 0:
+        application.job_queue.run_repeating(metrics.log_summary_job, interval=metrics.METRICS_LOG_INTERVAL,
+                                            first=metrics.METRICS_LOG_INTERVAL, name='metrics-log')
+
+async def post_shutdown(application: Application):
+    """
+    Снимает лидерство, останавливает пул анализа документов, закрывает пул подключений
+    к базе данных и останавливает сервер метрик.
+    """
+    leader = application.bot_data.get('leader')
+    if leader is not None:
+        leader.release()
+    analysis_pool.shutdown()
+    user_cache_listener.stop()
+    close_pool()
+    metrics.stop_http_server()
+
+def build_application(token: str = TELEGRAM_BOT_TOKEN, base_url: str = TELEGRAM_API_BASE_URL,
+                      persistence=None, base_file_url: str = TELEGRAM_API_BASE_FILE_URL,
+                      concurrent_updates: int = BOT_CONCURRENT_UPDATES) -> Application:
+    """
+    Создает приложение бота со всеми обработчиками.
+    По умолчанию user_data и состояния разговоров хранятся в PostgreSQL (PostgresPersistence).
+    """
+    if persistence is None:
+        persistence = PostgresPersistence(shared=BOT_MULTI_WORKER)
+    builder = (
+        Application.builder()
+        .application_class(metrics.application_class())
+        .job_queue(metrics.job_queue())
+        .token(token)
+        .persistence(persistence)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if base_file_url:
+        builder = builder.base_file_url(base_file_url)
+    if concurrent_updates > 1:
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+    application = builder.build()
+
+    # Повторно доставленные обновления отсеиваются до всех остальных обработчиков
+    if BOT_MULTI_WORKER:
+        application.add_handler(TypeHandler(Update, drop_duplicate_updates_shared), group=-2)
+        # Состояние разговоров перечитывается перед обработкой и записывается сразу после нее:
+        # следующее обновление того же пользователя может попасть в другой процесс
+        application.add_handler(TypeHandler(Update, refresh_conversations), group=-1)
+        application.add_handler(TypeHandler(Update, save_after_update), group=100)
+    else:
+        application.add_handler(TypeHandler(Update, drop_duplicate_updates), group=-2)
 
     # Регистрация обработчиков команд
     application.add_handler(CommandHandler("start", start))
@@ -40,22 +167,48 @@ def main():
     application.add_handler(CommandHandler("add_class", add_class))
     application.add_handler(CommandHandler("my_classes", my_classes))
     application.add_handler(CommandHandler("add_student", add_student))
+    application.add_handler(import_roster_conv_handler)
     application.add_handler(upload_consent_conv_handler)
+    application.add_handler(CommandHandler("get_template", get_template))
     application.add_handler(CommandHandler("my_consents", my_consents))
+    application.add_handler(CallbackQueryHandler(my_consents_next_page, pattern=f"^{MY_CONSENTS_PAGE_PREFIX}"))
     application.add_handler(submit_consent_conv_handler)
     application.add_handler(reports_conv_handler)
+    application.add_handler(CommandHandler("progress", progress))
+    application.add_handler(export_conv_handler)
 
-    # Добавляем задачу в JobQueue для проверки дедлайнов (например, каждые 60 минут)
-    job_queue = application.job_queue
-    job_queue.run_repeating(check_deadlines, interval=3600, first=10) # Первый запуск через 10 секунд, затем каждые 60 минут
+    # Истечение дедлайнов и напоминания запускаются точными таймерами JobQueue ведущего процесса (см. post_init)
+    return application
 
-    # Добавляем задачу в JobQueue для проверки приближающихся дедлайнов (например, один раз в день)
-    # Первый запуск через 60 секунд, затем каждые 24 часа (86400 секунд)
-    job_queue.run_repeating(check_upcoming_deadlines, interval=86400, first=60)
+def main():
+    """Запуск бота."""
+    application = build_application()
 
-    # Запуск бота
-    logger.info("Запуск бота...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if BOT_RUN_MODE == 'webhook':
+        if not WEBHOOK_URL:
+            logger.error("Для режима webhook нужно указать WEBHOOK_URL!")
+            exit(1)
+        if not WEBHOOK_SECRET_TOKEN:
+            # Без секрета любой, кто узнал адрес, может присылать боту поддельные обновления
+            logger.error("Для режима webhook нужно указать WEBHOOK_SECRET_TOKEN!")
+            exit(1)
+        logger.info(f"Запуск бота в режиме webhook на {WEBHOOK_LISTEN}:{WEBHOOK_PORT}...")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_PATH_SECRET,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH_SECRET}",
+            secret_token=WEBHOOK_SECRET_TOKEN,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        if BOT_MULTI_WORKER:
+            # Несколько процессов не могут одновременно получать обновления через getUpdates
+            logger.error("Режим нескольких процессов (BOT_MULTI_WORKER=1) работает только с BOT_RUN_MODE=webhook!")
+            exit(1)
+        logger.info("Запуск бота...")
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,16 @@
+import asyncio
+import contextvars
+import functools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import extensions, pool
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
+from utils.metrics import METRICS_ENABLED, instrument_db_call, observe_query
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,26 +25,226 @@ DB_NAME = os.getenv('DB_NAME', 'consent_pro_db')
 DB_USER = os.getenv('DB_USER', 'postgres')
 DB_PASSWORD = os.getenv('DB_PASSWORD', 'postgres')
 
+# Параметры пула подключений
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '10'))
+# Сколько секунд ждать свободное подключение, прежде чем выдать ошибку
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+# Подключение, простоявшее в пуле дольше этого времени (в секундах), проверяется запросом SELECT 1
+DB_POOL_HEALTHCHECK_INTERVAL = float(os.getenv('DB_POOL_HEALTHCHECK_INTERVAL', '30'))
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = None
+_last_used = {}
+_executor = None
+
+
+_timed_cursor_classes = {}
+
+
+def _timed_cursor_class(base):
+    """Подкласс курсора base, замеряющий каждый execute/executemany (utils.metrics)."""
+    cls = _timed_cursor_classes.get(base)
+    if cls is None:
+        class TimedCursor(base):
+            def execute(self, query, vars=None):
+                started = time.perf_counter()
+                failed = True
+                try:
+                    result = super().execute(query, vars)
+                    failed = False
+                    return result
+                finally:
+                    observe_query(query, time.perf_counter() - started, failed)
+
+            def executemany(self, query, vars_list):
+                started = time.perf_counter()
+                failed = True
+                try:
+                    result = super().executemany(query, vars_list)
+                    failed = False
+                    return result
+                finally:
+                    observe_query(query, time.perf_counter() - started, failed)
+
+        cls = _timed_cursor_classes[base] = TimedCursor
+    return cls
+
+
+class _InstrumentedConnection(extensions.connection):
+    """Подключение, курсоры которого замеряют запросы; используется только при METRICS_ENABLED."""
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or extensions.cursor
+        kwargs['cursor_factory'] = _timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+
+def _connect_kwargs():
+    kwargs = dict(
+        host=DB_HOST,
+        port=DB_PORT,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        cursor_factory=RealDictCursor  # Для получения результатов в виде словарей
+    )
+    if METRICS_ENABLED:
+        kwargs['connection_factory'] = _InstrumentedConnection
+    return kwargs
+
+
 def get_db_connection():
-    """Возвращает подключение к базе данных PostgreSQL."""
+    """Возвращает новое (не пуловое) подключение к базе данных PostgreSQL."""
     try:
-        conn = psycopg2.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            cursor_factory=RealDictCursor  # Для получения результатов в виде словарей
-        )
-        logger.info("Успешное подключение к базе данных.")
+        conn = psycopg2.connect(**_connect_kwargs())
+        logger.debug("Успешное подключение к базе данных.")
         return conn
     except psycopg2.Error as e:
         logger.error(f"Ошибка подключения к базе данных: {e}")
         raise
 
+
+def init_pool(min_size: int = None, max_size: int = None):
+    """
+    Создает пул подключений к базе данных, если он еще не создан.
+    Размеры по умолчанию берутся из DB_POOL_MIN_SIZE и DB_POOL_MAX_SIZE.
+    """
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is not None:
+            return _pool
+        min_size = DB_POOL_MIN_SIZE if min_size is None else min_size
+        max_size = DB_POOL_MAX_SIZE if max_size is None else max_size
+        try:
+            _pool = pool.ThreadedConnectionPool(min_size, max_size, **_connect_kwargs())
+        except psycopg2.Error as e:
+            logger.error(f"Ошибка создания пула подключений к базе данных: {e}")
+            raise
+        _pool_slots = threading.BoundedSemaphore(max_size)
+        logger.info(f"Создан пул подключений к базе данных (min={min_size}, max={max_size}).")
+        return _pool
+
+
+def close_pool():
+    """Закрывает все подключения пула. Используется при остановке бота."""
+    global _pool, _pool_slots, _executor
+    with _pool_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        # Дожидаемся завершения запросов, уже переданных в пул потоков.
+        # Делается вне блокировки: потокам она нужна, чтобы получить подключение.
+        executor.shutdown(wait=True)
+    with _pool_lock:
+        if _pool is None:
+            return
+        _pool.closeall()
+        _pool = None
+        _pool_slots = None
+        _last_used.clear()
+        logger.info("Пул подключений к базе данных закрыт.")
+
+
+def _is_healthy(conn) -> bool:
+    """Проверяет, что подключение из пула пригодно для работы."""
+    if conn.closed:
+        return False
+    if conn.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    idle_for = time.monotonic() - _last_used.get(id(conn), 0.0)
+    if idle_for < DB_POOL_HEALTHCHECK_INTERVAL:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout(db_pool):
+    # Пул может несколько раз вернуть "мертвое" подключение (например, после рестарта PostgreSQL),
+    # поэтому пробуем не больше, чем подключений в пуле, плюс одно заведомо новое.
+    for _ in range(db_pool.maxconn + 1):
+        conn = db_pool.getconn()
+        if _is_healthy(conn):
+            return conn
+        logger.warning("Подключение из пула не прошло проверку и будет закрыто.")
+        _last_used.pop(id(conn), None)
+        db_pool.putconn(conn, close=True)
+    raise pool.PoolError("Не удалось получить работоспособное подключение из пула.")
+
+
+def _release(db_pool, conn):
+    broken = conn.closed or conn.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN
+    if not broken and conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        # Незавершенная транзакция не должна "утечь" к следующему пользователю подключения
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
+    if broken:
+        _last_used.pop(id(conn), None)
+    else:
+        _last_used[id(conn)] = time.monotonic()
+    db_pool.putconn(conn, close=broken)
+
+
+@contextmanager
+def db_connection():
+    """
+    Выдает подключение из пула и возвращает его обратно по выходе из блока with.
+    Если свободных подключений нет, ждет не дольше DB_POOL_TIMEOUT секунд.
+    """
+    db_pool = init_pool()
+    slots = _pool_slots
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise pool.PoolError(f"Нет свободных подключений в пуле в течение {DB_POOL_TIMEOUT} секунд.")
+    try:
+        conn = _checkout(db_pool)
+        try:
+            yield conn
+        finally:
+            _release(db_pool, conn)
+    finally:
+        slots.release()
+
+
+def _get_executor():
+    global _executor
+    with _pool_lock:
+        if _executor is None:
+            # Потоков не больше, чем подключений в пуле: каждый поток держит не более одного подключения
+            _executor = ThreadPoolExecutor(max_workers=DB_POOL_MAX_SIZE, thread_name_prefix='db')
+        return _executor
+
+
+async def run_db(func, *args, **kwargs):
+    """
+    Выполняет синхронную функцию работы с базой данных в отдельном потоке,
+    не блокируя цикл событий asyncio.
+    """
+    loop = asyncio.get_running_loop()
+    if METRICS_ENABLED:
+        # Контекст передается в поток, чтобы запросы учитывались в метриках обновления, из которого вызваны
+        call = functools.partial(contextvars.copy_context().run, instrument_db_call(func), *args, **kwargs)
+    else:
+        call = functools.partial(func, *args, **kwargs)
+    return await loop.run_in_executor(_get_executor(), call)
+
+
+def to_async(func):
+    """Возвращает асинхронную версию синхронной функции работы с базой данных."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await run_db(func, *args, **kwargs)
+    return wrapper
+
+
 if __name__ == "__main__":
     # Тестирование подключения
-    conn = get_db_connection()
-    if conn:
+    with db_connection() as conn:
         print("Подключение к базе данных успешно!")
-        conn.close()
\ No newline at end of file
+    close_pool()
@@ -0,0 +1,106 @@
+"""
+Применение версионных миграций схемы базы данных.
+
+Миграции - это файлы db/migrations/NNNN_описание.sql. Номер версии берется из префикса,
+примененные версии записываются в таблицу schema_version. Базовая схема создается
+скриптом db/init.sql, миграции применяются поверх нее.
+
+Запуск: python -m db.migrate
+"""
+import os
+import re
+import logging
+from db.connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_RE = re.compile(r'^(\d+)_(\w+)\.sql$')
+
+# Произвольный постоянный ключ advisory lock, чтобы миграции не применялись параллельно
+MIGRATION_LOCK_KEY = 7_410_001
+
+
+def list_migrations():
+    """Возвращает список (версия, имя, путь) всех миграций, отсортированный по версии."""
+    migrations = []
+    for file_name in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_RE.match(file_name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(MIGRATIONS_DIR, file_name)))
+    migrations.sort()
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Повторяющиеся номера миграций в {MIGRATIONS_DIR}.")
+    return migrations
+
+
+def _ensure_schema_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+
+def get_applied_versions(cursor) -> set:
+    """Возвращает множество уже примененных версий."""
+    cursor.execute("SELECT version FROM schema_version;")
+    return {row['version'] for row in cursor.fetchall()}
+
+
+def apply(target_version: int = None) -> list:
+    """
+    Применяет все еще не примененные миграции (до target_version включительно, если задана).
+    Каждая миграция выполняется в своей транзакции. Возвращает список примененных версий.
+    """
+    # Отдельное подключение, а не пул: миграции обычно запускаются до старта бота
+    conn = get_db_connection()
+    applied_now = []
+    try:
+        with conn.cursor() as cursor:
+            # Сессионная блокировка: второй экземпляр дождется окончания миграций
+            cursor.execute("SELECT pg_advisory_lock(%s);", (MIGRATION_LOCK_KEY,))
+            _ensure_schema_version_table(cursor)
+            conn.commit()
+
+            applied = get_applied_versions(cursor)
+            for version, name, path in list_migrations():
+                if version in applied:
+                    continue
+                if target_version is not None and version > target_version:
+                    break
+                with open(path, encoding='utf-8') as f:
+                    sql = f.read()
+                try:
+                    cursor.execute(sql)
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, name) VALUES (%s, %s);",
+                        (version, name)
+                    )
+                    conn.commit()
+                except Exception as e:
+                    conn.rollback()
+                    logger.error(f"Ошибка при применении миграции {version} ({name}): {e}")
+                    raise
+                applied_now.append(version)
+                logger.info(f"Применена миграция {version} ({name}).")
+
+            cursor.execute("SELECT pg_advisory_unlock(%s);", (MIGRATION_LOCK_KEY,))
+            conn.commit()
+    finally:
+        conn.close()
+
+    if not applied_now:
+        logger.info("Схема базы данных актуальна, новых миграций нет.")
+    return applied_now
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    apply()
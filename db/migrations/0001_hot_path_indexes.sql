@@ -0,0 +1,26 @@
+-- Индексы для запросов планировщика, отчетов, уведомлений и списка согласий родителя
+
+-- Классы учителя (get_classes_by_teacher)
+CREATE INDEX IF NOT EXISTS idx_classes_teacher_id ON classes (teacher_id);
+
+-- Ученики класса (create_consent, уведомления, отчеты)
+CREATE INDEX IF NOT EXISTS idx_students_class_id ON students (class_id);
+
+-- Родители ученика (напоминания в check_upcoming_deadlines).
+-- Поиск по user_id уже покрыт UNIQUE (user_id, student_id).
+CREATE INDEX IF NOT EXISTS idx_parents_student_id ON parents (student_id);
+
+-- Согласия класса в порядке создания (get_consents_by_class, отчеты)
+CREATE INDEX IF NOT EXISTS idx_consents_class_id_created_at ON consents (class_id, created_at DESC);
+
+-- Поиск согласий по дедлайну (check_deadlines, check_upcoming_deadlines)
+CREATE INDEX IF NOT EXISTS idx_consents_deadline ON consents (deadline);
+
+-- Записи о сдаче по согласию и статусу (отчеты, check_deadlines).
+-- Поиск по student_id уже покрыт UNIQUE (student_id, consent_id).
+CREATE INDEX IF NOT EXISTS idx_consent_submissions_consent_id_status ON consent_submissions (consent_id, status);
+
+-- Частичный индекс по еще не сданным согласиям: напоминания и истечение дедлайнов
+-- работают только с ними, а их доля быстро падает после рассылки.
+CREATE INDEX IF NOT EXISTS idx_consent_submissions_pending ON consent_submissions (consent_id)
+    WHERE status = 'Не сдано';
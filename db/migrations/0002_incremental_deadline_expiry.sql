@@ -0,0 +1,32 @@
+-- Состояние инкрементальной обработки дедлайнов (check_deadlines)
+
+-- Граница, до которой дедлайны уже обработаны (одна строка)
+CREATE TABLE IF NOT EXISTS deadline_expiry_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    processed_until TIMESTAMP WITH TIME ZONE NOT NULL
+);
+
+-- Обработанные (истекшие) согласия и отметка об отправке сводки учителю
+CREATE TABLE IF NOT EXISTS consent_expirations (
+    consent_id INT PRIMARY KEY,
+    expired_count INT NOT NULL DEFAULT 0,
+    expired_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    summary_sent_at TIMESTAMP WITH TIME ZONE,
+    FOREIGN KEY (consent_id) REFERENCES consents (id) ON DELETE CASCADE
+);
+
+-- Сводки, которые еще предстоит отправить
+CREATE INDEX IF NOT EXISTS idx_consent_expirations_summary_pending ON consent_expirations (expired_at)
+    WHERE summary_sent_at IS NULL;
+
+-- Согласия, созданные после прошлого запуска (дедлайн мог уже пройти к моменту создания)
+CREATE INDEX IF NOT EXISTS idx_consents_created_at ON consents (created_at);
+
+-- Дедлайны, прошедшие до перехода на инкрементальную обработку, уже обрабатывались
+-- прежней ежечасной проверкой: считаем их обработанными, чтобы не дублировать сводки.
+INSERT INTO consent_expirations (consent_id, expired_count, summary_sent_at)
+SELECT id, 0, CURRENT_TIMESTAMP FROM consents WHERE deadline < CURRENT_TIMESTAMP
+ON CONFLICT (consent_id) DO NOTHING;
+
+INSERT INTO deadline_expiry_state (id, processed_until) VALUES (TRUE, CURRENT_TIMESTAMP)
+ON CONFLICT (id) DO NOTHING;
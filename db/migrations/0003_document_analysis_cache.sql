@@ -0,0 +1,14 @@
+-- Кэш результатов анализа документов по SHA-256 содержимого файла
+
+CREATE TABLE IF NOT EXISTS document_analysis_cache (
+    sha256 CHAR(64) PRIMARY KEY,
+    ruleset_version VARCHAR(64) NOT NULL,
+    status VARCHAR(50) NOT NULL,
+    text_length INT NOT NULL,
+    matched_keywords TEXT[] NOT NULL DEFAULT '{}',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_used_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Вытеснение давно не использовавшихся записей
+CREATE INDEX IF NOT EXISTS idx_document_analysis_cache_last_used_at ON document_analysis_cache (last_used_at);
@@ -0,0 +1,65 @@
+-- Хранилище загруженных файлов с адресацией по содержимому (utils/storage.py)
+
+-- Уникальные файлы; ref_count - число записей consents/consent_submissions, ссылающихся на файл
+CREATE TABLE IF NOT EXISTS file_blobs (
+    blob_key VARCHAR(255) PRIMARY KEY,
+    sha256 CHAR(64) NOT NULL,
+    size BIGINT NOT NULL,
+    ref_count INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Поиск файлов без ссылок для удаления
+CREATE INDEX IF NOT EXISTS idx_file_blobs_unreferenced ON file_blobs (created_at) WHERE ref_count <= 0;
+
+-- Пересчет ссылок при смене пути файла. Пути, не зарегистрированные в file_blobs
+-- (загруженные до появления хранилища), не учитываются.
+CREATE OR REPLACE FUNCTION file_blobs_adjust_ref(old_key TEXT, new_key TEXT) RETURNS VOID AS $$
+BEGIN
+    IF old_key IS NOT DISTINCT FROM new_key THEN
+        RETURN;
+    END IF;
+    IF old_key IS NOT NULL THEN
+        UPDATE file_blobs SET ref_count = ref_count - 1 WHERE blob_key = old_key;
+    END IF;
+    IF new_key IS NOT NULL THEN
+        UPDATE file_blobs SET ref_count = ref_count + 1 WHERE blob_key = new_key;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION consents_file_ref() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM file_blobs_adjust_ref(NULL, NEW.file_path);
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM file_blobs_adjust_ref(OLD.file_path, NEW.file_path);
+    ELSE
+        PERFORM file_blobs_adjust_ref(OLD.file_path, NULL);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION consent_submissions_file_ref() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM file_blobs_adjust_ref(NULL, NEW.submitted_file_path);
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM file_blobs_adjust_ref(OLD.submitted_file_path, NEW.submitted_file_path);
+    ELSE
+        PERFORM file_blobs_adjust_ref(OLD.submitted_file_path, NULL);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS consents_file_ref ON consents;
+CREATE TRIGGER consents_file_ref
+    AFTER INSERT OR UPDATE OF file_path OR DELETE ON consents
+    FOR EACH ROW EXECUTE FUNCTION consents_file_ref();
+
+DROP TRIGGER IF EXISTS consent_submissions_file_ref ON consent_submissions;
+CREATE TRIGGER consent_submissions_file_ref
+    AFTER INSERT OR UPDATE OF submitted_file_path OR DELETE ON consent_submissions
+    FOR EACH ROW EXECUTE FUNCTION consent_submissions_file_ref();
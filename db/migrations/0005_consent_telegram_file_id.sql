@@ -0,0 +1,4 @@
+-- Идентификаторы файла шаблона согласия в Telegram: по file_id шаблон отправляется
+-- родителям без повторной загрузки файла, file_unique_id одинаков для всех ботов
+ALTER TABLE consents ADD COLUMN IF NOT EXISTS telegram_file_id VARCHAR(255);
+ALTER TABLE consents ADD COLUMN IF NOT EXISTS telegram_file_unique_id VARCHAR(255);
@@ -0,0 +1,25 @@
+-- Общее состояние нескольких процессов бота (utils/persistence.py, utils/update_dedup.py)
+
+-- context.user_data пользователей (только непустые)
+CREATE TABLE IF NOT EXISTS bot_user_data (
+    user_id BIGINT PRIMARY KEY,
+    data JSONB NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Состояния ConversationHandler: name - имя обработчика, conversation_key - ключ разговора в JSON
+CREATE TABLE IF NOT EXISTS bot_conversations (
+    name VARCHAR(100) NOT NULL,
+    conversation_key TEXT NOT NULL,
+    state JSONB NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (name, conversation_key)
+);
+
+-- Принятые обновления Telegram: защита от повторной обработки одного update_id разными процессами
+CREATE TABLE IF NOT EXISTS processed_updates (
+    update_id BIGINT PRIMARY KEY,
+    received_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_processed_updates_received_at ON processed_updates (received_at);
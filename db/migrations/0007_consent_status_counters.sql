@@ -0,0 +1,80 @@
+-- Число записей consent_submissions по каждому статусу для каждого согласия.
+-- Счетчики поддерживаются триггерами в той же транзакции, что и изменение статусов,
+-- поэтому create_consent, update_submission_status, истечение дедлайнов и каскадные удаления
+-- не требуют отдельного кода. Проверка и пересчет: python -m db.status_counters verify|rebuild
+CREATE TABLE IF NOT EXISTS consent_status_counters (
+    consent_id INT NOT NULL REFERENCES consents (id) ON DELETE CASCADE,
+    status VARCHAR(50) NOT NULL,
+    count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (consent_id, status)
+);
+
+-- Триггеры уровня оператора с таблицами переходов: массовый INSERT ... SELECT при создании
+-- согласия или пачка истечения дедлайнов обновляют каждый счетчик один раз, а не на каждую строку.
+-- Строки упорядочены по ключу, чтобы параллельные транзакции блокировали счетчики в одном порядке.
+CREATE OR REPLACE FUNCTION consent_status_counters_on_insert() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO consent_status_counters (consent_id, status, count)
+    SELECT consent_id, status, COUNT(*) FROM new_rows GROUP BY consent_id, status ORDER BY consent_id, status
+    ON CONFLICT (consent_id, status) DO UPDATE SET count = consent_status_counters.count + EXCLUDED.count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION consent_status_counters_on_update() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO consent_status_counters (consent_id, status, count)
+    SELECT consent_id, status, SUM(delta)
+    FROM (
+        SELECT o.consent_id, o.status, -1 AS delta
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE o.status IS DISTINCT FROM n.status OR o.consent_id <> n.consent_id
+        UNION ALL
+        SELECT n.consent_id, n.status, 1 AS delta
+        FROM old_rows o JOIN new_rows n ON n.id = o.id
+        WHERE o.status IS DISTINCT FROM n.status OR o.consent_id <> n.consent_id
+    ) changes
+    GROUP BY consent_id, status
+    HAVING SUM(delta) <> 0
+    ORDER BY consent_id, status
+    ON CONFLICT (consent_id, status) DO UPDATE SET count = consent_status_counters.count + EXCLUDED.count;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION consent_status_counters_on_delete() RETURNS TRIGGER AS $$
+BEGIN
+    -- При каскадном удалении согласия его счетчики уже удалены, UPDATE их не найдет
+    UPDATE consent_status_counters k
+    SET count = k.count - d.count
+    FROM (
+        SELECT consent_id, status, COUNT(*) AS count FROM old_rows GROUP BY consent_id, status
+    ) d
+    WHERE k.consent_id = d.consent_id AND k.status = d.status;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS consent_status_counters_insert ON consent_submissions;
+CREATE TRIGGER consent_status_counters_insert
+    AFTER INSERT ON consent_submissions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION consent_status_counters_on_insert();
+
+DROP TRIGGER IF EXISTS consent_status_counters_update ON consent_submissions;
+CREATE TRIGGER consent_status_counters_update
+    AFTER UPDATE ON consent_submissions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION consent_status_counters_on_update();
+
+DROP TRIGGER IF EXISTS consent_status_counters_delete ON consent_submissions;
+CREATE TRIGGER consent_status_counters_delete
+    AFTER DELETE ON consent_submissions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION consent_status_counters_on_delete();
+
+-- Начальное заполнение по существующим данным (запись в consent_submissions на это время блокируется)
+LOCK TABLE consent_submissions IN SHARE MODE;
+DELETE FROM consent_status_counters;
+INSERT INTO consent_status_counters (consent_id, status, count)
+SELECT consent_id, status, COUNT(*) FROM consent_submissions GROUP BY consent_id, status;
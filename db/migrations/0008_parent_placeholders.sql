@@ -0,0 +1,5 @@
+-- Родители, добавленные учителем, хранятся как "заглушки" users с telegram_id = 0,
+-- пока не зарегистрируются в боте. Ограничение UNIQUE (telegram_id) не давало создать
+-- больше одной заглушки, поэтому уникальность проверяется только для зарегистрированных.
+ALTER TABLE users DROP CONSTRAINT IF EXISTS users_telegram_id_key;
+CREATE UNIQUE INDEX IF NOT EXISTS users_telegram_id_registered_key ON users (telegram_id) WHERE telegram_id <> 0;
@@ -0,0 +1,128 @@
+-- Снимки сводной статистики для отчетов администратора (utils/analytics.py).
+-- Отчет "Статистика сдачи по классам" читает готовые агрегаты, а не consent_submissions.
+-- Снимки пересчитывает задача по расписанию, и только для согласий, изменившихся с прошлого снимка.
+CREATE TABLE IF NOT EXISTS consent_stats_snapshots (
+    consent_id INT PRIMARY KEY REFERENCES consents (id) ON DELETE CASCADE,
+    class_id INT NOT NULL REFERENCES classes (id) ON DELETE CASCADE,
+    total INT NOT NULL DEFAULT 0,
+    submitted INT NOT NULL DEFAULT 0,
+    refused INT NOT NULL DEFAULT 0,
+    not_going INT NOT NULL DEFAULT 0,
+    overdue INT NOT NULL DEFAULT 0,
+    pending INT NOT NULL DEFAULT 0,
+    -- Время от создания согласия до сдачи (статус "Сдано")
+    time_to_submit_p50 INTERVAL,
+    time_to_submit_p90 INTERVAL,
+    computed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_consent_stats_snapshots_class_id ON consent_stats_snapshots (class_id);
+
+CREATE TABLE IF NOT EXISTS class_stats_snapshots (
+    class_id INT PRIMARY KEY REFERENCES classes (id) ON DELETE CASCADE,
+    consents INT NOT NULL DEFAULT 0,
+    total INT NOT NULL DEFAULT 0,
+    submitted INT NOT NULL DEFAULT 0,
+    refused INT NOT NULL DEFAULT 0,
+    not_going INT NOT NULL DEFAULT 0,
+    overdue INT NOT NULL DEFAULT 0,
+    pending INT NOT NULL DEFAULT 0,
+    time_to_submit_p50 INTERVAL,
+    time_to_submit_p90 INTERVAL,
+    computed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Время последнего снимка (одна строка)
+CREATE TABLE IF NOT EXISTS analytics_snapshot_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    refreshed_at TIMESTAMP WITH TIME ZONE
+);
+
+INSERT INTO analytics_snapshot_state (id, refreshed_at) VALUES (TRUE, NULL) ON CONFLICT (id) DO NOTHING;
+
+-- Согласия, изменившиеся после последнего снимка. Без внешних ключей: запись об удаленном
+-- согласии нужна, чтобы пересчитать снимок его класса.
+CREATE TABLE IF NOT EXISTS analytics_dirty_consents (
+    consent_id INT PRIMARY KEY,
+    class_id INT NOT NULL,
+    changed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- DO UPDATE (а не DO NOTHING) блокирует строку до конца транзакции изменения: задача снимков,
+-- удаляющая отметки, дождется ее фиксации и увидит изменение в своем пересчете.
+-- Строки упорядочены по ключу, чтобы параллельные транзакции блокировали отметки в одном порядке.
+CREATE OR REPLACE FUNCTION analytics_mark_new_submissions() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO analytics_dirty_consents (consent_id, class_id)
+    SELECT c.id, c.class_id FROM consents c
+    WHERE c.id IN (SELECT consent_id FROM new_rows)
+    ORDER BY c.id
+    ON CONFLICT (consent_id) DO UPDATE SET changed_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION analytics_mark_old_submissions() RETURNS TRIGGER AS $$
+BEGIN
+    -- При каскадном удалении согласия его уже нет: класс отметит триггер на consents
+    INSERT INTO analytics_dirty_consents (consent_id, class_id)
+    SELECT c.id, c.class_id FROM consents c
+    WHERE c.id IN (SELECT consent_id FROM old_rows)
+    ORDER BY c.id
+    ON CONFLICT (consent_id) DO UPDATE SET changed_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION analytics_mark_updated_submissions() RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO analytics_dirty_consents (consent_id, class_id)
+    SELECT c.id, c.class_id FROM consents c
+    WHERE c.id IN (SELECT consent_id FROM new_rows UNION SELECT consent_id FROM old_rows)
+    ORDER BY c.id
+    ON CONFLICT (consent_id) DO UPDATE SET changed_at = NOW();
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Прежний класс перенесенного согласия пересчитывается по его снимку (consent_stats_snapshots.class_id)
+CREATE OR REPLACE FUNCTION analytics_mark_consent() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO analytics_dirty_consents (consent_id, class_id) VALUES (OLD.id, OLD.class_id)
+        ON CONFLICT (consent_id) DO UPDATE SET class_id = EXCLUDED.class_id, changed_at = NOW();
+    ELSE
+        INSERT INTO analytics_dirty_consents (consent_id, class_id) VALUES (NEW.id, NEW.class_id)
+        ON CONFLICT (consent_id) DO UPDATE SET class_id = EXCLUDED.class_id, changed_at = NOW();
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS analytics_mark_insert ON consent_submissions;
+CREATE TRIGGER analytics_mark_insert
+    AFTER INSERT ON consent_submissions
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION analytics_mark_new_submissions();
+
+DROP TRIGGER IF EXISTS analytics_mark_update ON consent_submissions;
+CREATE TRIGGER analytics_mark_update
+    AFTER UPDATE ON consent_submissions
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION analytics_mark_updated_submissions();
+
+DROP TRIGGER IF EXISTS analytics_mark_delete ON consent_submissions;
+CREATE TRIGGER analytics_mark_delete
+    AFTER DELETE ON consent_submissions
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION analytics_mark_old_submissions();
+
+DROP TRIGGER IF EXISTS analytics_mark_consent ON consents;
+CREATE TRIGGER analytics_mark_consent
+    AFTER INSERT OR DELETE OR UPDATE OF class_id, created_at ON consents
+    FOR EACH ROW EXECUTE FUNCTION analytics_mark_consent();
+
+-- Первый снимок строится по всем согласиям
+INSERT INTO analytics_dirty_consents (consent_id, class_id)
+SELECT id, class_id FROM consents
+ON CONFLICT (consent_id) DO NOTHING;
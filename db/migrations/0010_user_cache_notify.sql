@@ -0,0 +1,20 @@
+-- Уведомления об изменении пользователей для кэша user_cache (utils/user_cache_listener.py).
+-- В режиме нескольких процессов каждый процесс слушает канал user_cache и сбрасывает запись
+-- по telegram_id, поэтому снятая роль учителя перестает действовать во всех процессах сразу.
+-- Уведомление доставляется только после фиксации транзакции.
+CREATE OR REPLACE FUNCTION notify_user_cache() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM pg_notify('user_cache', OLD.telegram_id::text);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM pg_notify('user_cache', NEW.telegram_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS users_notify_user_cache ON users;
+CREATE TRIGGER users_notify_user_cache
+    AFTER INSERT OR UPDATE OR DELETE ON users
+    FOR EACH ROW EXECUTE FUNCTION notify_user_cache();
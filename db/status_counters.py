@@ -0,0 +1,98 @@
+"""
+Проверка и пересчет счетчиков consent_status_counters (см. миграцию 0007).
+
+Счетчики поддерживаются триггерами; команды нужны после ручных правок данных
+в обход триггеров (например, при отключенных триггерах или восстановлении из копии).
+
+Запуск:
+    python -m db.status_counters verify              - показать расхождения
+    python -m db.status_counters rebuild [ID ...]    - пересчитать все или указанные согласия
+"""
+import logging
+import sys
+from db.connection import get_db_connection
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger(__name__)
+
+
+def verify(cursor) -> list:
+    """Возвращает расхождения счетчиков с consent_submissions: (consent_id, status, stored, actual)."""
+    cursor.execute("""
+        WITH actual AS (
+            SELECT consent_id, status, COUNT(*) AS count
+            FROM consent_submissions
+            GROUP BY consent_id, status
+        )
+        SELECT
+            COALESCE(k.consent_id, a.consent_id) AS consent_id,
+            COALESCE(k.status, a.status) AS status,
+            COALESCE(k.count, 0) AS stored,
+            COALESCE(a.count, 0) AS actual
+        FROM consent_status_counters k
+        FULL OUTER JOIN actual a ON a.consent_id = k.consent_id AND a.status = k.status
+        WHERE COALESCE(k.count, 0) <> COALESCE(a.count, 0)
+        ORDER BY 1, 2;
+    """)
+    return cursor.fetchall()
+
+
+def rebuild(cursor, consent_ids: list = None) -> int:
+    """
+    Пересчитывает счетчики всех согласий или только consent_ids.
+    На время пересчета запись в consent_submissions блокируется. Возвращает число строк счетчиков.
+    """
+    cursor.execute("LOCK TABLE consent_submissions IN SHARE MODE;")
+    if consent_ids:
+        cursor.execute("DELETE FROM consent_status_counters WHERE consent_id = ANY(%s);", (consent_ids,))
+        cursor.execute("""
+            INSERT INTO consent_status_counters (consent_id, status, count)
+            SELECT consent_id, status, COUNT(*) FROM consent_submissions
+            WHERE consent_id = ANY(%s)
+            GROUP BY consent_id, status;
+        """, (consent_ids,))
+    else:
+        cursor.execute("DELETE FROM consent_status_counters;")
+        cursor.execute("""
+            INSERT INTO consent_status_counters (consent_id, status, count)
+            SELECT consent_id, status, COUNT(*) FROM consent_submissions
+            GROUP BY consent_id, status;
+        """)
+    return cursor.rowcount
+
+
+def main(argv: list) -> int:
+    if not argv or argv[0] not in ('verify', 'rebuild'):
+        print(__doc__)
+        return 2
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            if argv[0] == 'verify':
+                mismatches = verify(cursor)
+                conn.rollback()
+                for row in mismatches:
+                    print(f"Согласие {row['consent_id']}, статус '{row['status']}': в счетчике {row['stored']}, на самом деле {row['actual']}")
+                print(f"Расхождений: {len(mismatches)}")
+                return 1 if mismatches else 0
+
+            consent_ids = [int(consent_id) for consent_id in argv[1:]]
+            rows = rebuild(cursor, consent_ids)
+            conn.commit()
+            print(f"Счетчики пересчитаны, строк: {rows}")
+            return 0
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Ошибка при обработке счетчиков статусов: {e}")
+        return 1
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    sys.exit(main(sys.argv[1:]))
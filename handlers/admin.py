@@ -1,6 +1,6 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from models.user import get_user_by_telegram_id, assign_role_to_user
+from models.user import get_user_by_telegram_id_async, assign_role_to_user_async
 from utils.auth import require_role
 import logging
 
@@ -19,14 +19,14 @@ async def add_teacher(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Неверный формат telegram_id. Укажите числовое значение.")
         return
 
-    user_data = get_user_by_telegram_id(telegram_id)
+    user_data = await get_user_by_telegram_id_async(telegram_id)
 
     if not user_data:
         await update.message.reply_text(f"Пользователь с telegram_id {telegram_id} не найден в базе данных.")
         return
 
     # Предположим, что id роли "Учитель" = 2
-    assign_role_to_user(telegram_id, new_role_id=2)
+    await assign_role_to_user_async(telegram_id, new_role_id=2)
     await update.message.reply_text(f"Пользователю с telegram_id {telegram_id} успешно назначена роль 'Учитель'.")
 
 
@@ -43,7 +43,7 @@ async def remove_teacher(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Неверный формат telegram_id. Укажите числовое значение.")
         return
 
-    user_data = get_user_by_telegram_id(telegram_id)
+    user_data = await get_user_by_telegram_id_async(telegram_id)
 
     if not user_data:
         await update.message.reply_text(f"Пользователь с telegram_id {telegram_id} не найден в базе данных.")
@@ -56,5 +56,5 @@ async def remove_teacher(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Предположим, что id роли "Родитель" = 3
-    assign_role_to_user(telegram_id, new_role_id=3)
+    await assign_role_to_user_async(telegram_id, new_role_id=3)
     await update.message.reply_text(f"У пользователя с telegram_id {telegram_id} отозвана роль 'Учитель'. Назначена роль 'Родитель'.")
\ No newline at end of file
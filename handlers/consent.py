@@ -1,9 +1,11 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler, CallbackQueryHandler
-from models.consent import create_consent
-from models.class_ import get_classes_by_teacher
+from models.consent import create_consent_async, get_consent_template_async
+from models.class_ import get_classes_by_teacher_async
 from utils.auth import require_role
-from utils.notifications import send_notification_to_parents
+from utils.notifications import send_notification_to_parents, send_consent_template
+from utils.deadline_timers import deadline_scheduler
+from utils.storage import save_upload
 import logging
 import os
 
@@ -43,11 +45,13 @@ async def handle_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         file_id = file.file_id
         new_file = await context.bot.get_file(file_id)
-        # Сохраняем файл в папку uploads (ее нужно создать заранее)
-        file_path = f"uploads/{file.file_name}"
-        await new_file.download_to_drive(custom_path=file_path)
+        # Сохраняем файл в хранилище; в согласии хранится ключ файла, одинаковые файлы не дублируются
+        blob_key, _ = await save_upload(new_file, file_extension)
 
-        user_data['file_path'] = file_path
+        user_data['file_path'] = blob_key
+        # По file_id шаблон потом рассылается родителям без повторной загрузки
+        user_data['file_id'] = file.file_id
+        user_data['file_unique_id'] = file.file_unique_id
         await update.message.reply_text(f"Файл '{file.file_name}' получен.\nТеперь введите дедлайн в формате ДД.ММ.ГГГГ (например, 25.12.2024).")
         return DEADLINE
     except Exception as e:
@@ -72,16 +76,13 @@ async def handle_deadline(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     await update.message.reply_text(f"Дедлайн: {deadline_text}\nТеперь выберите класс, для которого создается согласие.")
 
-    # Получаем список классов учителя
-    teacher_telegram_id = update.effective_user.id
-    from models.user import get_user_by_telegram_id
-    teacher_data = get_user_by_telegram_id(teacher_telegram_id)
-    if not teacher_data:
+    # Получаем список классов учителя (id учителя сохранен require_role в начале разговора)
+    teacher_id = user_data.get('user_id')
+    if not teacher_id:
         await update.message.reply_text("Ошибка: Не удалось получить данные учителя.")
         return ConversationHandler.END
 
-    teacher_id = teacher_data['id']
-    classes = get_classes_by_teacher(teacher_id)
+    classes = await get_classes_by_teacher_async(teacher_id)
 
     if not classes:
         await update.message.reply_text("У вас нет созданных классов.")
@@ -105,14 +106,22 @@ async def handle_class_selection(update: Update, context: ContextTypes.DEFAULT_T
     selected_class_id = int(query.data)
 
     # Сохраняем согласие в базу данных
-    consent_id = create_consent(
+    consent_id = await create_consent_async(
         name=user_data.get('consent_name'),
         file_path=user_data.get('file_path'),
         deadline_str=user_data.get('deadline'),
-        class_id=selected_class_id
+        class_id=selected_class_id,
+        file_id=user_data.get('file_id'),
+        file_unique_id=user_data.get('file_unique_id')
     )
 
     if consent_id:
+        # Заводим таймеры истечения дедлайна и напоминаний для нового согласия
+        await deadline_scheduler.add_consent(consent_id)
+        # Рассылаем родителям уведомление с шаблоном в фоне, не задерживая ответ учителю
+        context.application.create_task(send_notification_to_parents(
+            context.application, selected_class_id, user_data.get('consent_name'), user_data.get('file_id')
+        ))
         await query.edit_message_text(f"Согласие '{user_data.get('consent_name')}' успешно создано для класса с ID {selected_class_id}!")
     else:
         await query.edit_message_text("Произошла ошибка при создании согласия. Попробуйте еще раз.")
@@ -128,6 +137,32 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     return ConversationHandler.END
 
+@require_role(['Учитель', 'Родитель', 'Администратор'])
+async def get_template(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отправляет файл шаблона согласия: /get_template <ID согласия>."""
+    if not context.args or len(context.args) != 1:
+        await update.message.reply_text("Использование: /get_template <ID согласия>")
+        return
+
+    try:
+        consent_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("Неверный формат ID согласия. Укажите числовое значение.")
+        return
+
+    consent = await get_consent_template_async(
+        consent_id, context.user_data['user_id'], any_class=context.user_data['role_name'] == 'Администратор'
+    )
+    if not consent:
+        await update.message.reply_text(f"Согласие с ID {consent_id} не найдено или недоступно вам.")
+        return
+
+    try:
+        await send_consent_template(context.bot, update.effective_chat.id, consent, caption=consent['name'])
+    except Exception as e:
+        logger.error(f"Ошибка при отправке шаблона согласия {consent_id}: {e}")
+        await update.message.reply_text("Не удалось отправить файл согласия. Попробуйте позже.")
+
 # Определяем ConversationHandler
 upload_consent_conv_handler = ConversationHandler(
     entry_points=[CommandHandler('upload_consent', upload_consent_start)],
@@ -137,5 +172,7 @@ upload_consent_conv_handler = ConversationHandler(
         DEADLINE: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_deadline)],
         CLASS: [CallbackQueryHandler(handle_class_selection)],
     },
-    fallbacks=[CommandHandler('cancel', cancel)]
+    fallbacks=[CommandHandler('cancel', cancel)],
+    name='upload_consent',
+    persistent=True
 )
\ No newline at end of file
@@ -1,39 +1,79 @@
-from telegram import Update
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler, CallbackQueryHandler
-from models.consent import get_consents_by_parent, update_submission_status
+from models.consent import get_consents_by_parent_async, get_parent_submissions_for_consent_async, update_submission_status_async
 from utils.auth import require_role
-from utils.document_analyzer import analyze_document
+from utils.analysis_pool import analysis_pool, AnalysisQueueFull, FileTooLarge
+from utils.storage import save_upload, blob_sha256
+from datetime import datetime
+import asyncio
 import logging
 import os
 
 logger = logging.getLogger(__name__)
 
 # Константы для состояний разговора
-CONSENT_ID, FILE = range(2)
+CONSENT_ID, FILE, CHILD = range(3)
+
+# Сколько согласий показывать на одной странице /my_consents
+MY_CONSENTS_PAGE_SIZE = int(os.getenv('MY_CONSENTS_PAGE_SIZE', '20'))
+# Префикс callback_data кнопки следующей страницы: my_consents:<created_at>|<consent_submission_id>
+MY_CONSENTS_PAGE_PREFIX = 'my_consents:'
+
+
+def _format_consents_page(page: dict) -> str:
+    lines = []
+    for child in page['children']:
+        if lines:
+            lines.append("")
+        lines.append(f"👤 {child['student_name']}:")
+        for c in child['consents']:
+            deadline = c['deadline'].strftime('%d.%m.%Y') if c['deadline'] else "нет"
+            lines.append(f"  ID: {c['consent_id']}, Название: {c['consent_name']}, Статус: {c['submission_status']}, Дедлайн: {deadline}")
+    return "\n".join(lines)
+
+
+def _next_page_markup(page: dict):
+    if not page['next_cursor']:
+        return None
+    created_at, submission_id = page['next_cursor']
+    callback_data = f"{MY_CONSENTS_PAGE_PREFIX}{created_at.isoformat()}|{submission_id}"
+    return InlineKeyboardMarkup([[InlineKeyboardButton("Показать еще", callback_data=callback_data)]])
+
 
 @require_role(['Родитель'])
 async def my_consents(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Показывает список согласий для ребенка."""
-    parent_telegram_id = update.effective_user.id
+    """Показывает согласия всех детей родителя (первую страницу)."""
+    # id родителя уже получен декоратором require_role
+    parent_user_id = context.user_data['user_id']
+    page = await get_consents_by_parent_async(parent_user_id, MY_CONSENTS_PAGE_SIZE)
 
-    from models.user import get_user_by_telegram_id
-    parent_data = get_user_by_telegram_id(parent_telegram_id)
-    if not parent_data:
-        await update.message.reply_text("Ошибка: Не удалось получить данные родителя.")
+    if not page['children']:
+        await update.message.reply_text("Нет согласий для отображения.")
         return
 
-    parent_user_id = parent_data['id']
-    consents = get_consents_by_parent(parent_user_id)
+    await update.message.reply_text(f"Согласия для ваших детей:\n\n{_format_consents_page(page)}",
+                                    reply_markup=_next_page_markup(page))
 
-    if not consents:
-        await update.message.reply_text("Нет согласий для отображения.")
+
+@require_role(['Родитель'])
+async def my_consents_next_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Показывает следующую страницу /my_consents по кнопке "Показать еще"."""
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        created_at, submission_id = query.data[len(MY_CONSENTS_PAGE_PREFIX):].rsplit('|', 1)
+        after = (datetime.fromisoformat(created_at), int(submission_id))
+    except ValueError:
         return
 
-    consent_list_text = "\n".join([
-        f"ID: {c['consent_id']}, Название: {c['consent_name']}, Статус: {c['submission_status']}, Дедлайн: {c['deadline']}"
-        for c in consents
-    ])
-    await update.message.reply_text(f"Согласия для вашего ребенка:\n{consent_list_text}")
+    page = await get_consents_by_parent_async(context.user_data['user_id'], MY_CONSENTS_PAGE_SIZE, after)
+    # Кнопку убираем со старого сообщения: следующая страница придет новым сообщением
+    await query.edit_message_reply_markup(reply_markup=None)
+    if not page['children']:
+        await update.effective_message.reply_text("Больше согласий нет.")
+        return
+    await update.effective_message.reply_text(_format_consents_page(page), reply_markup=_next_page_markup(page))
 
 
 @require_role(['Родитель'])
@@ -49,35 +89,43 @@ async def submit_consent_start(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("Неверный формат ID согласия. Укажите числовое значение.")
         return
 
-    # Проверим, существует ли такое согласие для этого родителя
-    parent_telegram_id = update.effective_user.id
-    from models.user import get_user_by_telegram_id
-    parent_data = get_user_by_telegram_id(parent_telegram_id)
-    if not parent_data:
-        await update.message.reply_text("Ошибка: Не удалось получить данные родителя.")
-        return
-
-    parent_user_id = parent_data['id']
-    consents = get_consents_by_parent(parent_user_id)
+    # Проверим, относится ли согласие к детям этого родителя
+    parent_user_id = context.user_data['user_id']
+    submissions = await get_parent_submissions_for_consent_async(parent_user_id, consent_id)
 
-    consent_exists = False
-    consent_submission_id = None
-    for c in consents:
-        if c['consent_id'] == consent_id:
-            consent_exists = True
-            consent_submission_id = c['consent_submission_id']
-            break
-
-    if not consent_exists:
+    if not submissions:
         await update.message.reply_text(f"Согласие с ID {consent_id} не найдено или не относится к вашему ребенку.")
         return
 
+    if len(submissions) > 1:
+        # Несколько детей в одном классе: уточняем, за кого сдается согласие
+        context.user_data['consent_submission_ids'] = [s['consent_submission_id'] for s in submissions]
+        keyboard = [[InlineKeyboardButton(s['student_name'], callback_data=str(s['consent_submission_id']))]
+                    for s in submissions]
+        await update.message.reply_text("Выберите ребенка, за которого сдается согласие:",
+                                        reply_markup=InlineKeyboardMarkup(keyboard))
+        return CHILD
+
     # Сохраняем ID в user_data
-    context.user_data['consent_submission_id'] = consent_submission_id
+    context.user_data['consent_submission_id'] = submissions[0]['consent_submission_id']
 
     await update.message.reply_text(f"Отправьте подписанный PDF или DOCX файл для согласия с ID {consent_id}.")
     return FILE
 
+
+async def handle_child_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение выбранного ребенка, если согласие относится к нескольким детям."""
+    query = update.callback_query
+    await query.answer()
+
+    submission_id = int(query.data)
+    if submission_id not in context.user_data.get('consent_submission_ids', []):
+        return CHILD
+
+    context.user_data['consent_submission_id'] = submission_id
+    await query.edit_message_text("Отправьте подписанный PDF или DOCX файл согласия.")
+    return FILE
+
 async def handle_file_submission(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Получение файла согласия, сохранение на диск и анализ."""
     user_data = context.user_data
@@ -93,22 +141,39 @@ async def handle_file_submission(update: Update, context: ContextTypes.DEFAULT_T
         await update.message.reply_text("Неподдерживаемый формат файла. Пожалуйста, отправьте PDF или DOCX файл.")
         return FILE
 
+    if file.file_size and file.file_size > analysis_pool.max_file_size:
+        await update.message.reply_text(f"Файл слишком большой. Максимальный размер: {analysis_pool.max_file_size // (1024 * 1024)} МБ.")
+        return FILE
+
+    # Сразу подтверждаем получение: анализ может занять время
+    await update.message.reply_text(f"Файл '{file.file_name}' получен, идет проверка...")
+
     # Скачивание файла
     try:
         file_id = file.file_id
         new_file = await context.bot.get_file(file_id)
-        # Сохраняем файл в папку uploads (ее нужно создать заранее)
-        file_path = f"uploads/{file.file_name}"
-        await new_file.download_to_drive(custom_path=file_path)
-
-        # Анализируем документ с помощью ИИ
-        ai_determined_status = analyze_document(file_path)
+        # Сохраняем файл в хранилище; в сдаче хранится ключ файла, одинаковые файлы не дублируются
+        blob_key, file_path = await save_upload(new_file, file_extension)
+
+        # Анализируем документ с помощью ИИ в отдельном процессе
+        try:
+            ai_determined_status = await analysis_pool.analyze(file_path, sha256=blob_sha256(blob_key))
+        except FileTooLarge:
+            await update.message.reply_text(f"Файл слишком большой. Максимальный размер: {analysis_pool.max_file_size // (1024 * 1024)} МБ.")
+            return FILE
+        except AnalysisQueueFull:
+            logger.warning(f"Очередь анализа переполнена, документ {file_path} не принят.")
+            await update.message.reply_text("Сейчас бот проверяет слишком много документов. Пожалуйста, отправьте файл еще раз через несколько минут.")
+            return FILE
+        except asyncio.TimeoutError:
+            # Как и при ошибке анализа, по умолчанию считаем "Сдано"
+            ai_determined_status = "Сдано"
         logger.info(f"ИИ определил статус согласия как: {ai_determined_status}")
 
         # Обновляем статус в базе данных с учетом анализа ИИ
         submission_id = user_data.get('consent_submission_id')
         if submission_id:
-            update_submission_status(submission_id, ai_determined_status, file_path)
+            await update_submission_status_async(submission_id, ai_determined_status, blob_key)
             await update.message.reply_text(f"Файл '{file.file_name}' успешно загружен. Статус согласия определен как '{ai_determined_status}'.")
         else:
             await update.message.reply_text("Произошла ошибка при обновлении статуса.")
@@ -132,7 +197,10 @@ async def cancel_submission(update: Update, context: ContextTypes.DEFAULT_TYPE):
 submit_consent_conv_handler = ConversationHandler(
     entry_points=[CommandHandler('submit_consent', submit_consent_start)],
     states={
+        CHILD: [CallbackQueryHandler(handle_child_selection, pattern=r'^\d+$')],
         FILE: [MessageHandler(filters.Document.ALL, handle_file_submission)],
     },
-    fallbacks=[CommandHandler('cancel', cancel_submission)]
+    fallbacks=[CommandHandler('cancel', cancel_submission)],
+    name='submit_consent',
+    persistent=True
 )
\ No newline at end of file
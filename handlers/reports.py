@@ -1,13 +1,19 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler, CallbackQueryHandler
 from utils.auth import require_role
-from utils.reports import generate_status_report, generate_class_statistics_report
+from utils.reports import generate_status_report_async, generate_class_statistics_report_async, generate_progress_report_async
+from utils.export import export_submissions_async, EXPORT_MAX_FILE_SIZE, EXPORT_SCOPES
+from utils.storage import new_temp_path
+from datetime import datetime
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
 # Константы для состояний разговора
 REPORT_TYPE, CONSENT_ID = range(2)
+# Константы для состояний разговора выгрузки
+EXPORT_SCOPE, EXPORT_ID, EXPORT_FORMAT = range(3)
 
 @require_role(['Учитель', 'Администратор'])
 async def reports_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -38,7 +44,7 @@ async def handle_report_type_selection(update: Update, context: ContextTypes.DEF
         return CONSENT_ID
     elif selected_report_type == "class_stats_report":
         # Генерируем и отправляем сводный отчет
-        report_text = generate_class_statistics_report()
+        report_text = await generate_class_statistics_report_async()
         # Отправляем отчет по частям, если он слишком длинный
         if len(report_text) > 4096:
             for i in range(0, len(report_text), 4096):
@@ -59,7 +65,7 @@ async def handle_consent_id_input(update: Update, context: ContextTypes.DEFAULT_
         return CONSENT_ID
 
     # Генерируем отчет
-    report_text = generate_status_report(consent_id)
+    report_text = await generate_status_report_async(consent_id)
 
     # Отправляем отчет по частям, если он слишком длинный
     if len(report_text) > 4096:
@@ -79,6 +85,24 @@ async def cancel_reports(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     return ConversationHandler.END
 
+@require_role(['Учитель', 'Администратор'])
+async def progress(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Краткий отчет о ходе сдачи согласия: /progress <ID согласия>."""
+    if not context.args or len(context.args) != 1:
+        await update.message.reply_text("Использование: /progress <ID согласия>")
+        return
+
+    try:
+        consent_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("Неверный формат ID согласия. Укажите числовое значение.")
+        return
+
+    # Учитель видит только согласия своих классов
+    teacher_id = context.user_data['user_id'] if context.user_data['role_name'] == 'Учитель' else None
+    report_text = await generate_progress_report_async(consent_id, teacher_id)
+    await update.message.reply_text(report_text)
+
 # Определяем ConversationHandler
 reports_conv_handler = ConversationHandler(
     entry_points=[CommandHandler('reports', reports_start)],
@@ -86,5 +110,120 @@ reports_conv_handler = ConversationHandler(
         REPORT_TYPE: [CallbackQueryHandler(handle_report_type_selection)],
         CONSENT_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_consent_id_input)],
     },
-    fallbacks=[CommandHandler('cancel', cancel_reports)]
-)
\ No newline at end of file
+    fallbacks=[CommandHandler('cancel', cancel_reports)],
+    name='reports',
+    persistent=True
+)
+
+
+@require_role(['Учитель', 'Администратор'])
+async def export_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начало разговора для выгрузки статусов сдачи в файл."""
+    keyboard = [
+        [InlineKeyboardButton("По согласию", callback_data="consent")],
+        [InlineKeyboardButton("По классу", callback_data="class")],
+    ]
+    if context.user_data.get('role_name') == 'Администратор':
+        keyboard.append([InlineKeyboardButton("Вся школа", callback_data="school")])
+
+    await update.message.reply_text("Выберите, что выгрузить:", reply_markup=InlineKeyboardMarkup(keyboard))
+    return EXPORT_SCOPE
+
+async def handle_export_scope(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение области выгрузки."""
+    query = update.callback_query
+    await query.answer()
+
+    context.user_data['export_scope'] = query.data
+    if query.data == 'consent':
+        await query.edit_message_text("Введите ID согласия.")
+        return EXPORT_ID
+    if query.data == 'class':
+        await query.edit_message_text("Введите ID класса.")
+        return EXPORT_ID
+
+    context.user_data['export_id'] = None
+    await query.edit_message_text("Выберите формат файла:", reply_markup=_export_format_markup())
+    return EXPORT_FORMAT
+
+async def handle_export_id_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение ID согласия или класса."""
+    try:
+        context.user_data['export_id'] = int(update.message.text)
+    except ValueError:
+        await update.message.reply_text("Неверный формат ID. Пожалуйста, введите числовое значение.")
+        return EXPORT_ID
+
+    await update.message.reply_text("Выберите формат файла:", reply_markup=_export_format_markup())
+    return EXPORT_FORMAT
+
+def _export_format_markup() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton("CSV", callback_data="csv"),
+        InlineKeyboardButton("XLSX", callback_data="xlsx"),
+    ]])
+
+@require_role(['Учитель', 'Администратор'], denied_state=ConversationHandler.END, use_cache=False)
+async def handle_export_format(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Формирование файла выгрузки и отправка его одним документом."""
+    query = update.callback_query
+    await query.answer()
+
+    # Роль прочитана декоратором из базы в обход кэша: user_data могли очистить, а роль - снять
+    user_data = context.user_data
+    scope = user_data.pop('export_scope', None)
+    scope_id = user_data.pop('export_id', None)
+    file_format = query.data
+    if scope not in EXPORT_SCOPES:
+        await query.edit_message_text("Выгрузка не выбрана. Начните заново: /export")
+        return ConversationHandler.END
+
+    # Учитель выгружает только свои классы; без ограничения - только администратор
+    role_name = user_data.get('role_name')
+    if role_name == 'Учитель':
+        teacher_id = user_data['user_id']
+    elif role_name == 'Администратор':
+        teacher_id = None
+    else:
+        await query.edit_message_text("У вас недостаточно прав для выгрузки.")
+        return ConversationHandler.END
+    await query.edit_message_text("Формирую файл, это может занять некоторое время...")
+
+    temp_path = new_temp_path(f".{file_format}")
+    try:
+        count = await export_submissions_async(scope, file_format, temp_path, scope_id, teacher_id)
+        if count is None:
+            await update.effective_message.reply_text("Ошибка при формировании выгрузки.")
+        elif count == 0:
+            await update.effective_message.reply_text("Нет данных для выгрузки (или нет доступа к выбранному классу/согласию).")
+        elif os.path.getsize(temp_path) > EXPORT_MAX_FILE_SIZE:
+            await update.effective_message.reply_text("Файл слишком большой для отправки. Выберите согласие или класс.")
+        else:
+            suffix = f"{scope}_{scope_id}" if scope_id is not None else scope
+            filename = f"export_{suffix}_{datetime.now().strftime('%Y%m%d_%H%M')}.{file_format}"
+            with open(temp_path, 'rb') as f:
+                await update.effective_message.reply_document(document=f, filename=filename,
+                                                              caption=f"Выгружено строк: {count}")
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return ConversationHandler.END
+
+async def cancel_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отмена разговора."""
+    await update.message.reply_text("Выгрузка отменена.")
+    context.user_data.pop('export_scope', None)
+    context.user_data.pop('export_id', None)
+    return ConversationHandler.END
+
+export_conv_handler = ConversationHandler(
+    entry_points=[CommandHandler('export', export_start)],
+    states={
+        EXPORT_SCOPE: [CallbackQueryHandler(handle_export_scope, pattern="^(consent|class|school)$")],
+        EXPORT_ID: [MessageHandler(filters.TEXT & ~filters.COMMAND, handle_export_id_input)],
+        EXPORT_FORMAT: [CallbackQueryHandler(handle_export_format, pattern="^(csv|xlsx)$")],
+    },
+    fallbacks=[CommandHandler('cancel', cancel_export)],
+    name='export',
+    persistent=True
+)
@@ -1,6 +1,6 @@
 from telegram import Update
 from telegram.ext import ContextTypes
-from models.user import get_user_by_telegram_id, create_user
+from models.user import get_user_by_telegram_id_async, create_user_async
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,7 +11,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     telegram_id = user.id
 
     # Проверяем, есть ли пользователь в базе данных
-    user_data = get_user_by_telegram_id(telegram_id)
+    user_data = await get_user_by_telegram_id_async(telegram_id)
 
     if user_data:
         # Пользователь уже существует
@@ -24,7 +24,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Новый пользователь - создаем его с ролью "Родитель" (id=3)
         # В реальном приложении здесь может быть более сложная логика (например, ввод кода приглашения).
         # Пока что просто создаем с ролью "Родитель".
-        create_user(telegram_id, role_id=3)  # 3 - id роли "Родитель"
+        await create_user_async(telegram_id, role_id=3)  # 3 - id роли "Родитель"
         logger.info(f"Зарегистрирован новый пользователь {telegram_id} с ролью 'Родитель'.")
         await update.message.reply_html(
             rf"Привет, {user.mention_html()}! Вы успешно зарегистрировались как Родитель. Используйте /help для получения списка команд."
@@ -1,12 +1,21 @@
-from telegram import Update
-from telegram.ext import ContextTypes
-from models.class_ import get_classes_by_teacher, create_class
-from models.student import add_student_and_parent
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, filters, CommandHandler, CallbackQueryHandler
+from models.class_ import get_classes_by_teacher_async, create_class_async
+from models.student import add_student_and_parent_async, import_students_async
 from utils.auth import require_role
+from utils.roster_import import parse_roster, ROSTER_MAX_FILE_SIZE
+from utils.storage import new_temp_path
+import asyncio
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Константы для состояний разговора импорта списка класса
+ROSTER_CLASS, ROSTER_FILE = range(2)
+# Сколько отклоненных строк перечислять в ответе
+ROSTER_REJECTED_SHOWN = 20
+
 @require_role(['Учитель'])
 async def add_class(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Создает новый класс."""
@@ -15,16 +24,10 @@ async def add_class(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     class_name = " ".join(context.args)
-    teacher_telegram_id = update.effective_user.id
-
-    from models.user import get_user_by_telegram_id
-    teacher_data = get_user_by_telegram_id(teacher_telegram_id)
-    if not teacher_data:
-        await update.message.reply_text("Ошибка: Не удалось получить данные учителя.")
-        return
 
-    teacher_id = teacher_data['id']
-    new_class_id = create_class(class_name, teacher_id)
+    # id учителя уже получен декоратором require_role
+    teacher_id = context.user_data['user_id']
+    new_class_id = await create_class_async(class_name, teacher_id)
 
     if new_class_id:
         await update.message.reply_text(f"Класс '{class_name}' успешно создан с ID {new_class_id}.")
@@ -35,16 +38,9 @@ async def add_class(update: Update, context: ContextTypes.DEFAULT_TYPE):
 @require_role(['Учитель'])
 async def my_classes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает список классов учителя."""
-    teacher_telegram_id = update.effective_user.id
-
-    from models.user import get_user_by_telegram_id
-    teacher_data = get_user_by_telegram_id(teacher_telegram_id)
-    if not teacher_data:
-        await update.message.reply_text("Ошибка: Не удалось получить данные учителя.")
-        return
-
-    teacher_id = teacher_data['id']
-    classes = get_classes_by_teacher(teacher_id)
+    # id учителя уже получен декоратором require_role
+    teacher_id = context.user_data['user_id']
+    classes = await get_classes_by_teacher_async(teacher_id)
 
     if not classes:
         await update.message.reply_text("У вас нет созданных классов.")
@@ -69,9 +65,127 @@ async def add_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Неверный формат. Убедитесь, что ID класса - это число.")
         return
 
-    student_id = add_student_and_parent(class_id, student_full_name, parent_full_name)
+    student_id = await add_student_and_parent_async(class_id, student_full_name, parent_full_name)
 
     if student_id:
         await update.message.reply_text(f"Ученик '{student_full_name}' и родитель '{parent_full_name}' успешно добавлены. ID ученика: {student_id}.")
     else:
-        await update.message.reply_text(f"Ошибка при добавлении ученика '{student_full_name}'.")
\ No newline at end of file
+        await update.message.reply_text(f"Ошибка при добавлении ученика '{student_full_name}'.")
+
+
+@require_role(['Учитель'])
+async def import_roster_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Начало разговора для импорта списка класса из файла."""
+    teacher_id = context.user_data['user_id']
+    classes = await get_classes_by_teacher_async(teacher_id)
+
+    if not classes:
+        await update.message.reply_text("У вас нет созданных классов.")
+        return ConversationHandler.END
+
+    keyboard = [[InlineKeyboardButton(class_info['name'], callback_data=str(class_info['id']))] for class_info in classes]
+    await update.message.reply_text("Выберите класс, в который нужно загрузить список учеников:",
+                                    reply_markup=InlineKeyboardMarkup(keyboard))
+    return ROSTER_CLASS
+
+
+async def handle_roster_class(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение выбранного класса и запрос файла со списком."""
+    query = update.callback_query
+    await query.answer()
+
+    context.user_data['roster_class_id'] = int(query.data)
+    await query.edit_message_text(
+        "Отправьте файл CSV или XLSX со столбцами 'ФИО ученика' и 'ФИО родителя' (по одному ученику в строке)."
+    )
+    return ROSTER_FILE
+
+
+@require_role(['Учитель'], denied_state=ConversationHandler.END, use_cache=False)
+async def handle_roster_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Получение файла со списком, разбор и импорт учеников."""
+    # Роль перед импортом читается из базы в обход кэша: user_data могли очистить, а учителя - снять
+    user_data = context.user_data
+    class_id = user_data.get('roster_class_id')
+    if class_id is None:
+        await update.message.reply_text("Класс не выбран. Начните импорт заново: /import_roster")
+        return ConversationHandler.END
+
+    file = update.message.document
+
+    if not file:
+        await update.message.reply_text("Пожалуйста, отправьте файл.")
+        return ROSTER_FILE
+
+    file_extension = os.path.splitext(file.file_name or "")[1].lower()
+    if file_extension not in ['.csv', '.xlsx']:
+        await update.message.reply_text("Неподдерживаемый формат файла. Пожалуйста, отправьте CSV или XLSX файл.")
+        return ROSTER_FILE
+
+    if file.file_size and file.file_size > ROSTER_MAX_FILE_SIZE:
+        await update.message.reply_text(f"Файл слишком большой (максимум {ROSTER_MAX_FILE_SIZE // (1024 * 1024)} МБ).")
+        return ROSTER_FILE
+
+    # Файл списка нужен только на время импорта и в хранилище не попадает
+    temp_path = new_temp_path(file_extension)
+    try:
+        new_file = await context.bot.get_file(file.file_id)
+        await new_file.download_to_drive(temp_path)
+        rows, rejected = await asyncio.to_thread(parse_roster, temp_path)
+    except ValueError as e:
+        await update.message.reply_text(f"Не удалось разобрать файл: {e}")
+        return ROSTER_FILE
+    except Exception as e:
+        logger.error(f"Ошибка при чтении файла списка класса: {e}")
+        await update.message.reply_text("Произошла ошибка при чтении файла. Попробуйте еще раз.")
+        return ROSTER_FILE
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    user_data.pop('roster_class_id', None)
+    result = {'imported': 0, 'rejected': [], 'submissions': 0}
+    if rows:
+        result = await import_students_async(class_id, user_data['user_id'], rows)
+        if result is None:
+            await update.message.reply_text("Ошибка при импорте списка. Ни один ученик не добавлен.")
+            return ConversationHandler.END
+
+    rejected = sorted(rejected + result['rejected'])
+    report_lines = [
+        f"Импорт завершен. Добавлено учеников: {result['imported']}, отклонено строк: {len(rejected)}.",
+    ]
+    if result['submissions']:
+        report_lines.append(f"Новым ученикам назначено открытых согласий: {result['submissions']}.")
+    if rejected:
+        report_lines.append("")
+        report_lines.append("Отклоненные строки:")
+        for line_number, reason in rejected[:ROSTER_REJECTED_SHOWN]:
+            report_lines.append(f"  - строка {line_number}: {reason}")
+        if len(rejected) > ROSTER_REJECTED_SHOWN:
+            report_lines.append(f"  ... и еще {len(rejected) - ROSTER_REJECTED_SHOWN}")
+
+    report_text = "\n".join(report_lines)
+    for i in range(0, len(report_text), 4096):
+        await update.message.reply_text(report_text[i:i + 4096])
+    return ConversationHandler.END
+
+
+async def cancel_import_roster(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Отмена разговора."""
+    await update.message.reply_text("Импорт списка класса отменен.")
+    context.user_data.pop('roster_class_id', None)
+    return ConversationHandler.END
+
+
+# Определяем ConversationHandler
+import_roster_conv_handler = ConversationHandler(
+    entry_points=[CommandHandler('import_roster', import_roster_start)],
+    states={
+        ROSTER_CLASS: [CallbackQueryHandler(handle_roster_class)],
+        ROSTER_FILE: [MessageHandler(filters.Document.ALL, handle_roster_file)],
+    },
+    fallbacks=[CommandHandler('cancel', cancel_import_roster)],
+    name='import_roster',
+    persistent=True
+)
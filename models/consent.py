@@ -1,160 +1,305 @@
-from db.connection import get_db_connection
+from db.connection import db_connection, to_async
 from psycopg2.extras import RealDictCursor
 import logging
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
-def create_consent(name: str, file_path: str, deadline_str: str, class_id: int):
+def _create_consents(cursor, name: str, file_path: str, deadline_str: str, class_ids: list,
+                     file_id: str = None, file_unique_id: str = None) -> dict:
+    """
+    Создает по согласию на каждый класс и записи в consent_submissions для всех их учеников.
+    file_id и file_unique_id - идентификаторы файла шаблона в Telegram.
+    Выполняет два запроса независимо от числа классов и учеников.
+    Возвращает {class_id: {'consent_id': ..., 'submissions': ...}}.
+    """
+    # 1. Создаем записи о согласиях сразу для всех классов
+    cursor.execute("""
+        INSERT INTO consents (name, file_path, deadline, class_id, telegram_file_id, telegram_file_unique_id)
+        SELECT %s, %s, %s, class_id, %s, %s
+        FROM unnest(%s::int[]) WITH ORDINALITY AS t(class_id, ord)
+        ORDER BY ord
+        RETURNING id, class_id;
+    """, (name, file_path, deadline_str, file_id, file_unique_id, class_ids))
+    result = {row['class_id']: {'consent_id': row['id'], 'submissions': 0} for row in cursor.fetchall()}
+
+    # 2. Создаем записи в consent_submissions для всех учеников этих классов одним INSERT ... SELECT
+    consent_ids = [created['consent_id'] for created in result.values()]
+    cursor.execute("""
+        WITH inserted AS (
+            INSERT INTO consent_submissions (student_id, consent_id, status)
+            SELECT s.id, c.id, 'Не сдано'
+            FROM consents c
+            JOIN students s ON s.class_id = c.class_id
+            WHERE c.id = ANY(%s)
+            RETURNING consent_id
+        )
+        SELECT consent_id, COUNT(*) AS count FROM inserted GROUP BY consent_id;
+    """, (consent_ids,))
+    counts = {row['consent_id']: row['count'] for row in cursor.fetchall()}
+    for created in result.values():
+        created['submissions'] = counts.get(created['consent_id'], 0)
+    return result
+
+
+def create_consent(name: str, file_path: str, deadline_str: str, class_id: int,
+                   file_id: str = None, file_unique_id: str = None):
     """
     Создает новое согласие и автоматически создает записи в consent_submissions
     для всех учеников в указанном классе.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # 1. Создаем запись о согласии
-            cursor.execute(
-                "INSERT INTO consents (name, file_path, deadline, class_id) VALUES (%s, %s, %s, %s) RETURNING id;",
-                (name, file_path, deadline_str, class_id)
-            )
-            consent_id = cursor.fetchone()['id']
-
-            # 2. Получаем всех учеников из класса
-            cursor.execute(
-                "SELECT id FROM students WHERE class_id = %s;",
-                (class_id,)
-            )
-            students = cursor.fetchall()
-
-            # 3. Создаем записи в consent_submissions для каждого ученика
-            for student in students:
-                student_id = student['id']
-                cursor.execute(
-                    "INSERT INTO consent_submissions (student_id, consent_id, status) VALUES (%s, %s, 'Не сдано');",
-                    (student_id, consent_id)
-                )
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                created = _create_consents(cursor, name, file_path, deadline_str, [class_id],
+                                           file_id, file_unique_id)[class_id]
+                conn.commit()
+                consent_id = created['consent_id']
+                logger.info(f"Создано новое согласие '{name}' (id {consent_id}) для класса {class_id}. Создано {created['submissions']} записей для учеников.")
+                return consent_id
+        except Exception as e:
+            logger.error(f"Ошибка при создании согласия '{name}' для класса {class_id}: {e}")
+            conn.rollback()
+            return None
+
+
+def create_consent_for_classes(name: str, file_path: str, deadline_str: str, class_ids: list,
+                               file_id: str = None, file_unique_id: str = None):
+    """
+    Создает одно и то же согласие сразу для нескольких классов в одной транзакции.
+    Возвращает словарь {class_id: {'consent_id': ..., 'submissions': ...}}
+    или None в случае ошибки (тогда не создается ничего).
+    """
+    class_ids = list(dict.fromkeys(class_ids))  # Убираем повторы, сохраняя порядок
+    if not class_ids:
+        return {}
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                result = _create_consents(cursor, name, file_path, deadline_str, class_ids, file_id, file_unique_id)
+                conn.commit()
+                total = sum(created['submissions'] for created in result.values())
+                logger.info(f"Создано согласие '{name}' для {len(result)} классов. Создано {total} записей для учеников.")
+                return result
+        except Exception as e:
+            logger.error(f"Ошибка при создании согласия '{name}' для классов {class_ids}: {e}")
+            conn.rollback()
+            return None
+
 
-            conn.commit()
-            logger.info(f"Создано новое согласие '{name}' (id {consent_id}) для класса {class_id}. Создано {len(students)} записей для учеников.")
-            return consent_id
-    except Exception as e:
-        logger.error(f"Ошибка при создании согласия '{name}' для класса {class_id}: {e}")
-        conn.rollback()
-        return None
-    finally:
-        conn.close()
+# Согласия класса, новые первыми
+_CONSENTS_BY_CLASS_SQL = "SELECT id, name, file_path, deadline FROM consents WHERE class_id = %s ORDER BY created_at DESC;"
 
 
 def get_consents_by_class(class_id: int):
     """
     Получает список согласий, созданных для указанного класса.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(
-                "SELECT id, name, file_path, deadline FROM consents WHERE class_id = %s ORDER BY created_at DESC;",
-                (class_id,)
-            )
-            consents = cursor.fetchall()
-            return consents
-    except Exception as e:
-        logger.error(f"Ошибка при получении согласий для класса {class_id}: {e}")
-        return []
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(_CONSENTS_BY_CLASS_SQL, (class_id,))
+                consents = cursor.fetchall()
+                return consents
+        except Exception as e:
+            logger.error(f"Ошибка при получении согласий для класса {class_id}: {e}")
+            return []
 
 
 def get_consent_by_id(consent_id: int):
     """
     Получает информацию о конкретном согласии по его ID.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            cursor.execute(
-                "SELECT id, name, file_path, deadline, class_id FROM consents WHERE id = %s;",
-                (consent_id,)
-            )
-            consent = cursor.fetchone()
-            return consent
-    except Exception as e:
-        logger.error(f"Ошибка при получении согласия с id {consent_id}: {e}")
-        return None
-    finally:
-        conn.close()
-
-
-def get_consents_by_parent(parent_user_id: int):
-    """
-    Получает список согласий, связанных с ребенком родителя.
-    """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Получаем student_id, связанного с родителем
-            cursor.execute(
-                "SELECT student_id FROM parents WHERE user_id = %s;",
-                (parent_user_id,)
-            )
-            parent_link = cursor.fetchone()
-
-            if not parent_link:
-                logger.warning(f"Родитель с user_id {parent_user_id} не связан с учеником.")
-                return []
-
-            student_id = parent_link['student_id']
-
-            # Получаем все согласия для этого ученика с информацией о статусе
-            cursor.execute("""
-                SELECT
-                    cs.id AS consent_submission_id,
-                    c.id AS consent_id,
-                    c.name AS consent_name,
-                    c.file_path AS consent_file_path,
-                    c.deadline,
-                    cs.status AS submission_status,
-                    cs.submitted_file_path
-                FROM
-                    consent_submissions cs
-                JOIN
-                    consents c ON cs.consent_id = c.id
-                WHERE
-                    cs.student_id = %s
-                ORDER BY
-                    c.created_at DESC;
-            """)
-            consents = cursor.fetchall()
-            return consents
-    except Exception as e:
-        logger.error(f"Ошибка при получении согласий для родителя {parent_user_id}: {e}")
-        return []
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute(
+                    "SELECT id, name, file_path, deadline, class_id, telegram_file_id FROM consents WHERE id = %s;",
+                    (consent_id,)
+                )
+                consent = cursor.fetchone()
+                return consent
+        except Exception as e:
+            logger.error(f"Ошибка при получении согласия с id {consent_id}: {e}")
+            return None
+
+
+def get_consent_template(consent_id: int, user_id: int, any_class: bool = False):
+    """
+    Получает шаблон согласия (название, путь к файлу и telegram_file_id), если пользователь
+    может его получить: он учитель класса или родитель ученика этого класса.
+    При any_class=True (администратор) проверка не выполняется.
+    """
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT c.id, c.name, c.file_path, c.telegram_file_id
+                    FROM consents c
+                    JOIN classes cl ON cl.id = c.class_id
+                    WHERE c.id = %s AND (
+                        %s
+                        OR cl.teacher_id = %s
+                        OR EXISTS (
+                            SELECT 1 FROM parents p
+                            JOIN students s ON s.id = p.student_id
+                            WHERE p.user_id = %s AND s.class_id = c.class_id
+                        )
+                    );
+                """, (consent_id, any_class, user_id, user_id))
+                return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Ошибка при получении шаблона согласия с id {consent_id}: {e}")
+            return None
+
+
+def update_consent_file_id(file_path: str, file_id: str, file_unique_id: str = None):
+    """
+    Сохраняет новый telegram_file_id для всех согласий с этим файлом шаблона
+    (после повторной загрузки файла, если прежний file_id перестал действовать).
+    """
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE consents
+                    SET telegram_file_id = %s, telegram_file_unique_id = COALESCE(%s, telegram_file_unique_id)
+                    WHERE file_path = %s;
+                """, (file_id, file_unique_id, file_path))
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении telegram_file_id для файла {file_path}: {e}")
+            conn.rollback()
+
+
+# Согласия детей родителя страницами (ключ страницы - created_at, id записи о сдаче)
+_CONSENTS_BY_PARENT_SQL = """
+    SELECT
+        s.id AS student_id,
+        s.full_name AS student_name,
+        cs.id AS consent_submission_id,
+        c.id AS consent_id,
+        c.name AS consent_name,
+        c.file_path AS consent_file_path,
+        c.deadline,
+        c.created_at,
+        cs.status AS submission_status,
+        cs.submitted_file_path
+    FROM
+        parents p
+    JOIN
+        students s ON s.id = p.student_id
+    JOIN
+        consent_submissions cs ON cs.student_id = s.id
+    JOIN
+        consents c ON c.id = cs.consent_id
+    WHERE
+        p.user_id = %s
+        AND (%s::timestamptz IS NULL OR (c.created_at, cs.id) < (%s::timestamptz, %s::int))
+    ORDER BY
+        c.created_at DESC, cs.id DESC
+    LIMIT %s;
+"""
+
+
+def get_consents_by_parent(parent_user_id: int, limit: int = 20, after: tuple = None):
+    """
+    Получает согласия всех детей родителя одним запросом, страницами по limit записей.
+    Записи упорядочены по (created_at, consent_submission_id) по убыванию; after - курсор
+    (created_at, consent_submission_id) последней записи предыдущей страницы.
+    Возвращает {'children': [{'student_id', 'student_name', 'consents': [...]}], 'next_cursor'};
+    next_cursor равен None, если это последняя страница.
+    """
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                after_created_at, after_id = after if after else (None, None)
+                # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+                cursor.execute(_CONSENTS_BY_PARENT_SQL, (parent_user_id, after_created_at, after_created_at, after_id, limit + 1))
+                rows = cursor.fetchall()
+
+                next_cursor = None
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    next_cursor = (rows[-1]['created_at'], rows[-1]['consent_submission_id'])
+
+                # Группируем записи страницы по детям, сохраняя порядок
+                children = {}
+                for row in rows:
+                    child = children.setdefault(row['student_id'], {
+                        'student_id': row['student_id'],
+                        'student_name': row['student_name'],
+                        'consents': [],
+                    })
+                    child['consents'].append(row)
+                return {'children': list(children.values()), 'next_cursor': next_cursor}
+        except Exception as e:
+            logger.error(f"Ошибка при получении согласий для родителя {parent_user_id}: {e}")
+            return {'children': [], 'next_cursor': None}
+
+
+def get_parent_submissions_for_consent(parent_user_id: int, consent_id: int):
+    """
+    Получает записи о сдаче согласия consent_id для детей родителя (по одной на ребенка).
+    Пустой список, если согласие не относится ни к одному из детей.
+    """
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT
+                        cs.id AS consent_submission_id,
+                        cs.status AS submission_status,
+                        s.id AS student_id,
+                        s.full_name AS student_name
+                    FROM
+                        parents p
+                    JOIN
+                        students s ON s.id = p.student_id
+                    JOIN
+                        consent_submissions cs ON cs.student_id = s.id AND cs.consent_id = %s
+                    WHERE
+                        p.user_id = %s
+                    ORDER BY
+                        s.full_name;
+                """, (consent_id, parent_user_id))
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении согласия {consent_id} для родителя {parent_user_id}: {e}")
+            return []
 
 
 def update_submission_status(submission_id: int, status: str, file_path: str = None):
     """
     Обновляет статус сдачи согласия.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor() as cursor:
-            if file_path:
-                cursor.execute(
-                    "UPDATE consent_submissions SET status = %s, submitted_file_path = %s WHERE id = %s;",
-                    (status, file_path, submission_id)
-                )
-            else:
-                cursor.execute(
-                    "UPDATE consent_submissions SET status = %s WHERE id = %s;",
-                    (status, submission_id)
-                )
-            conn.commit()
-            logger.info(f"Статус согласия с id {submission_id} обновлен на '{status}'.")
-    except Exception as e:
-        logger.error(f"Ошибка при обновлении статуса согласия с id {submission_id}: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
\ No newline at end of file
+    with db_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                if file_path:
+                    cursor.execute(
+                        "UPDATE consent_submissions SET status = %s, submitted_file_path = %s, updated_at = NOW() WHERE id = %s;",
+                        (status, file_path, submission_id)
+                    )
+                else:
+                    cursor.execute(
+                        "UPDATE consent_submissions SET status = %s, updated_at = NOW() WHERE id = %s;",
+                        (status, submission_id)
+                    )
+                conn.commit()
+                logger.info(f"Статус согласия с id {submission_id} обновлен на '{status}'.")
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении статуса согласия с id {submission_id}: {e}")
+            conn.rollback()
+
+
+# Асинхронные версии для вызова из обработчиков без блокировки цикла событий
+create_consent_async = to_async(create_consent)
+create_consent_for_classes_async = to_async(create_consent_for_classes)
+get_consents_by_class_async = to_async(get_consents_by_class)
+get_consent_by_id_async = to_async(get_consent_by_id)
+get_consent_template_async = to_async(get_consent_template)
+update_consent_file_id_async = to_async(update_consent_file_id)
+get_consents_by_parent_async = to_async(get_consents_by_parent)
+get_parent_submissions_for_consent_async = to_async(get_parent_submissions_for_consent)
+update_submission_status_async = to_async(update_submission_status)
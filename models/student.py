@@ -1,49 +1,131 @@
-from db.connection import get_db_connection
+from db.connection import db_connection, to_async
 from psycopg2.extras import RealDictCursor
 from models.user import create_user
 import logging
+import os
 
 logger = logging.getLogger(__name__)
 
+# Сколько учеников вставляется одним многострочным INSERT при импорте списка класса
+ROSTER_IMPORT_BATCH_SIZE = int(os.getenv('ROSTER_IMPORT_BATCH_SIZE', '1000'))
+
 def add_student_and_parent(class_id: int, student_full_name: str, parent_full_name: str):
     """
     Добавляет ученика в класс и создает для родителя "заглушку" в таблице users (роль "Родитель").
     Затем связывает родителя и ученика в таблице parents.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # 1. Создаем "заглушку" для родителя в таблице users
-            # Родитель пока не зарегистрирован в боте, но у него есть "заглушка" для связи с учеником.
-            # Мы создаем пользователя с telegram_id = NULL или используем другой подход.
-            # В данном случае, я создам пользователя с telegram_id = 0 (что означает, что он не зарегистрирован).
-            # В реальном приложении telegram_id будет заполнен, когда родитель зарегистрируется.
-            # Мы создаем пользователя с ролью "Родитель" (id=3).
-            cursor.execute(
-                "INSERT INTO users (telegram_id, role_id) VALUES (0, 3) RETURNING id;",
-                ()
-            )
-            parent_user_id = cursor.fetchone()['id']
-
-            # 2. Создаем запись об ученике
-            cursor.execute(
-                "INSERT INTO students (full_name, class_id) VALUES (%s, %s) RETURNING id;",
-                (student_full_name, class_id)
-            )
-            student_id = cursor.fetchone()['id']
-
-            # 3. Создаем связь между родителем (его "заглушкой" в users) и учеником в таблице parents
-            cursor.execute(
-                "INSERT INTO parents (user_id, student_id) VALUES (%s, %s);",
-                (parent_user_id, student_id)
-            )
-
-            conn.commit()
-            logger.info(f"Добавлен ученик '{student_full_name}' (id {student_id}) в класс {class_id}. Создана связь с родителем (user_id {parent_user_id}).")
-            return student_id
-    except Exception as e:
-        logger.error(f"Ошибка при добавлении ученика '{student_full_name}' и родителя: {e}")
-        conn.rollback()
-        return None
-    finally:
-        conn.close()
\ No newline at end of file
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                # 1. Создаем "заглушку" для родителя в таблице users
+                # Родитель пока не зарегистрирован в боте, но у него есть "заглушка" для связи с учеником.
+                # Мы создаем пользователя с telegram_id = NULL или используем другой подход.
+                # В данном случае, я создам пользователя с telegram_id = 0 (что означает, что он не зарегистрирован).
+                # В реальном приложении telegram_id будет заполнен, когда родитель зарегистрируется.
+                # Мы создаем пользователя с ролью "Родитель" (id=3).
+                cursor.execute(
+                    "INSERT INTO users (telegram_id, role_id) VALUES (0, 3) RETURNING id;",
+                    ()
+                )
+                parent_user_id = cursor.fetchone()['id']
+
+                # 2. Создаем запись об ученике
+                cursor.execute(
+                    "INSERT INTO students (full_name, class_id) VALUES (%s, %s) RETURNING id;",
+                    (student_full_name, class_id)
+                )
+                student_id = cursor.fetchone()['id']
+
+                # 3. Создаем связь между родителем (его "заглушкой" в users) и учеником в таблице parents
+                cursor.execute(
+                    "INSERT INTO parents (user_id, student_id) VALUES (%s, %s);",
+                    (parent_user_id, student_id)
+                )
+
+                conn.commit()
+                logger.info(f"Добавлен ученик '{student_full_name}' (id {student_id}) в класс {class_id}. Создана связь с родителем (user_id {parent_user_id}).")
+                return student_id
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении ученика '{student_full_name}' и родителя: {e}")
+            conn.rollback()
+            return None
+
+
+# Ученики класса с заданными именами (без учета регистра)
+_EXISTING_STUDENTS_SQL = "SELECT lower(full_name) AS name FROM students WHERE class_id = %s AND lower(full_name) = ANY(%s);"
+
+
+def import_students(class_id: int, teacher_id: int, rows: list, batch_size: int = ROSTER_IMPORT_BATCH_SIZE):
+    """
+    Импортирует список учеников класса одной транзакцией.
+    rows - список {'line', 'student', 'parent'} из utils.roster_import.parse_roster.
+    Для каждой пачки из batch_size учеников одним запросом создаются "заглушки" родителей, ученики
+    и связи в parents. Новым ученикам сразу создаются записи consent_submissions по открытым согласиям класса.
+    Возвращает {'imported', 'rejected', 'submissions'}, None при ошибке или если класс не принадлежит учителю.
+    """
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                # Блокировка строки класса не дает параллельному импорту в тот же класс создать дубликаты
+                cursor.execute("SELECT id FROM classes WHERE id = %s AND teacher_id = %s FOR UPDATE;", (class_id, teacher_id))
+                if cursor.fetchone() is None:
+                    logger.warning(f"Импорт списка отклонен: класс {class_id} не найден у учителя {teacher_id}.")
+                    conn.rollback()
+                    return None
+
+                # Ученики, которые уже есть в классе, не добавляются повторно
+                cursor.execute(_EXISTING_STUDENTS_SQL, (class_id, [row['student'].lower() for row in rows]))
+                existing = {row['name'] for row in cursor.fetchall()}
+                rejected = [(row['line'], f"ученик '{row['student']}' уже есть в классе")
+                            for row in rows if row['student'].lower() in existing]
+                rows = [row for row in rows if row['student'].lower() not in existing]
+
+                student_ids = []
+                for start in range(0, len(rows), batch_size):
+                    names = [row['student'] for row in rows[start:start + batch_size]]
+                    # "Заглушки" родителей (telegram_id = 0, роль "Родитель"), как в add_student_and_parent
+                    cursor.execute(
+                        "INSERT INTO users (telegram_id, role_id) SELECT 0, 3 FROM generate_series(1, %s) RETURNING id;",
+                        (len(names),)
+                    )
+                    parent_ids = [row['id'] for row in cursor.fetchall()]
+                    # WITH ORDINALITY + ORDER BY сохраняет порядок RETURNING таким же, как порядок имен
+                    cursor.execute("""
+                        INSERT INTO students (full_name, class_id)
+                        SELECT t.full_name, %s FROM unnest(%s::text[]) WITH ORDINALITY AS t(full_name, n)
+                        ORDER BY t.n
+                        RETURNING id;
+                    """, (class_id, names))
+                    batch_student_ids = [row['id'] for row in cursor.fetchall()]
+                    cursor.execute(
+                        "INSERT INTO parents (user_id, student_id) SELECT * FROM unnest(%s::int[], %s::int[]);",
+                        (parent_ids, batch_student_ids)
+                    )
+                    student_ids.extend(batch_student_ids)
+
+                submissions = 0
+                if student_ids:
+                    # Открытые согласия класса (дедлайн не прошел) сразу ждут сдачи и от новых учеников
+                    cursor.execute("""
+                        INSERT INTO consent_submissions (consent_id, student_id)
+                        SELECT c.id, s.id
+                        FROM consents c
+                        CROSS JOIN unnest(%s::int[]) AS s(id)
+                        WHERE c.class_id = %s AND (c.deadline IS NULL OR c.deadline > NOW())
+                        ON CONFLICT (student_id, consent_id) DO NOTHING;
+                    """, (student_ids, class_id))
+                    submissions = cursor.rowcount
+
+                conn.commit()
+                logger.info(f"Импорт списка класса {class_id}: добавлено учеников {len(student_ids)}, отклонено {len(rejected)}, "
+                            f"создано записей о сдаче {submissions}.")
+                return {'imported': len(student_ids), 'rejected': rejected, 'submissions': submissions}
+        except Exception as e:
+            logger.error(f"Ошибка при импорте списка класса {class_id}: {e}")
+            conn.rollback()
+            return None
+
+
+# Асинхронные версии для вызова из обработчиков без блокировки цикла событий
+add_student_and_parent_async = to_async(add_student_and_parent)
+import_students_async = to_async(import_students)
@@ -0,0 +1,72 @@
+"""
+Кэш результатов анализа документов (utils/analysis_cache.py): запись, сохраненная по другой версии
+правил (RULESET_VERSION), не выдается как попадание и перезаписывается новым результатом.
+
+Нужна отдельная база со схемой (db/init.sql и python -m db.migrate).
+Имя базы задается TEST_DB_NAME (остальные параметры - DB_*); без него тест пропускается.
+"""
+import hashlib
+import os
+
+import pytest
+
+from utils import analysis_cache
+
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+
+_DETAILS = {'status': 'Отказался', 'text_length': 120, 'matched_keywords': ['не согласен']}
+
+
+@pytest.fixture(scope='module')
+def conn():
+    if not TEST_DB_NAME:
+        pytest.skip("TEST_DB_NAME не задан: тесту кэша анализа нужна отдельная база")
+    psycopg2 = pytest.importorskip('psycopg2')
+    from db import connection
+    with pytest.MonkeyPatch.context() as patch:
+        # База подменяется на все время теста: кэш берет подключения из пула
+        patch.setattr(connection, 'DB_NAME', TEST_DB_NAME)
+        try:
+            conn = connection.get_db_connection()
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"База данных {TEST_DB_NAME} недоступна: {e}")
+        try:
+            yield conn
+        finally:
+            conn.close()
+            connection.close_pool()
+
+
+@pytest.fixture
+def sha256(conn):
+    sha256 = hashlib.sha256(os.urandom(32)).hexdigest()
+    yield sha256
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM document_analysis_cache WHERE sha256 = %s;", (sha256,))
+    conn.commit()
+
+
+def test_ruleset_bump_misses_cache(conn, sha256, monkeypatch):
+    analysis_cache.store_analysis(sha256, _DETAILS)
+    cached = analysis_cache.get_cached_analysis(sha256)
+    assert cached['status'] == 'Отказался'
+
+    # Новые правила распознавания: прежний результат мог быть неверным
+    monkeypatch.setattr(analysis_cache, 'RULESET_VERSION', analysis_cache.RULESET_VERSION + '-next')
+    misses = analysis_cache.get_metrics()['misses']
+    assert analysis_cache.get_cached_analysis(sha256) is None
+    assert analysis_cache.get_metrics()['misses'] == misses + 1
+
+    analysis_cache.store_analysis(sha256, {'status': 'Сдано', 'text_length': 120, 'matched_keywords': []})
+    assert analysis_cache.get_cached_analysis(sha256)['status'] == 'Сдано'
+
+
+def test_evict_removes_entries_of_old_ruleset(conn, sha256, monkeypatch):
+    analysis_cache.store_analysis(sha256, _DETAILS)
+    monkeypatch.setattr(analysis_cache, 'RULESET_VERSION', analysis_cache.RULESET_VERSION + '-next')
+    assert analysis_cache.evict() >= 1
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT 1 AS found FROM document_analysis_cache WHERE sha256 = %s;", (sha256,))
+        assert cursor.fetchone() is None
+    conn.rollback()
@@ -0,0 +1,36 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils import analysis_pool as analysis_pool_module
+from utils.analysis_pool import AnalysisQueueFull, DocumentAnalysisPool
+
+
+def test_timed_out_document_keeps_queue_slot_until_worker_finishes(monkeypatch):
+    release = threading.Event()
+
+    def slow_analysis(file_path):
+        release.wait(5)
+        return {'status': 'Сдано', 'error': None, 'truncated': False}
+
+    monkeypatch.setattr(analysis_pool_module, 'analyze_document_details', slow_analysis)
+    pool = DocumentAnalysisPool(workers=1, timeout=0.05, max_queue=1)
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(pool, '_get_executor', lambda: executor)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await pool._analyze_in_process('slow.pdf')
+        # Рабочий еще разбирает документ: место в очереди занято
+        assert pool.get_metrics()['queue_depth'] == 1
+        with pytest.raises(AnalysisQueueFull):
+            await pool._analyze_in_process('next.pdf')
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        release.set()
+        executor.shutdown(wait=True)
+    assert pool.get_metrics()['queue_depth'] == 0
@@ -0,0 +1,81 @@
+"""
+Снимки статистики (utils/analytics.py) на данных benchmarks.dataset: обычный пересчет
+перестраивает только согласия, отмеченные в analytics_dirty_consents, и их классы.
+
+Нужна отдельная база со схемой (db/init.sql и python -m db.migrate): данные в ней удаляются.
+Имя базы задается TEST_DB_NAME (остальные параметры - DB_*); без него тест пропускается.
+"""
+import os
+
+import pytest
+
+from utils import analytics
+
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+
+
+@pytest.fixture(scope='module')
+def conn():
+    if not TEST_DB_NAME:
+        pytest.skip("TEST_DB_NAME не задан: тесту снимков статистики нужна отдельная база")
+    psycopg2 = pytest.importorskip('psycopg2')
+    from db import connection
+    with pytest.MonkeyPatch.context() as patch:
+        # База подменяется на все время теста: пересчет берет подключения из пула
+        patch.setattr(connection, 'DB_NAME', TEST_DB_NAME)
+        try:
+            conn = connection.get_db_connection()
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"База данных {TEST_DB_NAME} недоступна: {e}")
+        conn.close()
+
+        from benchmarks import dataset
+        dataset.load(dataset.generate(schools=1, seed=42), reset=True)
+        conn = connection.get_db_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+            connection.close_pool()
+
+
+def _query(conn, query: str, params: tuple = ()) -> list:
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    conn.rollback()
+    return rows
+
+
+def _computed_at(conn) -> dict:
+    return {row['consent_id']: row['computed_at']
+            for row in _query(conn, "SELECT consent_id, computed_at FROM consent_stats_snapshots;")}
+
+
+def test_refresh_rebuilds_only_dirty_consents(conn):
+    full = analytics.refresh_snapshots(full=True)
+    assert full['consents'] > 1
+    # Без изменений пересчитывать нечего
+    assert analytics.refresh_snapshots() == {'consents': 0, 'classes': 0}
+    before = _computed_at(conn)
+
+    row = _query(conn, "SELECT cs.id, cs.consent_id, c.class_id FROM consent_submissions cs "
+                       "JOIN consents c ON c.id = cs.consent_id WHERE cs.status = 'Не сдано' ORDER BY cs.id LIMIT 1;")[0]
+    with conn.cursor() as cursor:
+        cursor.execute("UPDATE consent_submissions SET status = 'Сдано', updated_at = NOW() WHERE id = %s;", (row['id'],))
+    conn.commit()
+
+    assert analytics.refresh_snapshots() == {'consents': 1, 'classes': 1}
+    after = _computed_at(conn)
+    assert after.keys() == before.keys()
+    assert after[row['consent_id']] > before[row['consent_id']]
+    assert {consent_id for consent_id in after if after[consent_id] != before[consent_id]} == {row['consent_id']}
+
+    # Снимок совпадает с данными после изменения
+    snapshot = _query(conn, "SELECT submitted, pending FROM consent_stats_snapshots WHERE consent_id = %s;",
+                      (row['consent_id'],))[0]
+    actual = _query(conn, "SELECT COUNT(*) FILTER (WHERE status = 'Сдано') AS submitted, "
+                          "COUNT(*) FILTER (WHERE status = 'Не сдано') AS pending "
+                          "FROM consent_submissions WHERE consent_id = %s;", (row['consent_id'],))[0]
+    assert dict(snapshot) == dict(actual)
+    assert analytics.refresh_snapshots() == {'consents': 0, 'classes': 0}
@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+from telegram.ext import ConversationHandler
+
+from utils import auth
+from utils.auth import require_role
+
+
+class _Message:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+def _call(handler, monkeypatch, roles: dict):
+    """Вызывает обработчик; roles - {use_cache: роль}, как ее вернул бы get_user_by_telegram_id_async."""
+    calls = []
+
+    async def fake_lookup(telegram_id, use_cache=True):
+        calls.append(use_cache)
+        return {'id': 7, 'telegram_id': telegram_id, 'role_name': roles[use_cache]}
+
+    monkeypatch.setattr(auth, 'get_user_by_telegram_id_async', fake_lookup)
+    message = _Message()
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=100), effective_message=message)
+    context = SimpleNamespace(user_data={})
+    return asyncio.run(handler(update, context)), calls, message
+
+
+def test_uncached_check_sees_demotion_hidden_by_cache(monkeypatch):
+    @require_role(['Учитель'], denied_state=ConversationHandler.END, use_cache=False)
+    async def privileged_step(update, context):
+        return 'exported'
+
+    # В кэше другого процесса еще учитель, в базе роль уже снята
+    result, calls, message = _call(privileged_step, monkeypatch, {True: 'Учитель', False: 'Родитель'})
+    assert result == ConversationHandler.END
+    assert calls == [False]
+    assert message.replies
+
+
+def test_cached_check_by_default(monkeypatch):
+    @require_role(['Учитель'])
+    async def command(update, context):
+        return context.user_data['user_id']
+
+    result, calls, _ = _call(command, monkeypatch, {True: 'Учитель', False: 'Учитель'})
+    assert result == 7
+    assert calls == [True]
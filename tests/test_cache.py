@@ -0,0 +1,45 @@
+from utils.cache import TTLCache
+
+
+def test_hit_and_invalidate():
+    cache = TTLCache(ttl=300, max_size=10)
+    cache.set(42, {'id': 1, 'role_name': 'Учитель'})
+    assert cache.get(42) == {'id': 1, 'role_name': 'Учитель'}
+    cache.invalidate(42)
+    assert cache.get(42) is None
+
+
+def test_expired_entry_is_a_miss():
+    cache = TTLCache(ttl=-1, max_size=10)
+    cache.set(42, {'id': 1})
+    assert cache.get(42) is None
+
+
+def test_value_read_before_invalidate_is_not_stored():
+    cache = TTLCache(ttl=300, max_size=10)
+    # Чтение из базы началось до смены роли...
+    generation = cache.generation(42)
+    stale = {'id': 1, 'role_name': 'Учитель'}
+    # ...роль сменили и сбросили запись, пока чтение шло
+    cache.invalidate(42)
+    cache.set(42, stale, generation)
+    assert cache.get(42) is None
+
+    # Следующее чтение после сброса сохраняется
+    generation = cache.generation(42)
+    cache.set(42, {'id': 1, 'role_name': 'Родитель'}, generation)
+    assert cache.get(42) == {'id': 1, 'role_name': 'Родитель'}
+
+
+def test_clear_and_generation_overflow_reject_pending_writes():
+    cache = TTLCache(ttl=300, max_size=2)
+    generation = cache.generation(42)
+    cache.clear()
+    cache.set(42, {'id': 1}, generation)
+    assert cache.get(42) is None
+
+    generation = cache.generation(42)
+    for key in (1, 2, 3):
+        cache.invalidate(key)
+    cache.set(42, {'id': 1}, generation)
+    assert cache.get(42) is None
@@ -0,0 +1,73 @@
+import asyncio
+import time
+
+from telegram.error import BadRequest, Forbidden, RetryAfter
+
+from utils.dispatcher import MessageDispatcher
+
+
+class FakeBot:
+    """Заглушка бота: записывает время каждой попытки отправки и бросает заданные ошибки."""
+
+    def __init__(self, errors: dict = None):
+        self.attempts = []
+        self.errors = {chat_id: list(chat_errors) for chat_id, chat_errors in (errors or {}).items()}
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.attempts.append((chat_id, time.monotonic()))
+        chat_errors = self.errors.get(chat_id)
+        if chat_errors:
+            raise chat_errors.pop(0)
+
+
+def _max_in_window(timestamps: list, window: float) -> int:
+    timestamps = sorted(timestamps)
+    best = 0
+    start = 0
+    for end, stamp in enumerate(timestamps):
+        while stamp - timestamps[start] > window:
+            start += 1
+        best = max(best, end - start + 1)
+    return best
+
+
+def test_global_and_per_chat_rates_are_respected():
+    bot = FakeBot()
+    dispatcher = MessageDispatcher(bot, concurrency=8, global_rate=20, per_chat_rate=10)
+    messages = [{'chat_id': chat_id, 'text': 'Напоминание'} for chat_id in range(30)]
+    messages += [{'chat_id': 'same', 'text': 'Напоминание'} for _ in range(4)]
+
+    report = asyncio.run(dispatcher.send_bulk(messages))
+
+    assert report == {'sent': 34, 'failed': 0, 'retries': 0, 'errors': {}}
+    stamps = [stamp for _, stamp in bot.attempts]
+    # Всплеск до 20 сообщений, дальше не больше 20 в секунду
+    assert _max_in_window(stamps, 0.5) <= 20 + 10 + 1
+    assert stamps[-1] - stamps[0] >= (34 - 20) / 20 * 0.9
+    same = sorted(stamp for chat_id, stamp in bot.attempts if chat_id == 'same')
+    assert all(later - earlier >= 0.09 for earlier, later in zip(same, same[1:]))
+
+
+def test_retry_after_is_honoured_and_retry_succeeds():
+    bot = FakeBot(errors={1: [RetryAfter(0.3)]})
+    dispatcher = MessageDispatcher(bot, concurrency=2, global_rate=100, per_chat_rate=100)
+
+    report = asyncio.run(dispatcher.send_bulk([{'chat_id': 1, 'text': 'Напоминание'}]))
+
+    assert report['sent'] == 1 and report['failed'] == 0 and report['retries'] == 1
+    (_, first), (_, second) = bot.attempts
+    assert second - first >= 0.3 * 0.95
+
+
+def test_forbidden_and_bad_request_fail_without_retry():
+    bot = FakeBot(errors={1: [Forbidden("bot was blocked by the user")], 2: [BadRequest("chat not found")]})
+    dispatcher = MessageDispatcher(bot, concurrency=2, global_rate=100, per_chat_rate=100)
+    messages = [{'chat_id': chat_id, 'text': 'Напоминание'} for chat_id in (1, 2, 3)]
+
+    report = asyncio.run(dispatcher.send_bulk(messages))
+
+    assert report['sent'] == 1 and report['failed'] == 2 and report['retries'] == 0
+    assert set(report['errors']) == {1, 2}
+    assert "blocked" in report['errors'][1]
+    assert [chat_id for chat_id, _ in bot.attempts].count(1) == 1
+    assert [chat_id for chat_id, _ in bot.attempts].count(2) == 1
@@ -0,0 +1,113 @@
+import asyncio
+import zipfile
+
+import pytest
+from docx import Document
+
+from benchmarks.document_analyzer_bench import REFUSAL_SENTENCE, make_pdf
+from utils import analysis_pool as analysis_pool_module
+from utils import document_analyzer
+from utils.analysis_pool import DocumentAnalysisPool
+from utils.document_analyzer import analyze_document_details
+
+CONSENT_TEXT = "Я даю согласие на участие моего ребенка в экскурсии."
+
+
+@pytest.fixture
+def pdf_with_late_refusal(tmp_path):
+    # Отказ на четвертой странице из пяти
+    path = str(tmp_path / 'consent.pdf')
+    make_pdf(path, pages=5, refusal_page=3)
+    return path
+
+
+def _make_docx(path: str, body: str = CONSENT_TEXT, table: str = None, header: str = None, footer: str = None):
+    doc = Document()
+    doc.add_paragraph(body)
+    if table is not None:
+        doc.add_table(rows=1, cols=2).rows[0].cells[1].text = table
+    section = doc.sections[0]
+    if header is not None:
+        section.header.paragraphs[0].text = header
+    if footer is not None:
+        section.footer.paragraphs[0].text = footer
+    doc.save(path)
+    return path
+
+
+def test_pdf_page_cap_marks_result_truncated(pdf_with_late_refusal, monkeypatch):
+    monkeypatch.setattr(document_analyzer, 'ANALYSIS_MAX_PAGES', 2)
+    result = analyze_document_details(pdf_with_late_refusal)
+    assert result['status'] == "Сдано"
+    assert result['truncated'] and not result['error']
+
+    monkeypatch.setattr(document_analyzer, 'ANALYSIS_MAX_PAGES', 10)
+    result = analyze_document_details(pdf_with_late_refusal)
+    assert result['status'] == "Отказался"
+    assert not result['truncated']
+
+
+def test_text_and_time_budgets_mark_result_truncated(pdf_with_late_refusal, monkeypatch):
+    monkeypatch.setattr(document_analyzer, 'ANALYSIS_MAX_TEXT_CHARS', 100)
+    result = analyze_document_details(pdf_with_late_refusal)
+    assert result['truncated'] and result['status'] == "Сдано"
+
+    monkeypatch.setattr(document_analyzer, 'ANALYSIS_MAX_TEXT_CHARS', 10 ** 9)
+    monkeypatch.setattr(document_analyzer, 'ANALYSIS_TIME_BUDGET', -1)
+    result = analyze_document_details(pdf_with_late_refusal)
+    assert result['truncated'] and result['status'] == "Сдано"
+
+
+@pytest.mark.parametrize('part', ['table', 'header', 'footer'])
+def test_docx_refusal_outside_body_text_is_found(tmp_path, part):
+    path = _make_docx(str(tmp_path / 'consent.docx'), **{part: REFUSAL_SENTENCE})
+    result = analyze_document_details(path)
+    assert result['status'] == "Отказался"
+    assert result['matched_keywords'] == ["не даю согласие"]
+
+
+def test_docx_without_refusal_is_submitted(tmp_path):
+    path = _make_docx(str(tmp_path / 'consent.docx'), table="Подпись", header="Школа № 1", footer="Стр. 1")
+    result = analyze_document_details(path)
+    assert result == {'status': "Сдано", 'text_length': result['text_length'], 'matched_keywords': [],
+                      'truncated': False, 'error': False}
+
+
+def test_docx_zip_bomb_is_rejected_before_parsing(tmp_path, monkeypatch):
+    path = str(tmp_path / 'bomb.docx')
+    # Сильно сжимаемый document.xml: несколько мегабайт после распаковки
+    padding = "<w:p><w:r><w:t>" + " " * 1024 + "</w:t></w:r></w:p>"
+    xml = ('<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+           + padding * 4096 + '<w:p><w:r><w:t>' + REFUSAL_SENTENCE + '</w:t></w:r></w:p></w:body></w:document>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('word/document.xml', xml)
+    monkeypatch.setattr(document_analyzer, 'ANALYSIS_MAX_DOCX_XML_BYTES', 1024 * 1024)
+    result = analyze_document_details(path)
+    assert result['error'] and result['matched_keywords'] == []
+
+
+def test_only_complete_results_are_cached(tmp_path, monkeypatch):
+    path = str(tmp_path / 'consent.pdf')
+    make_pdf(path, pages=1)
+    stored = []
+
+    async def fake_run_db(func, *args):
+        if func is analysis_pool_module.store_analysis:
+            stored.append(args)
+        return None
+
+    truncated = []
+
+    async def fake_analysis(file_path):
+        return {'status': "Сдано", 'text_length': 10, 'matched_keywords': [], 'truncated': truncated[-1],
+                'error': False}
+
+    monkeypatch.setattr(analysis_pool_module, 'run_db', fake_run_db)
+    pool = DocumentAnalysisPool()
+    monkeypatch.setattr(pool, '_analyze_in_process', fake_analysis)
+    truncated.append(True)
+    assert asyncio.run(pool.analyze(path)) == "Сдано"
+    assert stored == []
+    truncated.append(False)
+    asyncio.run(pool.analyze(path))
+    assert len(stored) == 1
@@ -0,0 +1,69 @@
+import csv
+import zipfile
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+
+from utils import export
+
+_NS = {'x': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+
+# Строки в том виде, в каком их возвращает курсор выгрузки
+_ROWS = [
+    ('7А', 1, '=HYPERLINK("http://example.com","Согласие")', datetime(2030, 1, 1, tzinfo=timezone.utc),
+     '+Иванов Иван', 'Сдано', datetime(2029, 12, 1, 9, 30, tzinfo=timezone.utc)),
+    ('@7Б', 2, 'Экскурсия <музей> & "театр"', None, '-Петров Петр', 'Не сдано', None),
+    ('7В', 3, 'Поход', None, 'Сидорова Анна\x01', 'Отказался', None),
+]
+
+
+def test_format_rows_escapes_formulas():
+    rows = list(export._format_rows(iter(_ROWS)))
+    assert rows[0][2] == '\'=HYPERLINK("http://example.com","Согласие")'
+    assert rows[0][4] == "'+Иванов Иван"
+    assert rows[1][0] == "'@7Б"
+    assert rows[1][4] == "'-Петров Петр"
+    # Обычный текст, числа и даты не меняются
+    assert rows[0][:2] == ('7А', 1)
+    assert rows[0][3] == '01.01.2030 00:00'
+    assert rows[2][2] == 'Поход'
+
+
+def test_csv_cells_are_escaped(tmp_path):
+    path = tmp_path / 'export.csv'
+    assert export._write_csv(export._format_rows(iter(_ROWS)), str(path)) == len(_ROWS)
+
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    assert rows[0] == list(export.EXPORT_COLUMNS)
+    assert all(not cell.startswith(('=', '+', '-', '@')) for row in rows[1:] for cell in row)
+
+
+def test_streamed_xlsx_is_valid_workbook(tmp_path):
+    path = tmp_path / 'export.xlsx'
+    assert export._write_xlsx(export._format_rows(iter(_ROWS)), str(path)) == len(_ROWS)
+
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        names = archive.namelist()
+        for part in ('[Content_Types].xml', '_rels/.rels', 'xl/workbook.xml',
+                     'xl/_rels/workbook.xml.rels', 'xl/worksheets/sheet1.xml'):
+            assert part in names
+        # Каждая часть - корректный XML
+        parts = {name: ElementTree.fromstring(archive.read(name)) for name in names}
+
+    sheet_rows = parts['xl/worksheets/sheet1.xml'].findall('x:sheetData/x:row', _NS)
+    assert len(sheet_rows) == len(_ROWS) + 1
+    values = []
+    for row in sheet_rows:
+        cells = {}
+        for cell in row.findall('x:c', _NS):
+            text = cell.find('x:is/x:t', _NS)
+            cells[cell.get('r').rstrip('0123456789')] = text.text if text is not None else cell.find('x:v', _NS).text
+        values.append(cells)
+
+    assert values[0]['A'] == export.EXPORT_COLUMNS[0]
+    assert values[1]['C'] == '\'=HYPERLINK("http://example.com","Согласие")'
+    assert values[1]['B'] == '1'
+    assert values[2]['C'] == 'Экскурсия <музей> & "театр"'
+    assert 'D' not in values[2]
+    assert values[3]['E'] == 'Сидорова Анна'
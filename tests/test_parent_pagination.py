@@ -0,0 +1,148 @@
+"""
+Постраничный вывод /my_consents: курсор (created_at, consent_submission_id) в callback_data кнопки
+"Показать еще" и выборка models.consent.get_consents_by_parent после курсора.
+
+Тесту выборки нужна отдельная база со схемой (db/init.sql и python -m db.migrate): данные в ней удаляются.
+Имя базы задается TEST_DB_NAME (остальные параметры - DB_*); без него этот тест пропускается.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from handlers import parent
+from utils import auth
+
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+
+
+class _Message:
+    def __init__(self):
+        self.replies = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+
+
+class _Query:
+    def __init__(self, data: str):
+        self.data = data
+        self.markup_removed = False
+
+    async def answer(self):
+        pass
+
+    async def edit_message_reply_markup(self, reply_markup=None):
+        self.markup_removed = reply_markup is None
+
+
+def _press(callback_data: str, monkeypatch, page: dict) -> list:
+    """Нажимает кнопку с callback_data; возвращает аргументы after, с которыми запрошена страница."""
+    requested = []
+
+    async def fake_lookup(telegram_id, use_cache=True):
+        return {'id': 7, 'telegram_id': telegram_id, 'role_name': 'Родитель'}
+
+    async def fake_page(parent_user_id, limit, after=None):
+        requested.append(after)
+        return page
+
+    monkeypatch.setattr(auth, 'get_user_by_telegram_id_async', fake_lookup)
+    monkeypatch.setattr(parent, 'get_consents_by_parent_async', fake_page)
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=100), effective_message=_Message(),
+                             callback_query=_Query(callback_data))
+    asyncio.run(parent.my_consents_next_page(update, SimpleNamespace(user_data={})))
+    return requested
+
+
+def test_next_page_cursor_round_trips_through_callback(monkeypatch):
+    cursor = (datetime(2030, 1, 2, 3, 4, 5, 678901, tzinfo=timezone.utc), 123456789)
+    markup = parent._next_page_markup({'children': [], 'next_cursor': cursor})
+    callback_data = markup.inline_keyboard[0][0].callback_data
+    assert callback_data.startswith(parent.MY_CONSENTS_PAGE_PREFIX)
+    # Ограничение Telegram на callback_data
+    assert len(callback_data.encode('utf-8')) <= 64
+
+    assert _press(callback_data, monkeypatch, {'children': [], 'next_cursor': None}) == [cursor]
+
+
+def test_malformed_callback_is_ignored(monkeypatch):
+    for callback_data in ('my_consents:', 'my_consents:2030-01-02T03:04:05+00:00', 'my_consents:вчера|1',
+                          'my_consents:2030-01-02T03:04:05+00:00|abc'):
+        assert _press(callback_data, monkeypatch, {'children': [], 'next_cursor': None}) == []
+
+
+def test_last_page_has_no_button():
+    assert parent._next_page_markup({'children': [], 'next_cursor': None}) is None
+
+
+@pytest.fixture(scope='module')
+def conn():
+    if not TEST_DB_NAME:
+        pytest.skip("TEST_DB_NAME не задан: тесту постраничной выборки нужна отдельная база")
+    psycopg2 = pytest.importorskip('psycopg2')
+    from db import connection
+    with pytest.MonkeyPatch.context() as patch:
+        # База подменяется на все время теста: модели берут подключения из пула
+        patch.setattr(connection, 'DB_NAME', TEST_DB_NAME)
+        try:
+            conn = connection.get_db_connection()
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"База данных {TEST_DB_NAME} недоступна: {e}")
+        conn.close()
+
+        from benchmarks import dataset
+        dataset.load(dataset.generate(schools=1, seed=42), reset=True)
+        conn = connection.get_db_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+            connection.close_pool()
+
+
+def test_pages_follow_ties_on_created_at(conn):
+    from models import consent as consent_model
+
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT p.user_id, s.id AS student_id, s.class_id FROM parents p "
+                       "JOIN students s ON s.id = p.student_id ORDER BY p.user_id LIMIT 1;")
+        row = cursor.fetchone()
+        parent_user_id = row['user_id']
+        # Пять согласий с одинаковым created_at (например, созданные одной транзакцией) и одно более раннее
+        created_at = datetime.now(timezone.utc).replace(microsecond=0) + timedelta(days=365)
+        consent_ids = []
+        for number, created in enumerate([created_at] * 5 + [created_at - timedelta(seconds=1)]):
+            cursor.execute("INSERT INTO consents (name, file_path, deadline, class_id, created_at) "
+                           "VALUES (%s, 'test/page.pdf', %s, %s, %s) RETURNING id;",
+                           (f"Тест страниц {number}", created + timedelta(days=30), row['class_id'], created))
+            consent_id = cursor.fetchone()['id']
+            consent_ids.append(consent_id)
+            cursor.execute("INSERT INTO consent_submissions (student_id, consent_id, status) "
+                           "VALUES (%s, %s, 'Не сдано') ON CONFLICT DO NOTHING;", (row['student_id'], consent_id))
+    conn.commit()
+
+    try:
+        seen, after = [], None
+        while len(seen) < 6:
+            page = consent_model.get_consents_by_parent(parent_user_id, limit=2, after=after)
+            rows = [c for child in page['children'] for c in child['consents']]
+            assert rows
+            seen.extend((c['created_at'], c['consent_submission_id'], c['consent_id']) for c in rows)
+            if page['next_cursor'] is None:
+                break
+            # Курсор передается так же, как через callback_data кнопки
+            iso, submission_id = f"{page['next_cursor'][0].isoformat()}|{page['next_cursor'][1]}".rsplit('|', 1)
+            after = (datetime.fromisoformat(iso), int(submission_id))
+
+        # Новые согласия - первые шесть записей: без пропусков и повторов, при равном created_at по cs.id
+        assert {consent_id for _, _, consent_id in seen[:6]} == set(consent_ids)
+        keys = [(created, submission_id) for created, submission_id, _ in seen]
+        assert keys == sorted(keys, reverse=True)
+        assert len(set(keys)) == len(keys)
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM consents WHERE id = ANY(%s);", (consent_ids,))
+        conn.commit()
@@ -0,0 +1,131 @@
+"""
+Планы горячих запросов на данных benchmarks.dataset: поиск по родителю, согласию, классу и дедлайну
+должен идти по индексам (db/migrations/0001_hot_path_indexes.sql, 0002_incremental_deadline_expiry.sql).
+Запросы берутся из констант модулей, поэтому тест проверяет тот же SQL, что выполняет бот.
+
+Нужна отдельная база со схемой (db/init.sql и python -m db.migrate): данные в ней удаляются.
+Имя базы задается TEST_DB_NAME (остальные параметры - DB_*); без него тест пропускается.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+from models import consent as consent_model  # noqa: E402
+from models import student as student_model  # noqa: E402
+from utils import reports, scheduler  # noqa: E402
+
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+
+# Узлы плана, читающие таблицу через индекс
+_INDEX_NODES = ('Index Scan', 'Index Only Scan', 'Bitmap Heap Scan')
+
+
+@pytest.fixture(scope='module')
+def conn():
+    if not TEST_DB_NAME:
+        pytest.skip("TEST_DB_NAME не задан: тесту планов запросов нужна отдельная база")
+    from db import connection
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr(connection, 'DB_NAME', TEST_DB_NAME)
+        try:
+            conn = connection.get_db_connection()
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"База данных {TEST_DB_NAME} недоступна: {e}")
+        conn.close()
+
+        from benchmarks import dataset
+        dataset.load(dataset.generate(schools=5, seed=42), reset=True)
+        conn = connection.get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _scans(plan: dict) -> dict:
+    """Возвращает {таблица: [типы узлов, читающих ее]} по плану EXPLAIN (FORMAT JSON)."""
+    scans = {}
+    if 'Relation Name' in plan:
+        scans.setdefault(plan['Relation Name'], []).append(plan['Node Type'])
+    for child in plan.get('Plans', ()):
+        for table, nodes in _scans(child).items():
+            scans.setdefault(table, []).extend(nodes)
+    return scans
+
+
+def _index_names(plan: dict) -> set:
+    """Возвращает имена индексов, используемых в плане (в том числе узлами Bitmap Index Scan)."""
+    names = {plan['Index Name']} if 'Index Name' in plan else set()
+    for child in plan.get('Plans', ()):
+        names |= _index_names(child)
+    return names
+
+
+def _explain(conn, query: str, params) -> dict:
+    with conn.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+        row = cursor.fetchone()
+    conn.rollback()
+    return row['QUERY PLAN'][0]['Plan']
+
+
+def _first_id(conn, query: str) -> int:
+    with conn.cursor() as cursor:
+        cursor.execute(query)
+        value = cursor.fetchone()['id']
+    conn.rollback()
+    return value
+
+
+def _assert_index_scans(plan: dict, tables: tuple):
+    # Проверяются таблицы, отбираемые по ключу поиска; соединение остальных по первичному ключу
+    # на небольших данных планировщик вправе выполнить через Hash Join
+    scans = _scans(plan)
+    for table in tables:
+        assert table in scans, f"{table} нет в плане: {scans}"
+        assert all(node in _INDEX_NODES for node in scans[table]), f"{table}: {scans[table]}"
+
+
+def test_parent_lookup_uses_indexes(conn):
+    # Первая страница models.consent.get_consents_by_parent
+    parent_id = _first_id(conn, "SELECT user_id AS id FROM parents ORDER BY user_id LIMIT 1;")
+    plan = _explain(conn, consent_model._CONSENTS_BY_PARENT_SQL, (parent_id, None, None, None, 21))
+    _assert_index_scans(plan, ('parents', 'students', 'consent_submissions'))
+
+
+def test_consent_lookup_uses_indexes(conn):
+    consent_id = _first_id(conn, "SELECT id FROM consents ORDER BY id LIMIT 1;")
+    plan = _explain(conn, reports._STATUS_REPORT_SQL, (consent_id,))
+    _assert_index_scans(plan, ('consents', 'consent_submissions'))
+
+
+def test_class_lookup_uses_indexes(conn):
+    class_id = _first_id(conn, "SELECT id FROM classes ORDER BY id LIMIT 1;")
+    plan = _explain(conn, consent_model._CONSENTS_BY_CLASS_SQL, (class_id,))
+    _assert_index_scans(plan, ('consents',))
+    plan = _explain(conn, student_model._EXISTING_STUDENTS_SQL, (class_id, ['иванов иван']))
+    _assert_index_scans(plan, ('students',))
+
+
+def test_deadline_queries_use_indexes(conn):
+    now = datetime.now(timezone.utc)
+    # utils.scheduler._expire_due_consents: дедлайны после прошлой границы и новые согласия
+    plan = _explain(conn, scheduler._DUE_CONSENTS_SQL,
+                    {'cutoff': now, 'since': now - timedelta(days=1), 'limit': scheduler.EXPIRY_BATCH_SIZE})
+    _assert_index_scans(plan, ('consents',))
+    # utils.scheduler.check_upcoming_deadlines: согласия с дедлайном через сутки
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    plan = _explain(conn, scheduler._DEADLINES_BETWEEN_SQL, (day_start, day_start + timedelta(days=1)))
+    _assert_index_scans(plan, ('consents',))
+
+
+def test_reminders_use_pending_index(conn):
+    # utils.scheduler.get_reminder_messages читает только несданные записи: частичный индекс меньше полного
+    consent_id = _first_id(conn, "SELECT consent_id AS id FROM consent_submissions "
+                                 "WHERE status = 'Не сдано' ORDER BY consent_id LIMIT 1;")
+    plan = _explain(conn, scheduler._REMINDERS_SQL, ([consent_id],))
+    _assert_index_scans(plan, ('consents', 'consent_submissions'))
+    assert 'idx_consent_submissions_pending' in _index_names(plan), _index_names(plan)
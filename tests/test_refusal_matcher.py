@@ -0,0 +1,43 @@
+import pytest
+
+from utils.document_analyzer import RefusalMatcher, find_refusal_keywords
+
+
+@pytest.mark.parametrize('text, keyword', [
+    ("Я отказываюсь от участия ребенка в экскурсии.", "отказываюсь"),
+    ("Мы ОТКАЗЫВАЕМСЯ от поездки.", "отказываюсь"),
+    ("Я, мать ученика, не согласна с условиями.", "не согласен"),
+    ("Родители не\nсогласны.", "не согласен"),
+    ("Я против участия.", "против"),
+    ("Оформляю отказ от медосмотра.", "отказ"),
+    ("Не даю согласие на обработку данных.", "не даю согласие"),
+    ("Не даю своего согласия на фотосъемку.", "не даю согласие"),
+    ("Мы не даем своё согласие на выезд.", "не даю согласие"),
+    ("Не разрешаем ребенку участвовать.", "не разрешаю"),
+])
+def test_refusal_word_forms_are_found(text, keyword):
+    assert keyword in find_refusal_keywords(text)
+
+
+@pytest.mark.parametrize('text', [
+    "Я согласен на участие ребенка в экскурсии.",
+    "Даю согласие на обработку персональных данных.",
+    "Даю свое согласие на фотосъемку.",
+    "Разрешаю участие. Противопоказаний нет.",
+    "Противопоказания: отсутствуют.",
+    "Согласие на выезд в лагерь.",
+])
+def test_consent_texts_are_not_refusals(text):
+    assert find_refusal_keywords(text) == []
+
+
+def test_phrase_split_across_chunks_is_found_once():
+    matcher = RefusalMatcher()
+    # Граница страницы приходится внутрь фразы; хвост в 32 символа ее склеивает
+    assert not matcher.feed("Заявление родителя. Настоящим я не даю своего")
+    assert matcher.feed(" согласия на участие в поездке.")
+    # Совпадение, уже учтенное в хвосте, не дублируется
+    matcher.feed("Подпись родителя.")
+    assert matcher.matched_keywords == ["не даю согласие"]
+    assert matcher.text_length == len("Заявление родителя. Настоящим я не даю своего") + len(
+        " согласия на участие в поездке.") + len("Подпись родителя.")
@@ -0,0 +1,16 @@
+import pytest
+
+from benchmarks.roster_import_bench import make_rows, make_xlsx
+from utils import roster_import
+from utils.roster_import import parse_roster
+
+
+def test_xlsx_with_oversized_shared_strings_is_rejected(tmp_path, monkeypatch):
+    path = str(tmp_path / 'roster.xlsx')
+    make_xlsx(path, make_rows(100))
+    rows, rejected = parse_roster(path)
+    assert len(rows) == 100 and not rejected
+
+    monkeypatch.setattr(roster_import, 'ROSTER_MAX_SHARED_STRINGS_BYTES', 1024)
+    with pytest.raises(ValueError):
+        parse_roster(path)
@@ -0,0 +1,111 @@
+"""
+Счетчики consent_status_counters (миграция 0007) на данных benchmarks.dataset: после вставки,
+смены статуса и удаления записей consent_submissions они совпадают с COUNT(*), а
+db.status_counters.rebuild исправляет расхождение, внесенное в обход триггеров.
+
+Нужна отдельная база со схемой (db/init.sql и python -m db.migrate): данные в ней удаляются.
+Имя базы задается TEST_DB_NAME (остальные параметры - DB_*); без него тест пропускается.
+"""
+import os
+
+import pytest
+
+psycopg2 = pytest.importorskip('psycopg2')
+
+from db import status_counters  # noqa: E402
+from models import consent as consent_model  # noqa: E402
+
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+
+
+@pytest.fixture(scope='module')
+def conn():
+    if not TEST_DB_NAME:
+        pytest.skip("TEST_DB_NAME не задан: тесту счетчиков статусов нужна отдельная база")
+    from db import connection
+    with pytest.MonkeyPatch.context() as patch:
+        # База подменяется на все время теста: модели берут подключения из пула
+        patch.setattr(connection, 'DB_NAME', TEST_DB_NAME)
+        try:
+            conn = connection.get_db_connection()
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"База данных {TEST_DB_NAME} недоступна: {e}")
+        conn.close()
+
+        from benchmarks import dataset
+        dataset.load(dataset.generate(schools=1, seed=42), reset=True)
+        conn = connection.get_db_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+            connection.close_pool()
+
+
+def _query(conn, query: str, params: tuple = ()) -> list:
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+    conn.rollback()
+    return rows
+
+
+def _execute(conn, query: str, params: tuple = ()):
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+    conn.commit()
+
+
+def _assert_counters_match(conn, consent_id: int) -> dict:
+    stored = {row['status']: row['count'] for row in _query(
+        conn, "SELECT status, count FROM consent_status_counters WHERE consent_id = %s AND count <> 0;", (consent_id,))}
+    actual = {row['status']: row['count'] for row in _query(
+        conn, "SELECT status, COUNT(*) AS count FROM consent_submissions WHERE consent_id = %s GROUP BY status;",
+        (consent_id,))}
+    assert stored == actual
+    return actual
+
+
+def test_counters_follow_submission_changes(conn):
+    class_id = _query(conn, "SELECT class_id AS id FROM students GROUP BY class_id ORDER BY COUNT(*) DESC LIMIT 1;")[0]['id']
+    students = _query(conn, "SELECT COUNT(*) AS count FROM students WHERE class_id = %s;", (class_id,))[0]['count']
+
+    consent_id = consent_model.create_consent("Тест счетчиков", "test/counters.pdf", "2030-01-01", class_id)
+    assert consent_id is not None
+    try:
+        assert _assert_counters_match(conn, consent_id) == {'Не сдано': students}
+
+        submission_ids = [row['id'] for row in _query(
+            conn, "SELECT id FROM consent_submissions WHERE consent_id = %s ORDER BY id;", (consent_id,))]
+        consent_model.update_submission_status(submission_ids[0], 'Сдано', 'test/counters-signed.pdf')
+        consent_model.update_submission_status(submission_ids[1], 'Отказался')
+        assert _assert_counters_match(conn, consent_id) == {'Не сдано': students - 2, 'Сдано': 1, 'Отказался': 1}
+
+        _execute(conn, "DELETE FROM consent_submissions WHERE id = ANY(%s);", (submission_ids[:2],))
+        assert _assert_counters_match(conn, consent_id) == {'Не сдано': students - 2}
+
+        with conn.cursor() as cursor:
+            assert status_counters.verify(cursor) == []
+        conn.rollback()
+    finally:
+        _execute(conn, "DELETE FROM consents WHERE id = %s;", (consent_id,))
+
+
+def test_rebuild_repairs_drift(conn):
+    consent_id = _query(conn, "SELECT consent_id AS id FROM consent_submissions ORDER BY consent_id LIMIT 1;")[0]['id']
+    # Правка в обход триггеров, как после ручного восстановления данных
+    _execute(conn, "UPDATE consent_status_counters SET count = count + 5 WHERE consent_id = %s;", (consent_id,))
+
+    with conn.cursor() as cursor:
+        mismatches = status_counters.verify(cursor)
+    conn.rollback()
+    assert mismatches and {row['consent_id'] for row in mismatches} == {consent_id}
+
+    with conn.cursor() as cursor:
+        status_counters.rebuild(cursor, [consent_id])
+    conn.commit()
+
+    with conn.cursor() as cursor:
+        assert status_counters.verify(cursor) == []
+    conn.rollback()
+    _assert_counters_match(conn, consent_id)
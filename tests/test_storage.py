@@ -0,0 +1,148 @@
+"""
+Хранилище файлов (utils/storage.py): пути к файлам, счетчики ссылок file_blobs (триггеры миграции 0004)
+и очистка файлов без ссылок с учетом BLOB_GC_GRACE_HOURS.
+
+Тестам счетчиков и очистки нужна отдельная база со схемой (db/init.sql и python -m db.migrate):
+данные в ней удаляются. Имя базы задается TEST_DB_NAME (остальные параметры - DB_*);
+без него эти тесты пропускаются.
+"""
+import hashlib
+import os
+
+import pytest
+
+from utils import storage
+
+TEST_DB_NAME = os.getenv('TEST_DB_NAME')
+
+
+@pytest.fixture
+def uploads_dir(tmp_path, monkeypatch):
+    uploads_dir = tmp_path / 'store'
+    uploads_dir.mkdir()
+    monkeypatch.setattr(storage, 'UPLOADS_DIR', str(uploads_dir))
+    return uploads_dir
+
+
+def _store(uploads_dir, content: bytes) -> str:
+    """Кладет файл в хранилище и возвращает его ключ (без регистрации в базе)."""
+    sha256 = hashlib.sha256(content).hexdigest()
+    blob_key = storage.blob_key_for(sha256, '.pdf')
+    path = uploads_dir / blob_key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return blob_key
+
+
+def test_blob_path_ignores_working_directory(tmp_path, uploads_dir, monkeypatch):
+    blob_key = storage.blob_key_for('ab' * 32, '.pdf')
+    # Файл с тем же относительным путем в текущем каталоге не должен подменять файл хранилища
+    monkeypatch.chdir(tmp_path)
+    stray = tmp_path / blob_key
+    stray.parent.mkdir(parents=True)
+    stray.write_bytes(b'stray')
+
+    assert storage.blob_path(blob_key) == os.path.join(str(uploads_dir), blob_key)
+
+
+def test_blob_path_resolves_legacy_paths_in_uploads_dir(uploads_dir):
+    assert storage.blob_path('uploads/Согласие.pdf') == os.path.join(str(uploads_dir), 'Согласие.pdf')
+
+
+@pytest.fixture(scope='module')
+def conn():
+    if not TEST_DB_NAME:
+        pytest.skip("TEST_DB_NAME не задан: тесту хранилища нужна отдельная база")
+    psycopg2 = pytest.importorskip('psycopg2')
+    from db import connection
+    with pytest.MonkeyPatch.context() as patch:
+        # База подменяется на все время теста: функции хранилища берут подключения из пула
+        patch.setattr(connection, 'DB_NAME', TEST_DB_NAME)
+        try:
+            conn = connection.get_db_connection()
+        except psycopg2.OperationalError as e:
+            pytest.skip(f"База данных {TEST_DB_NAME} недоступна: {e}")
+        conn.close()
+
+        from benchmarks import dataset
+        dataset.load(dataset.generate(schools=1, seed=42), reset=True)
+        conn = connection.get_db_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+            connection.close_pool()
+
+
+def _query_one(conn, query: str, params: tuple = ()):
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        row = cursor.fetchone()
+    conn.rollback()
+    return row
+
+
+def _execute(conn, query: str, params: tuple = ()):
+    with conn.cursor() as cursor:
+        cursor.execute(query, params)
+        row = cursor.fetchone() if cursor.description else None
+    conn.commit()
+    return row
+
+
+def _ref_count(conn, blob_key: str) -> int:
+    return _query_one(conn, "SELECT ref_count FROM file_blobs WHERE blob_key = %s;", (blob_key,))['ref_count']
+
+
+def test_ref_count_follows_references(conn, uploads_dir):
+    template_key = _store(uploads_dir, b'template')
+    signed_key = _store(uploads_dir, b'signed')
+    storage.register_blob(template_key, storage.blob_sha256(template_key), 8)
+    storage.register_blob(signed_key, storage.blob_sha256(signed_key), 6)
+    assert _ref_count(conn, template_key) == 0
+
+    student = _query_one(conn, "SELECT id, class_id FROM students ORDER BY id LIMIT 1;")
+    consent_id = _execute(conn, "INSERT INTO consents (name, file_path, deadline, class_id) "
+                                "VALUES ('Тест хранилища', %s, '2030-01-01', %s) RETURNING id;",
+                          (template_key, student['class_id']))['id']
+    try:
+        assert _ref_count(conn, template_key) == 1
+
+        submission_id = _execute(conn, "INSERT INTO consent_submissions (student_id, consent_id, status, submitted_file_path) "
+                                       "VALUES (%s, %s, 'Сдано', %s) RETURNING id;",
+                                 (student['id'], consent_id, template_key))['id']
+        assert _ref_count(conn, template_key) == 2
+
+        # Смена файла переносит ссылку, повторная запись того же пути ее не меняет
+        _execute(conn, "UPDATE consent_submissions SET submitted_file_path = %s WHERE id = %s;", (signed_key, submission_id))
+        _execute(conn, "UPDATE consent_submissions SET submitted_file_path = %s WHERE id = %s;", (signed_key, submission_id))
+        assert (_ref_count(conn, template_key), _ref_count(conn, signed_key)) == (1, 1)
+    finally:
+        # Каскадное удаление записей о сдаче тоже снимает их ссылки
+        _execute(conn, "DELETE FROM consents WHERE id = %s;", (consent_id,))
+    assert (_ref_count(conn, template_key), _ref_count(conn, signed_key)) == (0, 0)
+
+
+def test_gc_keeps_blobs_within_grace_period(conn, uploads_dir):
+    old_key = _store(uploads_dir, b'old unreferenced')
+    fresh_key = _store(uploads_dir, b'fresh unreferenced')
+    referenced_key = _store(uploads_dir, b'old referenced')
+    for blob_key in (old_key, fresh_key, referenced_key):
+        storage.register_blob(blob_key, storage.blob_sha256(blob_key), 1)
+    _execute(conn, "UPDATE file_blobs SET created_at = NOW() - INTERVAL '3 hours' WHERE blob_key = ANY(%s);",
+             ([old_key, referenced_key],))
+
+    class_id = _query_one(conn, "SELECT id FROM classes ORDER BY id LIMIT 1;")['id']
+    consent_id = _execute(conn, "INSERT INTO consents (name, file_path, deadline, class_id) "
+                                "VALUES ('Тест очистки', %s, '2030-01-01', %s) RETURNING id;",
+                          (referenced_key, class_id))['id']
+    try:
+        # file_blobs не очищается при загрузке данных: могут удалиться и файлы прошлых запусков
+        assert storage.collect_unreferenced_blobs(grace_hours=2) >= 1
+    finally:
+        _execute(conn, "DELETE FROM consents WHERE id = %s;", (consent_id,))
+
+    assert not (uploads_dir / old_key).exists()
+    assert (uploads_dir / fresh_key).exists()
+    assert (uploads_dir / referenced_key).exists()
+    assert _query_one(conn, "SELECT 1 AS found FROM file_blobs WHERE blob_key = %s;", (old_key,)) is None
@@ -0,0 +1,52 @@
+import asyncio
+import time
+
+from telegram import Chat, Message, Update, User
+
+from utils.update_processor import PerUserUpdateProcessor
+
+
+def _update(update_id: int, user_id: int) -> Update:
+    user = User(id=user_id, first_name='Test', is_bot=False)
+    message = Message(message_id=update_id, date=None, chat=Chat(id=user_id, type='private'), from_user=user, text='/my_consents')
+    return Update(update_id=update_id, message=message)
+
+
+async def _handle(events: list, name: str, delay: float):
+    await asyncio.sleep(delay)
+    events.append((name, time.perf_counter()))
+
+
+def test_slow_user_does_not_block_other_users():
+    async def scenario():
+        processor = PerUserUpdateProcessor(32)
+        events = []
+        slow = asyncio.create_task(processor.process_update(_update(1, 1), _handle(events, 'slow', 0.5)))
+        fast = [asyncio.create_task(processor.process_update(_update(i, i), _handle(events, f'fast-{i}', 0.01)))
+                for i in range(2, 50)]
+        started = time.perf_counter()
+        await asyncio.gather(*fast)
+        fast_done = time.perf_counter() - started
+        await slow
+        return fast_done, events
+
+    fast_done, events = asyncio.run(scenario())
+    assert fast_done < 0.25
+    assert events[-1][0] == 'slow'
+
+
+def test_updates_of_one_user_are_processed_in_order():
+    async def scenario():
+        processor = PerUserUpdateProcessor(32)
+        events = []
+        # Первое обновление медленнее второго, но второе должно дождаться его
+        await asyncio.gather(
+            processor.process_update(_update(1, 7), _handle(events, 'first', 0.1)),
+            processor.process_update(_update(2, 7), _handle(events, 'second', 0.0)),
+        )
+        return events, processor
+
+    events, processor = asyncio.run(scenario())
+    assert [name for name, _ in events] == ['first', 'second']
+    # Блокировки завершенных пользователей не накапливаются
+    assert processor._user_locks == {}
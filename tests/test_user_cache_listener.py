@@ -0,0 +1,23 @@
+from utils.cache import TTLCache
+from utils.user_cache_listener import UserCacheListener
+
+
+def test_notification_invalidates_cached_user():
+    cache = TTLCache(ttl=300, max_size=10)
+    cache.set(42, {'id': 1, 'role_name': 'Учитель'})
+    cache.set(43, {'id': 2, 'role_name': 'Учитель'})
+    listener = UserCacheListener(cache=cache)
+    listener._invalidate('42')
+    listener._invalidate('не число')
+    assert cache.get(42) is None
+    assert cache.get(43) is not None
+
+
+def test_disabled_cache_neither_stores_nor_returns():
+    cache = TTLCache(ttl=300, max_size=10)
+    cache.set(42, {'id': 1})
+    cache.enabled = False
+    cache.set(43, {'id': 2})
+    assert cache.get(42) is None
+    cache.enabled = True
+    assert cache.get(43) is None
@@ -0,0 +1,104 @@
+import hashlib
+import logging
+import os
+import threading
+from db.connection import db_connection
+from psycopg2.extras import RealDictCursor
+from utils.document_analyzer import RULESET_VERSION
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# Максимальное число записей в кэше результатов анализа
+DOCUMENT_CACHE_MAX_ENTRIES = int(os.getenv('DOCUMENT_CACHE_MAX_ENTRIES', '50000'))
+# Вытеснение запускается после каждых N сохранений, а не на каждое
+DOCUMENT_CACHE_EVICT_EVERY = int(os.getenv('DOCUMENT_CACHE_EVICT_EVERY', '100'))
+
+_metrics = {'hits': 0, 'misses': 0, 'stores': 0}
+_metrics_lock = threading.Lock()
+
+
+def file_sha256(file_path: str) -> str:
+    """Считает SHA-256 содержимого файла, читая его блоками."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _count(name: str):
+    with _metrics_lock:
+        _metrics[name] += 1
+
+
+def get_cached_analysis(sha256: str):
+    """
+    Возвращает сохраненный результат анализа файла с указанным SHA-256
+    или None, если его нет или он получен по другой версии правил.
+    """
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                UPDATE document_analysis_cache
+                SET last_used_at = NOW()
+                WHERE sha256 = %s AND ruleset_version = %s
+                RETURNING status, text_length, matched_keywords;
+            """, (sha256, RULESET_VERSION))
+            cached = cursor.fetchone()
+            conn.commit()
+    _count('hits' if cached else 'misses')
+    return cached
+
+
+def store_analysis(sha256: str, details: dict):
+    """Сохраняет результат анализа; устаревшая запись с тем же SHA-256 перезаписывается."""
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO document_analysis_cache (sha256, ruleset_version, status, text_length, matched_keywords)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (sha256) DO UPDATE SET
+                    ruleset_version = EXCLUDED.ruleset_version,
+                    status = EXCLUDED.status,
+                    text_length = EXCLUDED.text_length,
+                    matched_keywords = EXCLUDED.matched_keywords,
+                    created_at = NOW(),
+                    last_used_at = NOW();
+            """, (sha256, RULESET_VERSION, details['status'], details['text_length'], details['matched_keywords']))
+            conn.commit()
+    _count('stores')
+    if _metrics['stores'] % DOCUMENT_CACHE_EVICT_EVERY == 0:
+        evict()
+
+
+def evict() -> int:
+    """Удаляет записи по устаревшим правилам и самые давно использованные сверх DOCUMENT_CACHE_MAX_ENTRIES."""
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM document_analysis_cache WHERE ruleset_version <> %s;", (RULESET_VERSION,))
+            deleted = cursor.rowcount
+            cursor.execute("""
+                DELETE FROM document_analysis_cache
+                WHERE sha256 IN (
+                    SELECT sha256 FROM document_analysis_cache
+                    ORDER BY last_used_at DESC
+                    OFFSET %s
+                );
+            """, (DOCUMENT_CACHE_MAX_ENTRIES,))
+            deleted += cursor.rowcount
+            conn.commit()
+    if deleted:
+        logger.info(f"Из кэша анализа документов удалено {deleted} записей.")
+    return deleted
+
+
+def get_metrics() -> dict:
+    """Возвращает число попаданий и промахов кэша и долю попаданий (hit_rate)."""
+    with _metrics_lock:
+        metrics = dict(_metrics)
+    lookups = metrics['hits'] + metrics['misses']
+    metrics['hit_rate'] = metrics['hits'] / lookups if lookups else 0.0
+    return metrics
+
+register_collector('consentpro_analysis_cache', get_metrics)
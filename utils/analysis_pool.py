@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from db.connection import run_db
+from utils.analysis_cache import file_sha256, get_cached_analysis, store_analysis
+from utils.document_analyzer import analyze_document_details
+from utils.metrics import register_collector
+
+logger = logging.getLogger(__name__)
+
+# Число процессов для анализа документов
+ANALYSIS_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '2'))
+# Сколько секунд ждать результат анализа одного документа
+ANALYSIS_TIMEOUT = float(os.getenv('ANALYSIS_TIMEOUT', '30'))
+# Максимальный размер документа для анализа (в байтах)
+ANALYSIS_MAX_FILE_SIZE = int(os.getenv('ANALYSIS_MAX_FILE_SIZE', str(20 * 1024 * 1024)))
+# Сколько документов может одновременно анализироваться или ждать очереди
+ANALYSIS_MAX_QUEUE = int(os.getenv('ANALYSIS_MAX_QUEUE', '20'))
+
+
+class AnalysisQueueFull(Exception):
+    """Очередь анализа документов переполнена, документ нужно прислать позже."""
+
+
+class FileTooLarge(Exception):
+    """Документ превышает ANALYSIS_MAX_FILE_SIZE."""
+
+
+class DocumentAnalysisPool:
+    """
+    Выполняет analyze_document в отдельных процессах, чтобы разбор PDF/DOCX
+    не блокировал цикл событий бота.
+
+    Если число документов в работе достигло max_queue, новые отклоняются с AnalysisQueueFull.
+    По истечении timeout ожидание прекращается с asyncio.TimeoutError; сам процесс
+    дорабатывает документ, поэтому долгий разбор ограничивается и бюджетами анализатора.
+    Такой документ занимает место в очереди, пока процесс его не освободит.
+    """
+
+    def __init__(self, workers: int = ANALYSIS_WORKERS, timeout: float = ANALYSIS_TIMEOUT,
+                 max_queue: int = ANALYSIS_MAX_QUEUE, max_file_size: int = ANALYSIS_MAX_FILE_SIZE):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.max_file_size = max_file_size
+        self._executor = None
+        self._lock = threading.Lock()
+        # Счетчик уменьшается из потока ProcessPoolExecutor, когда процесс закончил документ
+        self._in_flight_lock = threading.Lock()
+        self._in_flight = 0
+        self._metrics = {
+            'submitted': 0,
+            'completed': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'errors': 0,
+            'duration_total': 0.0,
+            'duration_max': 0.0,
+        }
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn, а не fork: процесс бота многопоточный (пул потоков базы данных)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    async def analyze(self, file_path: str, sha256: str = None) -> str:
+        """
+        Анализирует документ в пуле процессов и возвращает статус ("Сдано" или "Отказался").
+        Результат для уже встречавшегося содержимого файла берется из кэша (utils.analysis_cache).
+        Если SHA-256 файла уже известен (файл из хранилища utils.storage), он передается в sha256.
+        """
+        if os.path.exists(file_path) and os.path.getsize(file_path) > self.max_file_size:
+            raise FileTooLarge(file_path)
+
+        try:
+            if sha256 is None:
+                sha256 = await asyncio.to_thread(file_sha256, file_path)
+            cached = await run_db(get_cached_analysis, sha256)
+            if cached:
+                logger.info(f"Результат анализа документа {file_path} взят из кэша: {cached['status']}.")
+                return cached['status']
+        except Exception as e:
+            # Кэш лишь ускоряет анализ: при его недоступности документ анализируется заново
+            logger.warning(f"Не удалось проверить кэш анализа для {file_path}: {e}")
+
+        details = await self._analyze_in_process(file_path)
+        # Результат, прерванный по ограничениям времени или объема, не кэшируется
+        if sha256 and not details['error'] and not details['truncated']:
+            try:
+                await run_db(store_analysis, sha256, details)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить результат анализа {file_path} в кэш: {e}")
+        return details['status']
+
+    def _release(self, future=None):
+        with self._in_flight_lock:
+            self._in_flight -= 1
+
+    async def _analyze_in_process(self, file_path: str) -> dict:
+        with self._in_flight_lock:
+            if self._in_flight >= self.max_queue:
+                self._metrics['rejected'] += 1
+                raise AnalysisQueueFull()
+            self._in_flight += 1
+
+        self._metrics['submitted'] += 1
+        started = time.monotonic()
+        try:
+            try:
+                future = self._get_executor().submit(analyze_document_details, file_path)
+            except Exception:
+                self._release()
+                raise
+            # Место в очереди освобождается, когда процесс закончил документ, а не когда истекло ожидание
+            future.add_done_callback(self._release)
+            details = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+            self._metrics['completed'] += 1
+            return details
+        except asyncio.TimeoutError:
+            self._metrics['timeouts'] += 1
+            logger.warning(f"Анализ документа {file_path} не уложился в {self.timeout} с.")
+            raise
+        except Exception:
+            self._metrics['errors'] += 1
+            raise
+        finally:
+            duration = time.monotonic() - started
+            self._metrics['duration_total'] += duration
+            self._metrics['duration_max'] = max(self._metrics['duration_max'], duration)
+            logger.info(f"Анализ документа {file_path} занял {duration:.2f} с (в очереди: {self._in_flight}).")
+
+    def get_metrics(self) -> dict:
+        """Возвращает счетчики пула: число документов в работе (queue_depth), итоги и длительности анализа."""
+        metrics = dict(self._metrics)
+        metrics['queue_depth'] = self._in_flight
+        finished = metrics['completed'] + metrics['timeouts'] + metrics['errors']
+        metrics['duration_avg'] = metrics['duration_total'] / finished if finished else 0.0
+        return metrics
+
+    def shutdown(self):
+        """Останавливает процессы пула. Вызывается при остановке бота."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.info("Пул анализа документов остановлен.")
+
+
+# Общий для процесса пул анализа документов
+analysis_pool = DocumentAnalysisPool()
+register_collector('consentpro_analysis_pool', analysis_pool.get_metrics)
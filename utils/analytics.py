@@ -0,0 +1,197 @@
+"""
+Снимки сводной статистики по согласиям и классам (см. миграцию 0009).
+
+Задача refresh_snapshots_job выполняется ведущим процессом раз в сутки (ANALYTICS_SNAPSHOT_TIME, UTC)
+и пересчитывает только согласия из analytics_dirty_consents - их отмечают триггеры при любом
+изменении записей о сдаче. Отчет администратора читает готовые снимки и показывает время,
+на которое они построены.
+
+Запуск вручную:
+    python -m utils.analytics refresh   - пересчитать изменившиеся согласия
+    python -m utils.analytics rebuild   - пересчитать все согласия и классы
+"""
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from db.connection import close_pool, db_connection, run_db, to_async
+from psycopg2.extras import RealDictCursor
+
+logger = logging.getLogger(__name__)
+
+# Время ежедневного пересчета снимков (ЧЧ:ММ, UTC)
+ANALYTICS_SNAPSHOT_TIME = datetime.strptime(os.getenv('ANALYTICS_SNAPSHOT_TIME', '02:00'), '%H:%M').time().replace(
+    tzinfo=timezone.utc)
+# Через сколько секунд после получения лидерства досчитать изменения, накопившиеся с прошлого снимка
+ANALYTICS_SNAPSHOT_FIRST_DELAY = float(os.getenv('ANALYTICS_SNAPSHOT_FIRST_DELAY', '60'))
+
+# Ключ advisory-блокировки пересчета (db/migrate.py и utils/leader.py используют 7_410_001 и 7_410_002)
+ANALYTICS_LOCK_KEY = 7_410_003
+
+# Агрегаты по записям о сдаче; c - consents, cs - consent_submissions
+_AGGREGATES = """
+    COUNT(cs.id) AS total,
+    COUNT(cs.id) FILTER (WHERE cs.status = 'Сдано') AS submitted,
+    COUNT(cs.id) FILTER (WHERE cs.status = 'Отказался') AS refused,
+    COUNT(cs.id) FILTER (WHERE cs.status = 'Не идет') AS not_going,
+    COUNT(cs.id) FILTER (WHERE cs.status = 'Просрочено') AS overdue,
+    COUNT(cs.id) FILTER (WHERE cs.status = 'Не сдано') AS pending,
+    percentile_cont(0.5) WITHIN GROUP (ORDER BY cs.updated_at - c.created_at) FILTER (WHERE cs.status = 'Сдано'),
+    percentile_cont(0.9) WITHIN GROUP (ORDER BY cs.updated_at - c.created_at) FILTER (WHERE cs.status = 'Сдано'),
+    NOW()
+"""
+
+_SNAPSHOT_COLUMNS = """
+    total, submitted, refused, not_going, overdue, pending, time_to_submit_p50, time_to_submit_p90, computed_at
+"""
+
+
+def _refresh(cursor, full: bool) -> dict:
+    if full:
+        cursor.execute("DELETE FROM analytics_dirty_consents;")
+        cursor.execute("SELECT id AS consent_id, class_id FROM consents;")
+    else:
+        # Строки, отмеченные незавершенными транзакциями, заблокированы: DELETE дождется их фиксации
+        cursor.execute("DELETE FROM analytics_dirty_consents RETURNING consent_id, class_id;")
+    dirty = cursor.fetchall()
+    consent_ids = sorted({row['consent_id'] for row in dirty})
+    class_ids = {row['class_id'] for row in dirty}
+    if not consent_ids and not full:
+        return {'consents': 0, 'classes': 0}
+
+    # Прежние классы перенесенных согласий
+    cursor.execute("SELECT DISTINCT class_id FROM consent_stats_snapshots WHERE consent_id = ANY(%s);", (consent_ids,))
+    class_ids.update(row['class_id'] for row in cursor.fetchall())
+    class_ids = sorted(class_ids)
+
+    if full:
+        cursor.execute("DELETE FROM consent_stats_snapshots;")
+        cursor.execute("DELETE FROM class_stats_snapshots;")
+    else:
+        cursor.execute("DELETE FROM consent_stats_snapshots WHERE consent_id = ANY(%s);", (consent_ids,))
+        cursor.execute("DELETE FROM class_stats_snapshots WHERE class_id = ANY(%s);", (class_ids,))
+
+    cursor.execute(f"""
+        INSERT INTO consent_stats_snapshots (consent_id, class_id, {_SNAPSHOT_COLUMNS})
+        SELECT c.id, c.class_id, {_AGGREGATES}
+        FROM consents c
+        LEFT JOIN consent_submissions cs ON cs.consent_id = c.id
+        WHERE c.id = ANY(%s)
+        GROUP BY c.id, c.class_id;
+    """, (consent_ids,))
+    consents = cursor.rowcount
+
+    # Процентили класса нельзя получить из процентилей согласий: класс считается по записям о сдаче
+    cursor.execute(f"""
+        INSERT INTO class_stats_snapshots (class_id, consents, {_SNAPSHOT_COLUMNS})
+        SELECT c.class_id, COUNT(DISTINCT c.id), {_AGGREGATES}
+        FROM consents c
+        LEFT JOIN consent_submissions cs ON cs.consent_id = c.id
+        WHERE c.class_id = ANY(%s)
+        GROUP BY c.class_id;
+    """, (class_ids,))
+    classes = cursor.rowcount
+    return {'consents': consents, 'classes': classes}
+
+
+def refresh_snapshots(full: bool = False) -> dict:
+    """
+    Пересчитывает снимки изменившихся согласий и их классов (full - всех согласий и классов).
+    Возвращает {'consents', 'classes'} - число пересчитанных строк, или None, если пересчет
+    уже выполняется другим процессом или произошла ошибка.
+    """
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked;", (ANALYTICS_LOCK_KEY,))
+                if not cursor.fetchone()['locked']:
+                    conn.rollback()
+                    logger.info("Снимки статистики уже пересчитываются другим процессом.")
+                    return None
+                result = _refresh(cursor, full)
+                cursor.execute("UPDATE analytics_snapshot_state SET refreshed_at = NOW();")
+            conn.commit()
+            logger.info(f"Снимки статистики обновлены: согласий {result['consents']}, классов {result['classes']}.")
+            return result
+        except Exception as e:
+            logger.error(f"Ошибка при пересчете снимков статистики: {e}")
+            conn.rollback()
+            return None
+
+
+async def refresh_snapshots_job(context):
+    """Задача JobQueue для пересчета снимков статистики."""
+    try:
+        await run_db(refresh_snapshots)
+    except Exception as e:
+        logger.error(f"Ошибка при пересчете снимков статистики: {e}")
+
+
+def get_class_snapshots() -> dict:
+    """
+    Возвращает снимки для сводного отчета: {'refreshed_at', 'rows'} - по строке на пару (класс, согласие),
+    классы без согласий дают строку с consent_id = NULL. Если снимков еще нет, refreshed_at = None.
+    """
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("SELECT refreshed_at FROM analytics_snapshot_state;")
+                state = cursor.fetchone()
+                if state is None or state['refreshed_at'] is None:
+                    return {'refreshed_at': None, 'rows': []}
+                cursor.execute("""
+                    SELECT
+                        cl.id AS class_id,
+                        cl.name AS class_name,
+                        k.consents AS class_consents,
+                        k.total AS class_total,
+                        k.submitted AS class_submitted,
+                        k.refused AS class_refused,
+                        k.overdue AS class_overdue,
+                        k.time_to_submit_p50 AS class_time_to_submit_p50,
+                        k.time_to_submit_p90 AS class_time_to_submit_p90,
+                        c.id AS consent_id,
+                        c.name AS consent_name,
+                        s.total,
+                        s.submitted,
+                        s.refused,
+                        s.not_going,
+                        s.overdue,
+                        s.pending,
+                        s.time_to_submit_p50,
+                        s.time_to_submit_p90
+                    FROM classes cl
+                    LEFT JOIN class_stats_snapshots k ON k.class_id = cl.id
+                    LEFT JOIN consent_stats_snapshots s ON s.class_id = cl.id
+                    LEFT JOIN consents c ON c.id = s.consent_id
+                    ORDER BY cl.name, cl.id, c.created_at DESC;
+                """)
+                return {'refreshed_at': state['refreshed_at'], 'rows': cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Ошибка при получении снимков статистики: {e}")
+            return None
+
+
+get_class_snapshots_async = to_async(get_class_snapshots)
+
+
+def main(argv: list) -> int:
+    if not argv or argv[0] not in ('refresh', 'rebuild'):
+        print(__doc__)
+        return 2
+    try:
+        result = refresh_snapshots(full=argv[0] == 'rebuild')
+    finally:
+        close_pool()
+    if result is None:
+        return 1
+    print(f"Снимки обновлены: согласий {result['consents']}, классов {result['classes']}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    sys.exit(main(sys.argv[1:]))
@@ -1,17 +1,23 @@
 from functools import wraps
 from telegram import Update
 from telegram.ext import ContextTypes
-from models.user import get_user_by_telegram_id
+from models.user import get_user_by_telegram_id_async
 import logging
 
 logger = logging.getLogger(__name__)
 
-def require_role(allowed_roles: list):
+def require_role(allowed_roles: list, denied_state=None, use_cache: bool = True):
     """
     Декоратор для проверки роли пользователя перед выполнением обработчика команды.
+    После успешной проверки кладет id пользователя и его роль в context.user_data
+    ('user_id' и 'role_name'), чтобы обработчик не запрашивал их повторно.
 
     Args:
         allowed_roles (list): Список строк с названиями разрешенных ролей (например, ['Учитель', 'Администратор']).
+        denied_state: Что вернуть при отказе; для шагов разговора - ConversationHandler.END,
+            иначе разговор остался бы в текущем состоянии.
+        use_cache: False - роль читается из базы в обход user_cache (для привилегированных шагов,
+            чтобы снятая в другом процессе роль не действовала до истечения USER_CACHE_TTL).
     """
     def decorator(func):
         @wraps(func)
@@ -19,19 +25,22 @@ def require_role(allowed_roles: list):
             user_telegram_id = update.effective_user.id
 
             # Получаем информацию о пользователе из базы данных
-            user_data = get_user_by_telegram_id(user_telegram_id)
+            user_data = await get_user_by_telegram_id_async(user_telegram_id, use_cache=use_cache)
 
             if not user_data:
                 logger.warning(f"Пользователь с telegram_id {user_telegram_id} не найден в базе данных.")
-                await update.message.reply_text("Вы не авторизованы. Пожалуйста, зарегистрируйтесь через команду /start.")
-                return
+                await update.effective_message.reply_text("Вы не авторизованы. Пожалуйста, зарегистрируйтесь через команду /start.")
+                return denied_state
 
             user_role = user_data['role_name']
 
             if user_role not in allowed_roles:
                 logger.info(f"Пользователь с telegram_id {user_telegram_id} (роль: {user_role}) попытался выполнить команду, требующую роли: {allowed_roles}")
-                await update.message.reply_text(f"У вас недостаточно прав для выполнения этой команды. Необходима роль: {', '.join(allowed_roles)}.")
-                return
+                await update.effective_message.reply_text(f"У вас недостаточно прав для выполнения этой команды. Необходима роль: {', '.join(allowed_roles)}.")
+                return denied_state
+
+            context.user_data['user_id'] = user_data['id']
+            context.user_data['role_name'] = user_role
 
             # Если проверка пройдена, вызываем оригинальную функцию
             return await func(update, context)
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Время жизни записи кэша пользователей (в секундах) и максимальное число записей
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '300'))
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', '10000'))
+
+
+class TTLCache:
+    """
+    Потокобезопасный кэш с ограничением времени жизни записей и вытеснением
+    давно не использовавшихся записей (LRU) при превышении размера.
+    Выключенный кэш (enabled = False) ничего не хранит и не возвращает.
+
+    Чтобы значение, прочитанное до invalidate, не вернулось в кэш, читающий берет generation(key)
+    до чтения из базы и передает его в set: после invalidate (или clear) запись пропускается.
+    """
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.enabled = True
+        self._data = OrderedDict()
+        # Поколения сброшенных ключей; при переполнении сбрасываются все вместе с эпохой
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Возвращает значение по ключу или None, если записи нет или она устарела."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def generation(self, key):
+        """Возвращает поколение ключа: его нужно получить до чтения значения из источника."""
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def set(self, key, value, generation=None):
+        """
+        Сохраняет значение, вытесняя самую старую запись при переполнении.
+        Если передано generation и ключ с тех пор сбрасывался, значение устарело и не сохраняется.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation is not None and generation != (self._epoch, self._generations.get(key, 0)):
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        """Удаляет запись из кэша."""
+        with self._lock:
+            self._data.pop(key, None)
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if len(self._generations) > self.max_size:
+                self._generations.clear()
+                self._epoch += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+
+# Кэш данных пользователей (id и роль) по telegram_id. В режиме нескольких процессов записи
+# сбрасываются по уведомлениям PostgreSQL об изменении пользователей (utils.user_cache_listener)
+user_cache = TTLCache(ttl=USER_CACHE_TTL, max_size=USER_CACHE_MAX_SIZE)
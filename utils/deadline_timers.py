@@ -0,0 +1,200 @@
+import heapq
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from telegram.ext import ContextTypes, JobQueue
+from db.connection import db_connection, run_db
+from psycopg2.extras import RealDictCursor
+from utils.scheduler import check_deadlines, send_deadline_reminders
+
+logger = logging.getLogger(__name__)
+
+# За сколько часов до дедлайна отправлять напоминания (через запятую, например "72,24")
+DEADLINE_REMINDER_OFFSETS_HOURS = [
+    float(hours) for hours in os.getenv('DEADLINE_REMINDER_OFFSETS_HOURS', '72').split(',') if hours.strip()
+]
+# На сколько часов вперед заводить таймеры в JobQueue; более поздние события ждут в куче
+DEADLINE_TIMER_HORIZON_HOURS = float(os.getenv('DEADLINE_TIMER_HORIZON_HOURS', '24'))
+# Как часто (в секундах) подхватывать согласия, созданные другими процессами бота
+DEADLINE_SYNC_INTERVAL = float(os.getenv('DEADLINE_SYNC_INTERVAL', '60'))
+
+# Запас при выборке новых согласий: created_at - время начала транзакции,
+# поэтому согласие может стать видимым позже, чем появились более новые
+_SYNC_OVERLAP = timedelta(minutes=5)
+_JOB_NAME_PREFIX = 'deadline-'
+
+EXPIRY = 'expiry'
+REMINDER = 'reminder'
+
+
+def _load_upcoming_deadlines() -> list:
+    """Возвращает согласия, дедлайн которых еще не наступил."""
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("SELECT id, deadline FROM consents WHERE deadline > NOW();")
+            return cursor.fetchall()
+
+
+def _load_created_since(since: datetime) -> list:
+    """Возвращает согласия с будущим дедлайном, созданные после since."""
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT id, deadline, created_at FROM consents
+                WHERE created_at > %s AND deadline > NOW();
+            """, (since,))
+            return cursor.fetchall()
+
+
+def _load_deadline(consent_id: int):
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("SELECT deadline FROM consents WHERE id = %s;", (consent_id,))
+            row = cursor.fetchone()
+            return row['deadline'] if row else None
+
+
+async def _on_expiry(context: ContextTypes.DEFAULT_TYPE):
+    # Инкрементальная проверка обработает все дедлайны, наступившие к этому моменту
+    await check_deadlines(context)
+
+
+async def _on_reminder(context: ContextTypes.DEFAULT_TYPE):
+    consent_ids = context.job.data
+    try:
+        await send_deadline_reminders(context, consent_ids)
+    except Exception as e:
+        logger.error(f"Ошибка при отправке напоминаний по согласиям {consent_ids}: {e}")
+
+
+class DeadlineScheduler:
+    """
+    Заводит точные таймеры JobQueue на истечение дедлайна каждого согласия и на напоминания
+    за DEADLINE_REMINDER_OFFSETS_HOURS часов до него.
+
+    Предстоящие события хранятся в куче (min-heap) по времени срабатывания; в JobQueue
+    попадают только события ближайших DEADLINE_TIMER_HORIZON_HOURS часов, остальные
+    переносятся туда периодической задачей, не обращающейся к базе данных.
+    События с одинаковым временем объединяются в один таймер.
+
+    Таймеры заводит только ведущий процесс (см. utils.leader): start вызывается при получении
+    лидерства, stop - при его потере. Согласия, созданные в других процессах, ведущий
+    подхватывает задачей синхронизации раз в DEADLINE_SYNC_INTERVAL секунд.
+    """
+
+    def __init__(self, reminder_offsets_hours: list = None, horizon_hours: float = DEADLINE_TIMER_HORIZON_HOURS):
+        offsets = DEADLINE_REMINDER_OFFSETS_HOURS if reminder_offsets_hours is None else reminder_offsets_hours
+        self.reminder_offsets = [timedelta(hours=hours) for hours in offsets]
+        self.horizon = timedelta(hours=horizon_hours)
+        self.job_queue = None
+        self._heap = []
+        # Заведенные таймеры напоминаний: время срабатывания -> список согласий (job.data)
+        self._reminder_batches = {}
+        # Времена срабатывания заведенных таймеров истечения (без поиска по JobQueue на каждое событие)
+        self._expiry_times = set()
+        # Согласия, уже добавленные в кучу: id -> created_at (для синхронизации между процессами)
+        self._known = {}
+        self._synced_until = None
+
+    async def start(self, job_queue: JobQueue):
+        """Загружает предстоящие дедлайны и заводит таймеры. Вызывается при получении лидерства."""
+        self.job_queue = job_queue
+        self._synced_until = datetime.now(timezone.utc)
+        for consent in await run_db(_load_upcoming_deadlines):
+            self._push(consent['id'], consent['deadline'])
+        logger.info(f"Загружено {len(self._heap)} предстоящих событий по дедлайнам согласий.")
+        self._arm_due()
+        # Догоняем дедлайны, истекшие, пока бот был остановлен
+        job_queue.run_once(_on_expiry, when=10, name='deadline-expiry:startup')
+        job_queue.run_repeating(self._arm_due_job, interval=self.horizon / 2, first=self.horizon / 2,
+                                name='deadline-timers:refill')
+        job_queue.run_repeating(self._sync_job, interval=DEADLINE_SYNC_INTERVAL, first=DEADLINE_SYNC_INTERVAL,
+                                name='deadline-timers:sync')
+
+    def stop(self):
+        """Снимает все таймеры и очищает кучу. Вызывается при потере лидерства."""
+        if self.job_queue is not None:
+            for job in self.job_queue.jobs():
+                if job.name and job.name.startswith(_JOB_NAME_PREFIX):
+                    job.schedule_removal()
+        self.job_queue = None
+        self._heap = []
+        self._reminder_batches = {}
+        self._expiry_times = set()
+        self._known = {}
+        logger.info("Таймеры дедлайнов сняты.")
+
+    async def add_consent(self, consent_id: int, deadline: datetime = None):
+        """
+        Добавляет таймеры для нового согласия (вызывается после create_consent).
+        В неведущем процессе ничего не делает: согласие подхватит синхронизация ведущего.
+        """
+        if self.job_queue is None:
+            return
+        if deadline is None:
+            deadline = await run_db(_load_deadline, consent_id)
+        if deadline is None:
+            return
+        self._push(consent_id, deadline)
+        self._arm_due()
+
+    async def _sync_job(self, context: ContextTypes.DEFAULT_TYPE):
+        since = self._synced_until - _SYNC_OVERLAP
+        self._synced_until = datetime.now(timezone.utc)
+        try:
+            consents = await run_db(_load_created_since, since)
+        except Exception as e:
+            logger.error(f"Ошибка при синхронизации новых согласий: {e}")
+            return
+        added = 0
+        for consent in consents:
+            if consent['id'] not in self._known:
+                self._push(consent['id'], consent['deadline'], consent['created_at'])
+                added += 1
+        # Согласия старше окна выборки повторно не встретятся
+        self._known = {consent_id: created_at for consent_id, created_at in self._known.items() if created_at > since}
+        if added:
+            logger.info(f"Подхвачено {added} новых согласий из других процессов.")
+            self._arm_due()
+
+    def _push(self, consent_id: int, deadline: datetime, created_at: datetime = None):
+        self._known[consent_id] = created_at or datetime.now(timezone.utc)
+        now = datetime.now(timezone.utc)
+        # Истечение заводится всегда: если дедлайн уже прошел, таймер сработает сразу
+        heapq.heappush(self._heap, (deadline, consent_id, EXPIRY))
+        for offset in self.reminder_offsets:
+            remind_at = deadline - offset
+            if remind_at > now:
+                heapq.heappush(self._heap, (remind_at, consent_id, REMINDER))
+
+    async def _arm_due_job(self, context: ContextTypes.DEFAULT_TYPE):
+        self._arm_due()
+
+    def _arm_due(self):
+        now = datetime.now(timezone.utc)
+        # Сработавшие таймеры забываются: новые события заводятся не раньше чем через секунду
+        self._reminder_batches = {when: ids for when, ids in self._reminder_batches.items() if when > now}
+        self._expiry_times = {when for when in self._expiry_times if when > now}
+        armed = 0
+        while self._heap and self._heap[0][0] <= now + self.horizon:
+            when, consent_id, kind = heapq.heappop(self._heap)
+            run_at = max(when, now + timedelta(seconds=1))
+            if kind == EXPIRY:
+                if run_at not in self._expiry_times:
+                    self._expiry_times.add(run_at)
+                    self.job_queue.run_once(_on_expiry, when=run_at, name=f"deadline-expiry:{run_at.timestamp()}")
+            else:
+                batch = self._reminder_batches.get(run_at)
+                if batch is None:
+                    batch = self._reminder_batches[run_at] = []
+                    self.job_queue.run_once(_on_reminder, when=run_at, data=batch,
+                                            name=f"deadline-reminder:{run_at.timestamp()}")
+                if consent_id not in batch:
+                    batch.append(consent_id)
+            armed += 1
+        if armed:
+            logger.info(f"Заведено {armed} таймеров по дедлайнам согласий.")
+
+
+# Общий для процесса планировщик дедлайнов
+deadline_scheduler = DeadlineScheduler()
@@ -0,0 +1,186 @@
+import asyncio
+import logging
+import os
+import time
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+logger = logging.getLogger(__name__)
+
+# Параметры массовой рассылки. Ограничения Telegram: ~30 сообщений в секунду на бота
+# и ~1 сообщение в секунду в один чат.
+NOTIFY_CONCURRENCY = int(os.getenv('NOTIFY_CONCURRENCY', '8'))
+NOTIFY_GLOBAL_RATE = float(os.getenv('NOTIFY_GLOBAL_RATE', '25'))
+NOTIFY_PER_CHAT_RATE = float(os.getenv('NOTIFY_PER_CHAT_RATE', '1'))
+NOTIFY_MAX_RETRIES = int(os.getenv('NOTIFY_MAX_RETRIES', '3'))
+# Базовая задержка (в секундах) перед повтором после сетевой ошибки, удваивается с каждой попыткой
+NOTIFY_RETRY_BACKOFF = float(os.getenv('NOTIFY_RETRY_BACKOFF', '1'))
+
+# После скольких чатов начинать удалять из памяти ограничители неактивных чатов
+_MAX_CHAT_BUCKETS = 10000
+
+
+class TokenBucket:
+    """Ограничитель частоты "ведро токенов": не больше rate операций в секунду с всплеском до capacity."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_full(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self, then: 'TokenBucket' = None):
+        """
+        Ждет, пока появится токен, и забирает его. Если передан then, затем ждет токен и из него:
+        следующие вызовы ждут своей очереди, а пополнение отсчитывается с момента, когда получены
+        оба токена, - иначе ожидание then сжимало бы интервал между отправками.
+        """
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+            if then is not None:
+                await then.acquire()
+                self.updated = time.monotonic()
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    # В разных версиях python-telegram-bot retry_after - число секунд или timedelta
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class MessageDispatcher:
+    """
+    Рассылает сообщения с ограниченной параллельностью, соблюдая общий лимит
+    и лимит на один чат, с повторами после RetryAfter и сетевых ошибок.
+
+    Работает с любым объектом bot, у которого есть нужные асинхронные методы
+    (send_message, send_document и т.д.), поэтому в тестах его можно заменить заглушкой.
+    """
+
+    def __init__(self, bot, concurrency: int = NOTIFY_CONCURRENCY, global_rate: float = NOTIFY_GLOBAL_RATE,
+                 per_chat_rate: float = NOTIFY_PER_CHAT_RATE, max_retries: int = NOTIFY_MAX_RETRIES,
+                 retry_backoff: float = NOTIFY_RETRY_BACKOFF):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._global_bucket = TokenBucket(global_rate)
+        self._chat_buckets = {}
+        self._resume_at = 0.0
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= _MAX_CHAT_BUCKETS:
+                # Полное ведро ничем не отличается от нового, его можно безопасно забыть
+                self._chat_buckets = {key: b for key, b in self._chat_buckets.items() if not b.is_full()}
+            bucket = self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, capacity=1)
+        return bucket
+
+    async def _wait_for_slot(self, chat_id):
+        # После RetryAfter Telegram ждет паузы от всего бота, а не от одного чата
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await self._chat_bucket(chat_id).acquire(then=self._global_bucket)
+
+    async def _deliver(self, method: str, message: dict, report: dict):
+        chat_id = message['chat_id']
+        send = getattr(self.bot, method)
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_slot(chat_id)
+            try:
+                await send(**message)
+                report['sent'] += 1
+                logger.debug(f"Сообщение отправлено в чат {chat_id}.")
+                return
+            except RetryAfter as e:
+                delay = _retry_after_seconds(e)
+                self._resume_at = max(self._resume_at, time.monotonic() + delay)
+                logger.warning(f"Telegram ограничил частоту отправки, пауза {delay} с (чат {chat_id}).")
+                last_error = e
+            except (Forbidden, BadRequest) as e:
+                # Бот заблокирован или запрос некорректен: повтор не поможет
+                last_error = e
+                break
+            except NetworkError as e:
+                last_error = e
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+            except Exception as e:
+                last_error = e
+                break
+            if attempt < self.max_retries:
+                report['retries'] += 1
+        report['failed'] += 1
+        report['errors'][chat_id] = str(last_error)
+        logger.error(f"Не удалось отправить сообщение в чат {chat_id}: {last_error}")
+
+    async def send_bulk(self, messages, method: str = 'send_message') -> dict:
+        """
+        Отправляет сообщения методом bot.<method>. Каждое сообщение - словарь именованных
+        аргументов метода с обязательным ключом chat_id.
+
+        Возвращает сводку: {'sent': ..., 'failed': ..., 'retries': ..., 'errors': {chat_id: текст ошибки}}.
+        """
+        report = {'sent': 0, 'failed': 0, 'retries': 0, 'errors': {}}
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        started = time.monotonic()
+
+        async def worker():
+            while True:
+                message = await queue.get()
+                try:
+                    if message is None:
+                        return
+                    await self._deliver(method, message, report)
+                finally:
+                    queue.task_done()
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            for message in messages:
+                await queue.put(message)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+        elapsed = time.monotonic() - started
+        if report['sent'] or report['failed']:
+            logger.info(
+                f"Рассылка завершена за {elapsed:.1f} с: отправлено {report['sent']}, "
+                f"ошибок {report['failed']}, повторов {report['retries']}."
+            )
+        return report
+
+
+_dispatchers = {}
+
+
+def get_dispatcher(bot) -> MessageDispatcher:
+    """Возвращает общий для процесса диспетчер бота, чтобы лимиты учитывались во всех рассылках."""
+    dispatcher = _dispatchers.get(id(bot))
+    if dispatcher is None or dispatcher.bot is not bot:
+        dispatcher = _dispatchers[id(bot)] = MessageDispatcher(bot)
+    return dispatcher
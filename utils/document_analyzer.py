@@ -1,10 +1,24 @@
 import fitz  # PyMuPDF
-from docx import Document
+import hashlib
 import logging
 import os
+import re
+import time
+import zipfile
+from xml.etree.ElementTree import iterparse
 
 logger = logging.getLogger(__name__)
 
+# Ограничения на разбор одного документа: число страниц PDF, объем просмотренного текста
+# (в символах), время разбора (в секундах) и распакованный размер XML-частей DOCX (в байтах)
+ANALYSIS_MAX_PAGES = int(os.getenv('ANALYSIS_MAX_PAGES', '50'))
+ANALYSIS_MAX_TEXT_CHARS = int(os.getenv('ANALYSIS_MAX_TEXT_CHARS', str(2 * 1024 * 1024)))
+ANALYSIS_TIME_BUDGET = float(os.getenv('ANALYSIS_TIME_BUDGET', '10'))
+ANALYSIS_MAX_DOCX_XML_BYTES = int(os.getenv('ANALYSIS_MAX_DOCX_XML_BYTES', str(50 * 1024 * 1024)))
+
+_W_NAMESPACE = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_DOCX_HEADER_RE = re.compile(r'^word/(?:header|footer)\d*\.xml$')
+
 # Слова-маркеры для определения статуса "Отказался"
 REFUSAL_KEYWORDS = [
     "отказываюсь",
@@ -15,47 +29,173 @@ REFUSAL_KEYWORDS = [
     "не разрешаю"
 ]
 
-def analyze_document(file_path: str) -> str:
+# Регулярные выражения для слов-маркеров с учетом словоформ.
+# Совпадение ищется только с начала слова, поэтому, например, "противопоказания" не считается отказом.
+REFUSAL_PATTERNS = {
+    "отказываюсь": r"отказыва(?:юсь|емся)",
+    "не согласен": r"не\s+соглас(?:ен|на|ны)\b",
+    "против": r"против\b",
+    "отказ": r"отказ\w*",
+    # "не даю согласие", "не даю своего согласия", "не даем свое согласие"
+    "не даю согласие": r"не\s+да(?:ю|ем)\s+(?:сво(?:его|е|ё)\s+)?согласи[ея]",
+    "не разрешаю": r"не\s+разреша(?:ю|ем)\b",
+}
+
+# Один скомпилированный шаблон: все маркеры ищутся за один проход по тексту.
+# Каждый маркер - именованная группа k<номер>, по ней восстанавливается найденное слово.
+REFUSAL_RE = re.compile(
+    r"\b(?:" + "|".join(f"(?P<k{i}>{REFUSAL_PATTERNS[keyword]})" for i, keyword in enumerate(REFUSAL_KEYWORDS)) + ")",
+    re.IGNORECASE
+)
+
+# Сколько символов конца предыдущей страницы/абзаца добавлять к следующей,
+# чтобы найти маркер, разорванный границей ("не" в конце страницы, "согласен" в начале следующей)
+_CHUNK_OVERLAP = 32
+
+# Версия набора правил: меняется при любом изменении слов-маркеров или их шаблонов,
+# что делает недействительными сохраненные результаты анализа
+RULESET_VERSION = hashlib.sha256(REFUSAL_RE.pattern.encode('utf-8')).hexdigest()[:16]
+
+
+class RefusalMatcher:
     """
-    Анализирует документ и возвращает статус: "Сдано" или "Отказался".
+    Ищет слова-маркеры отказа в тексте, поступающем частями (страницами, абзацами),
+    за один проход по каждой части.
     """
+
+    def __init__(self):
+        self.matched_keywords = []
+        self.text_length = 0
+        self._tail = ""
+
+    def feed(self, chunk: str) -> bool:
+        """Добавляет очередную часть текста. Возвращает True, если найден хотя бы один маркер."""
+        self.text_length += len(chunk)
+        text = self._tail + chunk
+        for match in REFUSAL_RE.finditer(text):
+            # Совпадения, целиком лежащие в хвосте предыдущей части, уже были учтены
+            if match.end() <= len(self._tail):
+                continue
+            keyword = REFUSAL_KEYWORDS[int(match.lastgroup[1:])]
+            if keyword not in self.matched_keywords:
+                self.matched_keywords.append(keyword)
+        self._tail = text[-_CHUNK_OVERLAP:]
+        return bool(self.matched_keywords)
+
+
+def find_refusal_keywords(text: str) -> list:
+    """Возвращает слова-маркеры отказа, найденные в тексте."""
+    matcher = RefusalMatcher()
+    matcher.feed(text)
+    return matcher.matched_keywords
+
+
+def _iter_pdf_text(file_path: str, max_pages: int, state: dict = None):
+    # Страницы загружаются по одной; после max_pages остальные не открываются
+    with fitz.open(file_path) as doc:
+        for page_index in range(min(doc.page_count, max_pages)):
+            yield doc.load_page(page_index).get_text()
+        if doc.page_count > max_pages:
+            logger.warning(f"В документе {file_path} {doc.page_count} страниц, проанализированы первые {max_pages}.")
+            if state is not None:
+                state['truncated'] = True
+
+
+def _iter_docx_part(archive: zipfile.ZipFile, part_name: str):
+    # Потоковый разбор XML: каждый абзац (в том числе в ячейках таблиц) выдается
+    # и освобождается сразу, без построения дерева всего документа
+    with archive.open(part_name) as part:
+        for _, element in iterparse(part, events=('end',)):
+            if element.tag == f'{_W_NAMESPACE}p':
+                yield "".join(node.text or "" for node in element.iter(f'{_W_NAMESPACE}t')) + "\n"
+                element.clear()
+
+
+def _iter_docx_text(file_path: str):
+    with zipfile.ZipFile(file_path) as archive:
+        parts = [info for info in archive.infolist()
+                 if info.filename == 'word/document.xml' or _DOCX_HEADER_RE.match(info.filename)]
+        # Защита от "zip-бомб": проверяем распакованный размер до разбора
+        unpacked_size = sum(info.file_size for info in parts)
+        if unpacked_size > ANALYSIS_MAX_DOCX_XML_BYTES:
+            raise ValueError(f"Слишком большой документ DOCX: {unpacked_size} байт XML после распаковки.")
+        # Колонтитулы короткие и часто содержат формулировку согласия - их читаем первыми
+        parts.sort(key=lambda info: info.filename == 'word/document.xml')
+        for info in parts:
+            yield from _iter_docx_part(archive, info.filename)
+
+
+def iter_document_text(file_path: str, max_pages: int = None, state: dict = None):
+    """
+    Выдает текст документа по частям: по страницам для PDF (не больше max_pages),
+    по абзацам для DOCX, включая абзацы в таблицах и колонтитулах.
+    Если страниц больше max_pages и передан state, в нем ставится state['truncated'] = True.
+    """
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == '.pdf':
+        yield from _iter_pdf_text(file_path, ANALYSIS_MAX_PAGES if max_pages is None else max_pages, state)
+    elif file_extension == '.docx':
+        yield from _iter_docx_text(file_path)
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {file_extension}")
+
+
+def analyze_document_details(file_path: str, stop_on_first_match: bool = True) -> dict:
+    """
+    Анализирует документ и возвращает подробный результат:
+    {'status': "Сдано" или "Отказался", 'text_length': длина просмотренного текста,
+     'matched_keywords': найденные слова-маркеры, 'truncated': True, если разбор прерван
+     из-за ограничений, 'error': True, если документ не удалось проанализировать}.
+
+    Текст извлекается и проверяется по частям; при stop_on_first_match разбор
+    прекращается на первой части с маркером отказа. Разбор также прекращается
+    при превышении ANALYSIS_MAX_TEXT_CHARS или ANALYSIS_TIME_BUDGET; непросмотренные
+    страницы сверх ANALYSIS_MAX_PAGES тоже делают результат неполным (truncated).
+    """
+    result = {'status': "Сдано", 'text_length': 0, 'matched_keywords': [], 'truncated': False, 'error': False}
+
     if not os.path.exists(file_path):
         logger.error(f"Файл {file_path} не найден.")
-        return "Сдано"  # По умолчанию, если файл не найден
+        result['error'] = True
+        return result  # По умолчанию, если файл не найден, "Сдано"
 
-    text = ""
     file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension not in ('.pdf', '.docx'):
+        logger.warning(f"Неподдерживаемый формат файла: {file_extension}")
+        result['error'] = True
+        return result # По умолчанию для неподдерживаемых форматов "Сдано"
 
     try:
-        if file_extension == '.pdf':
-            # Извлечение текста из PDF
-            doc = fitz.open(file_path)
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-        elif file_extension == '.docx':
-            # Извлечение текста из DOCX
-            doc = Document(file_path)
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-        else:
-            logger.warning(f"Неподдерживаемый формат файла: {file_extension}")
-            return "Сдано" # По умолчанию для неподдерживаемых форматов
-
-        # Приводим текст к нижнему регистру для поиска
-        text_lower = text.lower()
-
-        # Проверяем наличие слов-маркеров отказа
-        for keyword in REFUSAL_KEYWORDS:
-            if keyword in text_lower:
-                logger.info(f"Найдено слово-маркер отказа '{keyword}' в документе {file_path}.")
-                return "Отказался"
+        matcher = RefusalMatcher()
+        deadline = time.monotonic() + ANALYSIS_TIME_BUDGET
+        for chunk in iter_document_text(file_path, state=result):
+            if matcher.feed(chunk) and stop_on_first_match:
+                break
+            if matcher.text_length >= ANALYSIS_MAX_TEXT_CHARS or time.monotonic() > deadline:
+                logger.warning(f"Разбор документа {file_path} прерван по ограничению объема текста или времени.")
+                result['truncated'] = True
+                break
+
+        result['text_length'] = matcher.text_length
+        result['matched_keywords'] = matcher.matched_keywords
+        if matcher.matched_keywords:
+            logger.info(f"Найдены слова-маркеры отказа {matcher.matched_keywords} в документе {file_path}.")
+            result['status'] = "Отказался"
+            return result
 
         # Если маркеры не найдены, считаем, что согласие дано
         logger.info(f"Слова-маркеры отказа не найдены в документе {file_path}. Статус: Сдано.")
-        return "Сдано"
+        return result
 
     except Exception as e:
         logger.error(f"Ошибка при анализе документа {file_path}: {e}")
         # В случае ошибки анализа, по умолчанию считаем "Сдано"
-        return "Сдано"
\ No newline at end of file
+        result['error'] = True
+        return result
+
+
+def analyze_document(file_path: str) -> str:
+    """
+    Анализирует документ и возвращает статус: "Сдано" или "Отказался".
+    """
+    return analyze_document_details(file_path)['status']
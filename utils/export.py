@@ -0,0 +1,128 @@
+"""
+Выгрузка статусов сдачи согласий в файл CSV или XLSX для команды /export.
+
+Строки читаются именованным (серверным) курсором порциями по EXPORT_FETCH_SIZE и сразу
+пишутся в файл, поэтому память не зависит от объема выгрузки (100 тыс. строк и больше).
+"""
+import csv
+import logging
+import os
+import uuid
+from psycopg2 import extensions
+from db.connection import db_connection, to_async
+from utils.xlsx import XlsxStreamWriter
+
+logger = logging.getLogger(__name__)
+
+# Сколько строк забирать с сервера за один запрос FETCH
+EXPORT_FETCH_SIZE = int(os.getenv('EXPORT_FETCH_SIZE', '2000'))
+# Максимальный размер файла, который можно отправить через Bot API (в байтах)
+EXPORT_MAX_FILE_SIZE = int(os.getenv('EXPORT_MAX_FILE_SIZE', str(50 * 1024 * 1024)))
+
+# Область выгрузки: одно согласие, один класс или вся школа (все классы)
+EXPORT_SCOPES = ('consent', 'class', 'school')
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+EXPORT_COLUMNS = ('Класс', 'ID согласия', 'Согласие', 'Дедлайн', 'Ученик', 'Статус', 'Обновлено')
+
+_DATETIME_FORMAT = '%d.%m.%Y %H:%M'
+# Первые символы, с которых Excel и LibreOffice начинают формулу (табуляция и перевод строки - тоже)
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _scope_condition(scope: str, scope_id: int = None, teacher_id: int = None) -> tuple:
+    if scope not in EXPORT_SCOPES:
+        raise ValueError(f"Неизвестная область выгрузки: {scope}")
+    conditions, params = [], []
+    if scope == 'consent':
+        conditions.append("c.id = %s")
+        params.append(scope_id)
+    elif scope == 'class':
+        conditions.append("cl.id = %s")
+        params.append(scope_id)
+    # Учитель выгружает только свои классы
+    if teacher_id is not None:
+        conditions.append("cl.teacher_id = %s")
+        params.append(teacher_id)
+    return (" AND ".join(conditions) or "TRUE"), params
+
+
+def _escape_formula(value):
+    """
+    Экранирует текст, который табличный редактор принял бы за формулу (названия и ФИО вводят пользователи):
+    перед ним ставится апостроф, и ячейка остается текстом.
+    """
+    if value and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _format_rows(cursor):
+    for class_name, consent_id, consent_name, deadline, full_name, status, updated_at in cursor:
+        yield (
+            _escape_formula(class_name),
+            consent_id,
+            _escape_formula(consent_name),
+            deadline.strftime(_DATETIME_FORMAT) if deadline else None,
+            _escape_formula(full_name),
+            _escape_formula(status),
+            updated_at.strftime(_DATETIME_FORMAT) if updated_at else None,
+        )
+
+
+def _write_csv(rows, file_path: str) -> int:
+    count = 0
+    # utf-8-sig и ";" - чтобы Excel в русской локали открыл файл без мастера импорта
+    with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def _write_xlsx(rows, file_path: str) -> int:
+    with XlsxStreamWriter(file_path, sheet_name='Статусы сдачи') as writer:
+        writer.write_row(EXPORT_COLUMNS)
+        for row in rows:
+            writer.write_row(row)
+        return writer.rows_written - 1
+
+
+_WRITERS = {'csv': _write_csv, 'xlsx': _write_xlsx}
+
+
+def export_submissions(scope: str, file_format: str, file_path: str, scope_id: int = None,
+                       teacher_id: int = None) -> int:
+    """
+    Записывает статусы сдачи по ученикам для области scope в файл file_path (формат csv или xlsx).
+    Если указан teacher_id, выгружаются только классы этого учителя.
+    Возвращает число выгруженных строк или None при ошибке.
+    """
+    condition, params = _scope_condition(scope, scope_id, teacher_id)
+    write = _WRITERS[file_format]
+    with db_connection() as conn:
+        try:
+            # Именованный курсор: строки остаются на сервере и читаются порциями
+            with conn.cursor(name=f"export_{uuid.uuid4().hex}", cursor_factory=extensions.cursor) as cursor:
+                cursor.itersize = EXPORT_FETCH_SIZE
+                cursor.execute(f"""
+                    SELECT cl.name, c.id, c.name, c.deadline, s.full_name, cs.status, cs.updated_at
+                    FROM consent_submissions cs
+                    JOIN consents c ON c.id = cs.consent_id
+                    JOIN classes cl ON cl.id = c.class_id
+                    JOIN students s ON s.id = cs.student_id
+                    WHERE {condition}
+                    ORDER BY cl.name, cl.id, c.created_at, c.id, s.full_name, s.id;
+                """, params)
+                count = write(_format_rows(cursor), file_path)
+            conn.rollback()
+            return count
+        except Exception as e:
+            logger.error(f"Ошибка при выгрузке статусов сдачи ({scope}, {scope_id}): {e}")
+            conn.rollback()
+            return None
+
+
+export_submissions_async = to_async(export_submissions)
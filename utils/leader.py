@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import os
+from db.connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# Ключ advisory-блокировки лидера (db/migrate.py использует 7_410_001)
+LEADER_LOCK_KEY = 7_410_002
+# Как часто (в секундах) проверять лидерство и пытаться его получить
+LEADER_CHECK_INTERVAL = float(os.getenv('LEADER_CHECK_INTERVAL', '15'))
+
+
+class LeaderElection:
+    """
+    Выбор ведущего процесса через сессионную advisory-блокировку PostgreSQL.
+
+    Блокировку держит отдельное подключение (не из пула). Пока оно живо, процесс остается
+    ведущим; если подключение обрывается, PostgreSQL снимает блокировку, и ее забирает
+    другой процесс при следующей проверке. Только ведущий процесс выполняет задачи,
+    которые нельзя запускать дважды (таймеры дедлайнов, очистка хранилища).
+    """
+
+    def __init__(self, on_elected, on_demoted, lock_key: int = LEADER_LOCK_KEY,
+                 check_interval: float = LEADER_CHECK_INTERVAL):
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.lock_key = lock_key
+        self.check_interval = check_interval
+        self.is_leader = False
+        self._conn = None
+
+    def _try_acquire(self) -> bool:
+        if self._conn is None or self._conn.closed:
+            self._conn = get_db_connection()
+            self._conn.autocommit = True
+        with self._conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s);", (self.lock_key,))
+            return cursor.fetchone()[0]
+
+    def _is_alive(self) -> bool:
+        try:
+            with self._conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            return True
+        except Exception as e:
+            logger.warning(f"Подключение с блокировкой лидера потеряно: {e}")
+            self._close()
+            return False
+
+    def _close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+    async def check(self):
+        """Подтверждает лидерство или пытается его получить; вызывает on_elected/on_demoted при смене роли."""
+        if self.is_leader:
+            if not await asyncio.to_thread(self._is_alive):
+                self.is_leader = False
+                logger.warning("Процесс больше не ведущий.")
+                await self.on_demoted()
+            return
+
+        try:
+            acquired = await asyncio.to_thread(self._try_acquire)
+        except Exception as e:
+            logger.error(f"Ошибка при попытке стать ведущим процессом: {e}")
+            self._close()
+            return
+        if acquired:
+            self.is_leader = True
+            logger.info("Процесс стал ведущим: запускаются задачи по расписанию.")
+            await self.on_elected()
+
+    async def _check_job(self, context):
+        await self.check()
+
+    async def start(self, job_queue):
+        """Сразу пытается стать ведущим и затем повторяет проверку каждые check_interval секунд."""
+        await self.check()
+        job_queue.run_repeating(self._check_job, interval=self.check_interval, first=self.check_interval,
+                                name='leader-election')
+
+    def release(self):
+        """Снимает блокировку (закрывает подключение). Вызывается при остановке бота."""
+        self.is_leader = False
+        self._close()
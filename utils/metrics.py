@@ -0,0 +1,409 @@
+"""
+Метрики производительности бота в формате Prometheus.
+
+Включаются переменной METRICS_ENABLED=1. Тогда измеряются:
+  * обработка обновлений целиком (длительность, число запросов к базе данных на обновление, обновления в работе);
+  * каждый обработчик и каждая задача JobQueue (длительность, ошибки, вызовы в работе);
+  * каждая функция, вызванная через db.connection.run_db / to_async (длительность, ошибки, вызовы в работе);
+  * каждый запрос cursor.execute (длительность и ошибки по функции модели и типу запроса).
+Метрики отдаются по HTTP на METRICS_LISTEN:METRICS_PORT/metrics и, если METRICS_LOG_INTERVAL > 0,
+раз в METRICS_LOG_INTERVAL секунд пишутся в лог сводкой.
+
+При выключенных метриках декораторы возвращают функцию без изменений, а приложение,
+очередь задач и подключения к базе данных создаются обычными классами.
+"""
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '0').lower() in ('1', 'true', 'yes')
+METRICS_LISTEN = os.getenv('METRICS_LISTEN', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9102'))
+# Период записи сводки метрик в лог (в секундах); 0 - не писать
+METRICS_LOG_INTERVAL = float(os.getenv('METRICS_LOG_INTERVAL', '0'))
+
+# Границы корзин гистограмм длительности (в секундах)
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Границы корзин числа запросов к базе данных на одно обновление
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 50)
+
+_lock = threading.Lock()
+_registry = []
+_collectors = []
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        with _lock:
+            _registry.append(self)
+
+    def _format_labels(self, labels: tuple, extra: dict = None) -> str:
+        pairs = list(zip(self.label_names, labels)) + list((extra or {}).items())
+        if not pairs:
+            return ''
+        escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter(_Metric):
+    """Монотонно растущий счетчик."""
+    kind = 'counter'
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list:
+        return [f"{self.name}{self._format_labels(labels)} {value}" for labels, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Текущее значение (например, число вызовов в работе)."""
+    kind = 'gauge'
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def render(self) -> list:
+        return [f"{self.name}{self._format_labels(labels)} {value}" for labels, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Гистограмма с фиксированными корзинами; для сводки в логе хранит и максимум."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = buckets
+
+    def observe(self, value: float, labels: tuple = ()):
+        with _lock:
+            series = self._values.get(labels)
+            if series is None:
+                # [счетчики корзин, сумма, количество, максимум]
+                series = self._values[labels] = [[0] * len(self.buckets), 0.0, 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+            if value > series[3]:
+                series[3] = value
+
+    def render(self) -> list:
+        lines = []
+        for labels, (bucket_counts, total, count, _) in self._values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{self._format_labels(labels, {'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{self._format_labels(labels, {'le': '+Inf'})} {count}")
+            lines.append(f"{self.name}_sum{self._format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{self._format_labels(labels)} {count}")
+        return lines
+
+    def summary(self) -> list:
+        """Возвращает (метки, количество, среднее, максимум) для каждого ряда."""
+        with _lock:
+            return [(labels, count, total / count if count else 0.0, maximum)
+                    for labels, (_, total, count, maximum) in self._values.items()]
+
+
+UPDATE_DURATION = Histogram('consentpro_update_duration_seconds', "Время обработки одного обновления")
+UPDATE_DB_QUERIES = Histogram('consentpro_update_db_queries', "Число запросов к базе данных на одно обновление",
+                              buckets=QUERY_COUNT_BUCKETS)
+UPDATES_IN_FLIGHT = Gauge('consentpro_updates_in_flight', "Обновления в обработке")
+HANDLER_DURATION = Histogram('consentpro_handler_duration_seconds', "Время работы обработчика", ('handler',))
+HANDLER_ERRORS = Counter('consentpro_handler_errors_total', "Исключения в обработчиках", ('handler',))
+HANDLERS_IN_FLIGHT = Gauge('consentpro_handlers_in_flight', "Обработчики в работе", ('handler',))
+JOB_DURATION = Histogram('consentpro_job_duration_seconds', "Время работы задачи JobQueue", ('job',))
+JOB_ERRORS = Counter('consentpro_job_errors_total', "Исключения в задачах JobQueue", ('job',))
+JOBS_IN_FLIGHT = Gauge('consentpro_jobs_in_flight', "Задачи JobQueue в работе", ('job',))
+DB_CALL_DURATION = Histogram('consentpro_db_call_duration_seconds', "Время вызова функции моделей", ('function',))
+DB_CALL_ERRORS = Counter('consentpro_db_call_errors_total', "Исключения в функциях моделей", ('function',))
+DB_CALLS_IN_FLIGHT = Gauge('consentpro_db_calls_in_flight', "Выполняемые функции моделей", ('function',))
+DB_QUERY_DURATION = Histogram('consentpro_db_query_duration_seconds', "Время выполнения запроса к базе данных",
+                              ('function', 'operation'))
+DB_QUERY_ERRORS = Counter('consentpro_db_query_errors_total', "Ошибки запросов к базе данных", ('function', 'operation'))
+
+# Счетчик запросов текущего обновления и имя выполняемой функции моделей
+_update_queries = contextvars.ContextVar('update_queries', default=None)
+_db_function = contextvars.ContextVar('db_function', default='other')
+
+
+def register_collector(prefix: str, func):
+    """
+    Регистрирует функцию, возвращающую словарь числовых значений (например, get_metrics пула анализа);
+    значения отдаются как метрики <prefix>_<ключ> при каждом запросе /metrics.
+    """
+    with _lock:
+        _collectors.append((prefix, func))
+
+
+def _timed(func, duration: Histogram, errors: Counter, in_flight: Gauge, label: str, ignored: tuple = ()):
+    labels = (label,)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        in_flight.inc(labels)
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except ignored:
+            raise
+        except Exception:
+            errors.inc(labels)
+            raise
+        finally:
+            in_flight.dec(labels)
+            duration.observe(time.perf_counter() - started, labels)
+    return wrapper
+
+
+def instrument_handler(callback, name: str = None):
+    """Оборачивает callback обработчика (async) замером времени и ошибок. Без METRICS_ENABLED возвращает его как есть."""
+    if not METRICS_ENABLED:
+        return callback
+    from telegram.ext import ApplicationHandlerStop
+    # ApplicationHandlerStop - штатная остановка обработки (например, повторное обновление), а не ошибка
+    return _timed(callback, HANDLER_DURATION, HANDLER_ERRORS, HANDLERS_IN_FLIGHT,
+                  name or callback.__qualname__, ignored=(ApplicationHandlerStop,))
+
+
+def instrument_job(callback, name: str = None):
+    """Оборачивает callback задачи JobQueue замером времени и ошибок. Без METRICS_ENABLED возвращает его как есть."""
+    if not METRICS_ENABLED:
+        return callback
+    return _timed(callback, JOB_DURATION, JOB_ERRORS, JOBS_IN_FLIGHT, name or callback.__qualname__)
+
+
+@functools.lru_cache(maxsize=256)
+def instrument_db_call(func):
+    """
+    Оборачивает синхронную функцию моделей замером времени и ошибок; запросы внутри нее
+    учитываются с меткой function. Без METRICS_ENABLED возвращает функцию как есть.
+    """
+    if not METRICS_ENABLED:
+        return func
+    label = getattr(func, '__module__', '').rsplit('.', 1)[-1] + '.' + getattr(func, '__qualname__', repr(func))
+    labels = (label,)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _db_function.set(label)
+        DB_CALLS_IN_FLIGHT.inc(labels)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            DB_CALL_ERRORS.inc(labels)
+            raise
+        finally:
+            DB_CALLS_IN_FLIGHT.dec(labels)
+            DB_CALL_DURATION.observe(time.perf_counter() - started, labels)
+            _db_function.reset(token)
+    return wrapper
+
+
+def observe_query(query, duration: float, failed: bool = False):
+    """Учитывает выполненный запрос к базе данных (вызывается из курсора db.connection)."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    words = str(query).split(None, 1)
+    labels = (_db_function.get(), words[0].upper() if words else '')
+    DB_QUERY_DURATION.observe(duration, labels)
+    if failed:
+        DB_QUERY_ERRORS.inc(labels)
+    counter = _update_queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@contextlib.contextmanager
+def count_queries():
+    """
+    Считает запросы к базе данных, выполненные в текущем контексте: with count_queries() as counter,
+    число - counter[0]. Запросы учитываются только при METRICS_ENABLED (замеряющие подключения).
+    """
+    counter = [0]
+    token = _update_queries.set(counter)
+    try:
+        yield counter
+    finally:
+        _update_queries.reset(token)
+
+
+def instrument_handlers(handlers):
+    """Оборачивает callback всех обработчиков, включая вложенные в ConversationHandler."""
+    from telegram.ext import ConversationHandler
+    for handler in handlers:
+        if isinstance(handler, ConversationHandler):
+            instrument_handlers(handler.entry_points)
+            for state_handlers in handler.states.values():
+                instrument_handlers(state_handlers)
+            instrument_handlers(handler.fallbacks)
+        elif hasattr(handler, 'callback'):
+            handler.callback = instrument_handler(handler.callback)
+
+
+def application_class():
+    """Класс приложения с замером обработки обновлений; без METRICS_ENABLED - обычный Application."""
+    from telegram.ext import Application
+    if not METRICS_ENABLED:
+        return Application
+
+    class InstrumentedApplication(Application):
+        __slots__ = ()
+
+        async def process_update(self, update):
+            counter = [0]
+            token = _update_queries.set(counter)
+            UPDATES_IN_FLIGHT.inc()
+            started = time.perf_counter()
+            try:
+                await super().process_update(update)
+            finally:
+                UPDATES_IN_FLIGHT.dec()
+                UPDATE_DURATION.observe(time.perf_counter() - started)
+                UPDATE_DB_QUERIES.observe(counter[0])
+                _update_queries.reset(token)
+
+        def add_handler(self, handler, group: int = 0):
+            instrument_handlers([handler])
+            super().add_handler(handler, group)
+
+    return InstrumentedApplication
+
+
+def job_queue():
+    """Очередь задач с замером задач; без METRICS_ENABLED - обычная JobQueue."""
+    from telegram.ext import JobQueue
+    if not METRICS_ENABLED:
+        return JobQueue()
+
+    class InstrumentedJobQueue(JobQueue):
+        def run_once(self, callback, *args, **kwargs):
+            return super().run_once(instrument_job(callback), *args, **kwargs)
+
+        def run_repeating(self, callback, *args, **kwargs):
+            return super().run_repeating(instrument_job(callback), *args, **kwargs)
+
+        def run_daily(self, callback, *args, **kwargs):
+            return super().run_daily(instrument_job(callback), *args, **kwargs)
+
+    return InstrumentedJobQueue()
+
+
+def render() -> str:
+    """Возвращает все метрики в текстовом формате Prometheus."""
+    lines = []
+    with _lock:
+        metrics = list(_registry)
+        collectors = list(_collectors)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+    for prefix, func in collectors:
+        try:
+            values = func()
+        except Exception as e:
+            logger.warning(f"Не удалось получить метрики {prefix}: {e}")
+            continue
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE {prefix}_{key} untyped")
+                lines.append(f"{prefix}_{key} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def log_summary():
+    """Пишет в лог сводку: число вызовов, среднее и максимальное время по обработчикам, задачам и функциям моделей."""
+    lines = []
+    for title, histogram in (("Обновления", UPDATE_DURATION), ("Обработчики", HANDLER_DURATION),
+                             ("Задачи", JOB_DURATION), ("Функции моделей", DB_CALL_DURATION),
+                             ("Запросы", DB_QUERY_DURATION)):
+        rows = sorted(histogram.summary(), key=lambda row: row[1] * row[2], reverse=True)
+        if not rows:
+            continue
+        lines.append(f"{title}:")
+        for labels, count, average, maximum in rows:
+            name = "/".join(str(label) for label in labels) or "всего"
+            lines.append(f"  {name}: {count} вызовов, среднее {average * 1000:.1f} мс, максимум {maximum * 1000:.1f} мс")
+    for prefix, func in list(_collectors):
+        try:
+            values = func()
+        except Exception:
+            continue
+        lines.append(f"{prefix}: " + ", ".join(f"{key}={value:.3g}" if isinstance(value, float) else f"{key}={value}"
+                                              for key, value in values.items()))
+    if lines:
+        logger.info("Сводка метрик с момента запуска:\n" + "\n".join(lines))
+
+
+async def log_summary_job(context):
+    """Задача JobQueue: периодическая сводка метрик в лог."""
+    log_summary()
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?', 1)[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Запросы сборщика метрик не пишем в лог
+        pass
+
+
+_server = None
+
+
+def start_http_server(listen: str = METRICS_LISTEN, port: int = METRICS_PORT):
+    """Запускает HTTP-сервер /metrics в отдельном потоке (если метрики включены и сервер еще не запущен)."""
+    global _server
+    if not METRICS_ENABLED or _server is not None:
+        return _server
+    _server = ThreadingHTTPServer((listen, port), _MetricsRequestHandler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name='metrics-http', daemon=True).start()
+    logger.info(f"Метрики доступны по адресу http://{listen}:{port}/metrics")
+    return _server
+
+
+def stop_http_server():
+    """Останавливает HTTP-сервер /metrics."""
+    global _server
+    server, _server = _server, None
+    if server is not None:
+        server.shutdown()
+        server.server_close()
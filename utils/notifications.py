@@ -1,40 +1,71 @@
 from telegram.ext import Application
+from telegram.error import BadRequest
 import logging
-from db.connection import get_db_connection
+from db.connection import db_connection, run_db
 from psycopg2.extras import RealDictCursor
+from models.consent import update_consent_file_id_async
+from utils.dispatcher import get_dispatcher
+from utils.storage import blob_path
 
 logger = logging.getLogger(__name__)
 
-async def send_notification_to_parents(application: Application, class_id: int, consent_name: str):
+async def send_consent_template(bot, chat_id: int, consent: dict, caption: str = None):
+    """
+    Отправляет файл шаблона согласия в чат. Если у согласия есть telegram_file_id, файл
+    отправляется по нему без повторной загрузки; иначе (или если file_id перестал действовать)
+    файл загружается из хранилища, а полученный file_id сохраняется для следующих отправок.
+    """
+    if consent.get('telegram_file_id'):
+        try:
+            return await bot.send_document(chat_id=chat_id, document=consent['telegram_file_id'], caption=caption)
+        except BadRequest as e:
+            logger.warning(f"Не удалось отправить шаблон согласия {consent['id']} по file_id: {e}. Загружаем файл заново.")
+
+    with open(blob_path(consent['file_path']), 'rb') as f:
+        message = await bot.send_document(chat_id=chat_id, document=f, caption=caption)
+    if message and message.document:
+        await update_consent_file_id_async(consent['file_path'], message.document.file_id, message.document.file_unique_id)
+    return message
+
+
+def _get_parent_telegram_ids(class_id: int):
+    """Возвращает telegram_id зарегистрированных родителей учеников класса или None при ошибке."""
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                # Получаем telegram_id всех родителей, чьи дети находятся в данном классе
+                cursor.execute("""
+                    SELECT DISTINCT u.telegram_id
+                    FROM users u
+                    JOIN parents p ON u.id = p.user_id
+                    JOIN students s ON p.student_id = s.id
+                    WHERE s.class_id = %s AND u.telegram_id != 0; -- telegram_id = 0 означает, что пользователь не зарегистрирован
+                """, (class_id,))
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка при получении списка родителей для класса {class_id} для уведомления: {e}")
+            return None
+
+
+async def send_notification_to_parents(application: Application, class_id: int, consent_name: str, file_id: str = None):
     """
     Отправляет уведомление родителям учеников из указанного класса о новом согласии.
+    Если передан file_id шаблона, уведомление отправляется вместе с файлом (по file_id, без повторной загрузки).
+    Возвращает сводку рассылки (см. MessageDispatcher.send_bulk) или None, если не удалось получить список родителей.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Получаем telegram_id всех родителей, чьи дети находятся в данном классе
-            cursor.execute("""
-                SELECT DISTINCT u.telegram_id
-                FROM users u
-                JOIN parents p ON u.id = p.user_id
-                JOIN students s ON p.student_id = s.id
-                WHERE s.class_id = %s AND u.telegram_id != 0; -- telegram_id = 0 означает, что пользователь не зарегистрирован
-            """, (class_id,))
-            parent_telegram_ids = cursor.fetchall()
-
-            for parent_data in parent_telegram_ids:
-                parent_telegram_id = parent_data['telegram_id']
-                try:
-                    await application.bot.send_message(
-                        chat_id=parent_telegram_id,
-                        text=f"Доступно новое согласие для вашего ребенка: {consent_name}. Пожалуйста, проверьте команду /my_consents."
-                    )
-                    logger.info(f"Уведомление отправлено родителю с telegram_id {parent_telegram_id} о согласии '{consent_name}'.")
-                except Exception as e:
-                    # Возможна ошибка, если родитель заблокировал бота
-                    logger.error(f"Не удалось отправить уведомление родителю с telegram_id {parent_telegram_id}: {e}")
-
-    except Exception as e:
-        logger.error(f"Ошибка при получении списка родителей для класса {class_id} для уведомления: {e}")
-    finally:
-        conn.close()
\ No newline at end of file
+    parent_telegram_ids = await run_db(_get_parent_telegram_ids, class_id)
+    if parent_telegram_ids is None:
+        return None
+
+    text = f"Доступно новое согласие для вашего ребенка: {consent_name}. Пожалуйста, проверьте команду /my_consents."
+    if file_id:
+        messages = [{'chat_id': parent_data['telegram_id'], 'document': file_id, 'caption': text}
+                    for parent_data in parent_telegram_ids]
+        method = 'send_document'
+    else:
+        messages = [{'chat_id': parent_data['telegram_id'], 'text': text} for parent_data in parent_telegram_ids]
+        method = 'send_message'
+    # Ошибки отдельных отправок (например, родитель заблокировал бота) попадают в сводку
+    report = await get_dispatcher(application.bot).send_bulk(messages, method=method)
+    logger.info(f"Уведомление о согласии '{consent_name}' для класса {class_id}: отправлено {report['sent']}, не доставлено {report['failed']}.")
+    return report
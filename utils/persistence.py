@@ -0,0 +1,216 @@
+"""
+Хранение context.user_data и состояний ConversationHandler в PostgreSQL.
+
+В режиме нескольких процессов (shared=True) данные пользователя перечитываются из базы
+перед обработкой каждого обновления и записываются сразу после нее, поэтому разговор,
+начатый в одном процессе, можно продолжить в другом.
+"""
+import json
+import logging
+import os
+from telegram import Update
+from telegram.ext import BasePersistence, ContextTypes, ConversationHandler, PersistenceInput
+from db.connection import db_connection, run_db
+from psycopg2.extras import Json, RealDictCursor
+
+logger = logging.getLogger(__name__)
+
+# Как часто (в секундах) сохранять изменившиеся данные в режиме одного процесса
+PERSISTENCE_UPDATE_INTERVAL = float(os.getenv('PERSISTENCE_UPDATE_INTERVAL', '60'))
+
+
+def _dumps(value) -> str:
+    # Даты и другие значения, не поддерживаемые JSON, сохраняются строками
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _conversation_key(key: tuple) -> str:
+    return json.dumps(list(key))
+
+
+def _load_user_data(user_id: int = None) -> dict:
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            if user_id is None:
+                cursor.execute("SELECT user_id, data FROM bot_user_data;")
+            else:
+                cursor.execute("SELECT user_id, data FROM bot_user_data WHERE user_id = %s;", (user_id,))
+            return {row['user_id']: row['data'] for row in cursor.fetchall()}
+
+
+def _save_user_data(user_id: int, data: dict):
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            if data:
+                cursor.execute("""
+                    INSERT INTO bot_user_data (user_id, data) VALUES (%s, %s)
+                    ON CONFLICT (user_id) DO UPDATE SET data = EXCLUDED.data, updated_at = NOW();
+                """, (user_id, Json(data, dumps=_dumps)))
+            else:
+                # Пустые данные не храним
+                cursor.execute("DELETE FROM bot_user_data WHERE user_id = %s;", (user_id,))
+            conn.commit()
+
+
+def _load_conversations(name: str) -> dict:
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("SELECT conversation_key, state FROM bot_conversations WHERE name = %s;", (name,))
+            return {tuple(json.loads(row['conversation_key'])): row['state'] for row in cursor.fetchall()}
+
+
+def _load_conversation_states(names: list, key: tuple) -> dict:
+    """Возвращает {имя обработчика: состояние} разговоров с ключом key."""
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("""
+                SELECT name, state FROM bot_conversations
+                WHERE name = ANY(%s) AND conversation_key = %s;
+            """, (names, _conversation_key(key)))
+            return {row['name']: row['state'] for row in cursor.fetchall()}
+
+
+def _save_conversation(name: str, key: tuple, state):
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            if state is None:
+                cursor.execute("DELETE FROM bot_conversations WHERE name = %s AND conversation_key = %s;",
+                               (name, _conversation_key(key)))
+            else:
+                cursor.execute("""
+                    INSERT INTO bot_conversations (name, conversation_key, state) VALUES (%s, %s, %s)
+                    ON CONFLICT (name, conversation_key) DO UPDATE SET state = EXCLUDED.state, updated_at = NOW();
+                """, (name, _conversation_key(key), Json(state, dumps=_dumps)))
+            conn.commit()
+
+
+class PostgresPersistence(BasePersistence):
+    """
+    Реализация BasePersistence поверх PostgreSQL (таблицы bot_user_data и bot_conversations).
+    Хранятся только user_data и состояния разговоров: chat_data, bot_data и callback_data бот не использует.
+    """
+
+    def __init__(self, shared: bool = False, update_interval: float = PERSISTENCE_UPDATE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.shared = shared
+
+    async def get_user_data(self) -> dict:
+        return await run_db(_load_user_data)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        await run_db(_save_user_data, user_id, dict(data))
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # В одном процессе данные в памяти всегда актуальны
+        if not self.shared:
+            return
+        stored = (await run_db(_load_user_data, user_id)).get(user_id, {})
+        user_data.clear()
+        user_data.update(stored)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        await run_db(_save_user_data, user_id, {})
+
+    async def get_conversations(self, name: str) -> dict:
+        return await run_db(_load_conversations, name)
+
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        await run_db(_save_conversation, name, key, new_state)
+
+    async def load_conversation_states(self, names: list, key: tuple) -> dict:
+        return await run_db(_load_conversation_states, names, key)
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # Все изменения записываются сразу, буфера нет
+        pass
+
+
+def _persistent_conversation_handlers(application) -> list:
+    return [handler for handlers in application.handlers.values() for handler in handlers
+            if isinstance(handler, ConversationHandler) and handler.persistent]
+
+
+def _conversation_key_for(handler: ConversationHandler, update: Update):
+    # Тот же ключ, что строит ConversationHandler (per_chat, per_user, per_message)
+    key = []
+    if handler.per_chat:
+        if update.effective_chat is None:
+            return None
+        key.append(update.effective_chat.id)
+    if handler.per_user:
+        if update.effective_user is None:
+            return None
+        key.append(update.effective_user.id)
+    if handler.per_message:
+        if update.callback_query is None:
+            return None
+        key.append(update.callback_query.inline_message_id or update.callback_query.message.message_id)
+    return tuple(key)
+
+
+async def refresh_conversations(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Обработчик группы -1 для режима нескольких процессов: перед обработкой обновления
+    загружает из базы текущие состояния разговоров пользователя (они могли измениться в другом процессе).
+    """
+    if not isinstance(update, Update):
+        return
+    handlers = _persistent_conversation_handlers(context.application)
+    keys = {}
+    for handler in handlers:
+        key = _conversation_key_for(handler, update)
+        if key is not None:
+            keys.setdefault(key, []).append(handler)
+
+    for key, key_handlers in keys.items():
+        states = await context.application.persistence.load_conversation_states([h.name for h in key_handlers], key)
+        for handler in key_handlers:
+            # ConversationHandler не дает публичного способа подменить состояние: атрибут PTB 20.7,
+            # версия закреплена в requirements.txt (см. комментарий там)
+            conversations = handler._conversations
+            if handler.name in states:
+                conversations.update_no_track({key: states[handler.name]})
+            elif key in conversations:
+                conversations.pop(key)
+
+
+async def save_after_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Последний обработчик для режима нескольких процессов: сразу записывает user_data
+    и изменившиеся состояния разговоров, чтобы следующее обновление мог обработать любой процесс.
+    """
+    if not isinstance(update, Update):
+        return
+    if update.effective_user is not None:
+        await context.application.persistence.update_user_data(update.effective_user.id, context.user_data)
+    await context.application.update_persistence()
@@ -1,175 +1,207 @@
-from db.connection import get_db_connection
+from db.connection import db_connection, to_async
+from utils.analytics import get_class_snapshots
 from psycopg2.extras import RealDictCursor
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Название согласия, статусы и имена учеников одним запросом
+_STATUS_REPORT_SQL = """
+    SELECT
+        c.name AS consent_name,
+        cs.status,
+        s.full_name
+    FROM
+        consents c
+    LEFT JOIN
+        consent_submissions cs ON cs.consent_id = c.id
+    LEFT JOIN
+        students s ON cs.student_id = s.id
+    WHERE
+        c.id = %s
+    ORDER BY
+        cs.status, s.full_name;
+"""
+
+
 def generate_status_report(consent_id: int) -> str:
     """
     Генерирует текстовый отчет по статусам сдачи согласия для указанного consent_id.
+    Все данные получаются одним запросом и группируются по статусам в Python.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Получаем название согласия
-            cursor.execute("SELECT name FROM consents WHERE id = %s;", (consent_id,))
-            consent_data = cursor.fetchone()
-            if not consent_data:
-                return f"Ошибка: Согласие с ID {consent_id} не найдено."
-
-            consent_name = consent_data['name']
-
-            # Получаем статистику по статусам
-            cursor.execute("""
-                SELECT
-                    status,
-                    COUNT(*) as count
-                FROM
-                    consent_submissions
-                WHERE
-                    consent_id = %s
-                GROUP BY
-                    status;
-            """, (consent_id,))
-            status_counts = cursor.fetchall()
-
-            # Формируем заголовок отчета
-            report_lines = [f"📊 Отчет по согласию '{consent_name}' (ID: {consent_id})", ""]
-
-            if not status_counts:
-                report_lines.append("Нет данных о сдаче согласия.")
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                # Получаем название согласия вместе со статусами и именами учеников
+                cursor.execute(_STATUS_REPORT_SQL, (consent_id,))
+                rows = cursor.fetchall()
+                if not rows:
+                    return f"Ошибка: Согласие с ID {consent_id} не найдено."
+
+                consent_name = rows[0]['consent_name']
+
+                # Группируем учеников по статусам
+                students_by_status = {}
+                for row in rows:
+                    if row['status'] is None:
+                        continue  # Согласие без записей о сдаче
+                    students_by_status.setdefault(row['status'], []).append(row['full_name'])
+
+                # Формируем заголовок отчета
+                report_lines = [f"📊 Отчет по согласию '{consent_name}' (ID: {consent_id})", ""]
+
+                if not students_by_status:
+                    report_lines.append("Нет данных о сдаче согласия.")
+                    return "\n".join(report_lines)
+
+                # Добавляем статистику по статусам
+                report_lines.append("📈 Статистика по статусам:")
+                total_submissions = 0
+                for status, students in students_by_status.items():
+                    report_lines.append(f"  - {status}: {len(students)}")
+                    total_submissions += len(students)
+
+                report_lines.append(f"  - Всего: {total_submissions}")
+                report_lines.append("")
+
+                # Добавляем список учеников по каждому статусу
+                for status, students in students_by_status.items():
+                    report_lines.append(f"👥 Ученики со статусом '{status}':")
+                    for full_name in students:
+                        report_lines.append(f"  - {full_name}")
+
                 return "\n".join(report_lines)
 
-            # Добавляем статистику по статусам
-            report_lines.append("📈 Статистика по статусам:")
-            total_submissions = 0
-            for sc in status_counts:
-                report_lines.append(f"  - {sc['status']}: {sc['count']}")
-                total_submissions += sc['count']
+        except Exception as e:
+            logger.error(f"Ошибка при генерации отчета по статусам для согласия {consent_id}: {e}")
+            return f"Ошибка при генерации отчета: {e}"
 
-            report_lines.append(f"  - Всего: {total_submissions}")
-            report_lines.append("")
 
-            # Получаем список учеников по каждому статусу
-            for sc in status_counts:
-                status = sc['status']
-                report_lines.append(f"👥 Ученики со статусом '{status}':")
-                cursor.execute("""
-                    SELECT
-                        s.full_name
-                    FROM
-                        consent_submissions cs
-                    JOIN
-                        students s ON cs.student_id = s.id
-                    WHERE
-                        cs.consent_id = %s AND cs.status = %s
-                    ORDER BY
-                        s.full_name;
-                """, (consent_id, status))
-                students = cursor.fetchall()
-                for student in students:
-                    report_lines.append(f"  - {student['full_name']}")
-
-            return "\n".join(report_lines)
-
-    except Exception as e:
-        logger.error(f"Ошибка при генерации отчета по статусам для согласия {consent_id}: {e}")
-        return f"Ошибка при генерации отчета: {e}"
-    finally:
-        conn.close()
+def _format_duration(value) -> str:
+    """Форматирует интервал (timedelta) как "2 дн. 5 ч." или "3 ч. 10 мин."."""
+    minutes = int(value.total_seconds() // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days} дн. {hours} ч."
+    return f"{hours} ч. {minutes} мин."
 
 
 def generate_class_statistics_report() -> str:
     """
     Генерирует статистический отчет по всем классам.
+    Статистика читается из снимков class_stats_snapshots и consent_stats_snapshots, которые
+    пересчитывает задача utils.analytics; в заголовке указывается время снимка.
     """
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Получаем список всех классов
-            cursor.execute("SELECT id, name FROM classes ORDER BY name;")
-            classes = cursor.fetchall()
-
-            if not classes:
-                return "Нет данных о классах."
-
-            # Формируем заголовок отчета
-            report_lines = ["📊 Сводная статистика по классам", ""]
-
-            for class_info in classes:
-                class_id = class_info['id']
-                class_name = class_info['name']
-                report_lines.append(f"🏫 Класс: {class_name}")
-
-                # Получаем все согласия для этого класса
+    snapshots = get_class_snapshots()
+    if snapshots is None:
+        return "Ошибка при генерации сводного отчета."
+    if snapshots['refreshed_at'] is None:
+        return "Сводная статистика еще не рассчитана. Попробуйте позже."
+
+    rows = snapshots['rows']
+    if not rows:
+        return "Нет данных о классах."
+
+    # Формируем заголовок отчета
+    report_lines = [
+        "📊 Сводная статистика по классам",
+        f"По состоянию на {snapshots['refreshed_at'].strftime('%d.%m.%Y %H:%M')}",
+        "",
+    ]
+
+    current_class_id = None
+    for row in rows:
+        if row['class_id'] != current_class_id:
+            if current_class_id is not None:
+                report_lines.append("") # Пустая строка между классами
+            current_class_id = row['class_id']
+            report_lines.append(f"🏫 Класс: {row['class_name']}")
+            if row['class_total']:
+                report_lines.append(
+                    f"  Итого по {row['class_consents']} согласиям: сдано {row['class_submitted'] / row['class_total'] * 100:.1f}%, "
+                    f"отказов {row['class_refused'] / row['class_total'] * 100:.1f}%, просрочено {row['class_overdue']}"
+                )
+                if row['class_time_to_submit_p50'] is not None:
+                    report_lines.append(
+                        f"  ⏱ Время сдачи: медиана {_format_duration(row['class_time_to_submit_p50'])}, "
+                        f"90% - до {_format_duration(row['class_time_to_submit_p90'])}"
+                    )
+
+        if row['consent_id'] is None:
+            report_lines.append("  Нет согласий для этого класса.")
+            continue
+
+        report_lines.append(f"  📄 Согласие: {row['consent_name']} (ID: {row['consent_id']})")
+
+        # Рассчитываем проценты
+        total_in_class = row['total']
+        if total_in_class > 0:
+            submitted_percent = (row['submitted'] / total_in_class) * 100
+            refused_percent = (row['refused'] / total_in_class) * 100
+            expired_percent = (row['overdue'] / total_in_class) * 100
+            not_submitted_percent = (row['pending'] / total_in_class) * 100
+
+            report_lines.append(f"    ✅ Сдано: {row['submitted']} ({submitted_percent:.1f}%)")
+            report_lines.append(f"    ❌ Отказано: {row['refused']} ({refused_percent:.1f}%)")
+            report_lines.append(f"    ⏰ Просрочено: {row['overdue']} ({expired_percent:.1f}%)")
+            report_lines.append(f"    🕒 Не сдано: {row['pending']} ({not_submitted_percent:.1f}%)")
+            if row['time_to_submit_p50'] is not None:
+                report_lines.append(f"    ⏱ Медиана времени сдачи: {_format_duration(row['time_to_submit_p50'])}")
+        else:
+            report_lines.append("    Нет данных о сдаче.")
+
+    report_lines.append("") # Пустая строка после последнего класса
+
+    return "\n".join(report_lines)
+
+
+# Порядок статусов в кратком отчете о ходе сдачи
+PROGRESS_STATUSES = ['Сдано', 'Отказался', 'Не сдано', 'Просрочено', 'Не идет']
+
+
+def generate_progress_report(consent_id: int, teacher_id: int = None) -> str:
+    """
+    Генерирует краткий отчет о ходе сдачи согласия по счетчикам consent_status_counters.
+    Если указан teacher_id, отчет строится только для согласий классов этого учителя.
+    """
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
                 cursor.execute("""
-                    SELECT
-                        id,
-                        name
-                    FROM
-                        consents
-                    WHERE
-                        class_id = %s
-                    ORDER BY
-                        created_at DESC;
-                """, (class_id,))
-                consents = cursor.fetchall()
-
-                if not consents:
-                    report_lines.append("  Нет согласий для этого класса.")
-                    report_lines.append("")
-                    continue
-
-                # Для каждого согласия получаем статистику
-                for consent in consents:
-                    consent_id = consent['id']
-                    consent_name = consent['name']
-                    report_lines.append(f"  📄 Согласие: {consent_name} (ID: {consent_id})")
-
-                    cursor.execute("""
-                        SELECT
-                            status,
-                            COUNT(*) as count
-                        FROM
-                            consent_submissions
-                        WHERE
-                            consent_id = %s
-                        GROUP BY
-                            status;
-                    """, (consent_id,))
-                    status_stats = cursor.fetchall()
-
-                    total_in_class = 0
-                    stats_dict = {}
-                    for stat in status_stats:
-                        stats_dict[stat['status']] = stat['count']
-                        total_in_class += stat['count']
-
-                    # Рассчитываем проценты
-                    if total_in_class > 0:
-                        submitted_count = stats_dict.get('Сдано', 0)
-                        refused_count = stats_dict.get('Отказался', 0)
-                        expired_count = stats_dict.get('Просрочено', 0)
-                        not_submitted_count = stats_dict.get('Не сдано', 0)
-
-                        submitted_percent = (submitted_count / total_in_class) * 100
-                        refused_percent = (refused_count / total_in_class) * 100
-                        expired_percent = (expired_count / total_in_class) * 100
-                        not_submitted_percent = (not_submitted_count / total_in_class) * 100
-
-                        report_lines.append(f"    ✅ Сдано: {submitted_count} ({submitted_percent:.1f}%)")
-                        report_lines.append(f"    ❌ Отказано: {refused_count} ({refused_percent:.1f}%)")
-                        report_lines.append(f"    ⏰ Просрочено: {expired_count} ({expired_percent:.1f}%)")
-                        report_lines.append(f"    🕒 Не сдано: {not_submitted_count} ({not_submitted_percent:.1f}%)")
-                    else:
-                        report_lines.append("    Нет данных о сдаче.")
+                    SELECT c.name AS consent_name, c.deadline, k.status, k.count
+                    FROM consents c
+                    JOIN classes cl ON cl.id = c.class_id
+                    LEFT JOIN consent_status_counters k ON k.consent_id = c.id AND k.count > 0
+                    WHERE c.id = %s AND (%s::int IS NULL OR cl.teacher_id = %s);
+                """, (consent_id, teacher_id, teacher_id))
+                rows = cursor.fetchall()
+                if not rows:
+                    return f"Согласие с ID {consent_id} не найдено."
+
+                counts = {row['status']: row['count'] for row in rows if row['status'] is not None}
+                total = sum(counts.values())
+                report_lines = [f"📈 Ход сдачи согласия '{rows[0]['consent_name']}' (ID: {consent_id})"]
+                if rows[0]['deadline']:
+                    report_lines.append(f"Дедлайн: {rows[0]['deadline'].strftime('%d.%m.%Y')}")
+                if not total:
+                    report_lines.append("Нет данных о сдаче.")
+                    return "\n".join(report_lines)
+
+                # Известные статусы в постоянном порядке, затем прочие
+                statuses = [status for status in PROGRESS_STATUSES if status in counts]
+                statuses += sorted(status for status in counts if status not in PROGRESS_STATUSES)
+                for status in statuses:
+                    report_lines.append(f"  - {status}: {counts[status]} ({counts[status] / total * 100:.1f}%)")
+                report_lines.append(f"  - Всего: {total}")
+                return "\n".join(report_lines)
 
-                report_lines.append("") # Пустая строка между классами
+        except Exception as e:
+            logger.error(f"Ошибка при генерации отчета о ходе сдачи согласия {consent_id}: {e}")
+            return f"Ошибка при генерации отчета: {e}"
 
-            return "\n".join(report_lines)
 
-    except Exception as e:
-        logger.error(f"Ошибка при генерации сводного отчета по классам: {e}")
-        return f"Ошибка при генерации сводного отчета: {e}"
-    finally:
-        conn.close()
\ No newline at end of file
+# Асинхронные версии для вызова из обработчиков без блокировки цикла событий
+generate_status_report_async = to_async(generate_status_report)
+generate_class_statistics_report_async = to_async(generate_class_statistics_report)
+generate_progress_report_async = to_async(generate_progress_report)
@@ -0,0 +1,169 @@
+"""
+Разбор списка класса (CSV или XLSX) для команды /import_roster.
+
+Файл читается потоково, по строке: CSV - модулем csv, XLSX - разбором XML листа
+через iterparse без загрузки книги целиком. Ожидаются столбцы "ФИО ученика" и
+"ФИО родителя"; если строки заголовка нет, берутся первые два столбца.
+"""
+import codecs
+import csv
+import logging
+import os
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+logger = logging.getLogger(__name__)
+
+# Максимальное число строк в одном файле и максимальный размер файла (в байтах)
+ROSTER_MAX_ROWS = int(os.getenv('ROSTER_MAX_ROWS', '10000'))
+ROSTER_MAX_FILE_SIZE = int(os.getenv('ROSTER_MAX_FILE_SIZE', str(5 * 1024 * 1024)))
+# Максимальный распакованный размер таблицы строк XLSX (в байтах): она загружается в память целиком
+ROSTER_MAX_SHARED_STRINGS_BYTES = int(os.getenv('ROSTER_MAX_SHARED_STRINGS_BYTES', str(20 * 1024 * 1024)))
+# Максимальная длина ФИО (students.full_name VARCHAR(255))
+MAX_NAME_LENGTH = 255
+
+STUDENT_HEADERS = {'фио ученика', 'ученик', 'фио', 'student'}
+PARENT_HEADERS = {'фио родителя', 'родитель', 'parent'}
+
+_SHEET_NAMESPACE = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_CELL_REF_RE = re.compile(r'^([A-Z]+)')
+_WORKSHEET_RE = re.compile(r'^xl/worksheets/sheet(\d+)\.xml$')
+
+
+def _detect_encoding(file_path: str) -> str:
+    # Excel в русской локали сохраняет CSV в cp1251, остальные программы - в UTF-8
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    with open(file_path, 'rb') as f:
+        try:
+            decoder.decode(f.read(64 * 1024))
+            return 'utf-8-sig'
+        except UnicodeDecodeError:
+            return 'cp1251'
+
+
+def _iter_csv_rows(file_path: str):
+    encoding = _detect_encoding(file_path)
+    with open(file_path, encoding=encoding, newline='') as f:
+        first_line = f.readline()
+        delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+        f.seek(0)
+        for row in csv.reader(f, delimiter=delimiter):
+            yield row
+
+
+def _column_index(cell_ref: str) -> int:
+    letters = _CELL_REF_RE.match(cell_ref).group(1)
+    index = 0
+    for letter in letters:
+        index = index * 26 + (ord(letter) - ord('A') + 1)
+    return index - 1
+
+
+def _load_shared_strings(archive: zipfile.ZipFile) -> list:
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    # Защита от "zip-бомб": проверяем распакованный размер до разбора
+    unpacked_size = archive.getinfo('xl/sharedStrings.xml').file_size
+    if unpacked_size > ROSTER_MAX_SHARED_STRINGS_BYTES:
+        raise ValueError(f"Слишком большая таблица строк XLSX: {unpacked_size} байт после распаковки.")
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as part:
+        for _, element in iterparse(part, events=('end',)):
+            if element.tag == f'{_SHEET_NAMESPACE}si':
+                strings.append("".join(node.text or "" for node in element.iter(f'{_SHEET_NAMESPACE}t')))
+                element.clear()
+    return strings
+
+
+def _iter_xlsx_rows(file_path: str):
+    with zipfile.ZipFile(file_path) as archive:
+        sheets = sorted((int(match.group(1)), name) for name in archive.namelist()
+                        for match in [_WORKSHEET_RE.match(name)] if match)
+        if not sheets:
+            raise ValueError("В файле XLSX нет листов.")
+        shared_strings = _load_shared_strings(archive)
+        # Читается только первый лист
+        with archive.open(sheets[0][1]) as part:
+            for _, element in iterparse(part, events=('end',)):
+                if element.tag != f'{_SHEET_NAMESPACE}row':
+                    continue
+                row = []
+                for cell in element.iter(f'{_SHEET_NAMESPACE}c'):
+                    cell_type = cell.get('t')
+                    if cell_type == 'inlineStr':
+                        value = "".join(node.text or "" for node in cell.iter(f'{_SHEET_NAMESPACE}t'))
+                    else:
+                        value_node = cell.find(f'{_SHEET_NAMESPACE}v')
+                        value = value_node.text if value_node is not None and value_node.text else ""
+                        if cell_type == 's' and value:
+                            value = shared_strings[int(value)]
+                    index = _column_index(cell.get('r')) if cell.get('r') else len(row)
+                    row.extend([""] * (index - len(row)))
+                    row.append(value)
+                yield row
+                element.clear()
+
+
+def iter_roster_rows(file_path: str):
+    """Выдает строки файла списка класса по одной: (номер строки, список значений ячеек)."""
+    file_extension = os.path.splitext(file_path)[1].lower()
+    if file_extension == '.csv':
+        rows = _iter_csv_rows(file_path)
+    elif file_extension == '.xlsx':
+        rows = _iter_xlsx_rows(file_path)
+    else:
+        raise ValueError(f"Неподдерживаемый формат файла: {file_extension}")
+    for line_number, row in enumerate(rows, start=1):
+        yield line_number, row
+
+
+def _normalize(value) -> str:
+    return " ".join(str(value or "").split())
+
+
+def parse_roster(file_path: str, max_rows: int = ROSTER_MAX_ROWS) -> tuple:
+    """
+    Разбирает и проверяет файл списка класса.
+    Возвращает (rows, rejected): rows - список {'line', 'student', 'parent'},
+    rejected - список (номер строки, причина).
+    """
+    rows = []
+    rejected = []
+    seen_students = set()
+    student_column, parent_column = 0, 1
+
+    for line_number, values in iter_roster_rows(file_path):
+        values = [_normalize(value) for value in values]
+        if not any(values):
+            continue  # Пустые строки пропускаем молча
+
+        if line_number == 1:
+            headers = [value.lower() for value in values]
+            student_header = next((i for i, h in enumerate(headers) if h in STUDENT_HEADERS), None)
+            parent_header = next((i for i, h in enumerate(headers) if h in PARENT_HEADERS), None)
+            if student_header is not None or parent_header is not None:
+                if student_header is None or parent_header is None:
+                    raise ValueError("В заголовке должны быть столбцы 'ФИО ученика' и 'ФИО родителя'.")
+                student_column, parent_column = student_header, parent_header
+                continue
+
+        if len(rows) >= max_rows:
+            rejected.append((line_number, f"превышен лимит в {max_rows} строк, остальные строки не загружены"))
+            break
+
+        student = values[student_column] if student_column < len(values) else ""
+        parent = values[parent_column] if parent_column < len(values) else ""
+        if not student:
+            rejected.append((line_number, "не указано ФИО ученика"))
+        elif not parent:
+            rejected.append((line_number, "не указано ФИО родителя"))
+        elif len(student) > MAX_NAME_LENGTH or len(parent) > MAX_NAME_LENGTH:
+            rejected.append((line_number, f"ФИО длиннее {MAX_NAME_LENGTH} символов"))
+        elif student.lower() in seen_students:
+            rejected.append((line_number, f"ученик '{student}' уже указан в файле"))
+        else:
+            seen_students.add(student.lower())
+            rows.append({'line': line_number, 'student': student, 'parent': parent})
+
+    return rows, rejected
@@ -1,212 +1,307 @@
 from telegram.ext import ContextTypes
-from db.connection import get_db_connection
+from db.connection import db_connection, run_db
+from utils.dispatcher import get_dispatcher
 from psycopg2.extras import RealDictCursor
 import logging
-from datetime import datetime, timedelta
+import os
+from datetime import datetime, timedelta, timezone
 
 logger = logging.getLogger(__name__)
 
-async def check_deadlines(context: ContextTypes.DEFAULT_TYPE):
+# Сколько согласий обрабатывать в одной транзакции при истечении дедлайнов
+EXPIRY_BATCH_SIZE = int(os.getenv('EXPIRY_BATCH_SIZE', '500'))
+# Сколько дней пытаться повторно отправить недоставленную сводку учителю
+EXPIRY_SUMMARY_RETRY_DAYS = int(os.getenv('EXPIRY_SUMMARY_RETRY_DAYS', '7'))
+
+# Запас при выборке после прошлой границы: created_at - время начала транзакции, поэтому согласие
+# с уже прошедшим дедлайном может стать видимым после того, как граница ушла дальше его created_at.
+# Повторно такие согласия не обрабатываются: их отсекает consent_expirations.
+_EXPIRY_OVERLAP = timedelta(minutes=5)
+
+
+# Согласия, дедлайн которых прошел после прошлой границы или которые созданы уже с прошедшим дедлайном
+_DUE_CONSENTS_SQL = """
+    SELECT c.id
+    FROM consents c
+    WHERE
+        c.deadline <= %(cutoff)s
+        AND (c.deadline > %(since)s OR c.created_at > %(since)s)
+        AND NOT EXISTS (SELECT 1 FROM consent_expirations e WHERE e.consent_id = c.id)
+    ORDER BY c.deadline
+    LIMIT %(limit)s;
+"""
+
+
+def _expire_due_consents() -> int:
     """
-    Периодически проверяет дедлайны согласий и обновляет статусы.
+    Переводит в статус "Просрочено" несданные согласия, дедлайн которых прошел с прошлого запуска.
+    Обрабатывает согласия пачками по EXPIRY_BATCH_SIZE, каждая пачка - одна транзакция.
+    Возвращает число обработанных согласий.
     """
-    logger.info("Начало проверки дедлайнов согласий...")
-    conn = get_db_connection()
-    try:
+    processed = 0
+    with db_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                # Фиксируем границу текущего запуска: все, что истекло до нее, будет обработано
+                cursor.execute("SELECT processed_until, NOW() AS cutoff FROM deadline_expiry_state;")
+                state = cursor.fetchone()
+                cutoff = state['cutoff']
+                processed_until = state['processed_until']
+
+                while True:
+                    cursor.execute(_DUE_CONSENTS_SQL, {'cutoff': cutoff, 'since': processed_until - _EXPIRY_OVERLAP,
+                                                       'limit': EXPIRY_BATCH_SIZE})
+                    consent_ids = [row['id'] for row in cursor.fetchall()]
+                    if not consent_ids:
+                        break
+
+                    # Одним запросом обновляем статусы всей пачки и запоминаем, что она обработана
+                    cursor.execute("""
+                        WITH updated AS (
+                            UPDATE consent_submissions
+                            SET status = 'Просрочено', updated_at = NOW()
+                            WHERE consent_id = ANY(%(ids)s) AND status NOT IN ('Сдано', 'Отказался', 'Просрочено')
+                            RETURNING consent_id
+                        )
+                        INSERT INTO consent_expirations (consent_id, expired_count, summary_sent_at)
+                        SELECT b.consent_id, COUNT(u.consent_id),
+                               -- Если просроченных нет, сводку отправлять не нужно
+                               CASE WHEN COUNT(u.consent_id) = 0 THEN NOW() END
+                        FROM unnest(%(ids)s::int[]) AS b(consent_id)
+                        LEFT JOIN updated u ON u.consent_id = b.consent_id
+                        GROUP BY b.consent_id
+                        ON CONFLICT (consent_id) DO NOTHING;
+                    """, {'ids': consent_ids})
+                    conn.commit()
+                    processed += len(consent_ids)
+                    if len(consent_ids) < EXPIRY_BATCH_SIZE:
+                        break
+
+                cursor.execute("UPDATE deadline_expiry_state SET processed_until = %s;", (cutoff,))
+                conn.commit()
+                return processed
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении статусов просроченных согласий: {e}")
+            conn.rollback()
+            return processed
+
+
+def _get_pending_expiry_summaries() -> list:
+    """Возвращает сводки по истекшим согласиям, которые еще не были отправлены учителям."""
+    with db_connection() as conn:
         with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Получаем все согласия, у которых дедлайн прошел, но статус еще не "Просрочено"
-            # Также получаем информацию о классе и учителе
             cursor.execute("""
                 SELECT
-                    c.id AS consent_id,
+                    e.consent_id,
                     c.name AS consent_name,
-                    c.deadline,
-                    cl.teacher_id,
-                    t.telegram_id AS teacher_telegram_id
+                    t.telegram_id AS teacher_telegram_id,
+                    ARRAY(
+                        SELECT s.full_name
+                        FROM consent_submissions cs
+                        JOIN students s ON cs.student_id = s.id
+                        WHERE cs.consent_id = e.consent_id AND cs.status = 'Просрочено'
+                        ORDER BY s.full_name
+                    ) AS student_names
                 FROM
-                    consents c
+                    consent_expirations e
+                JOIN
+                    consents c ON e.consent_id = c.id
                 JOIN
                     classes cl ON c.class_id = cl.id
                 JOIN
                     users t ON cl.teacher_id = t.id
                 WHERE
-                    c.deadline < NOW() AT TIME ZONE 'UTC'
-                    AND c.id IN (
-                        SELECT DISTINCT consent_id
-                        FROM consent_submissions
-                        WHERE status != 'Просрочено'
-                    );
-            """)
-            expired_consents = cursor.fetchall()
-
-            if not expired_consents:
-                logger.info("Нет согласий с просроченными дедлайнами.")
-                return
-
-            logger.info(f"Найдено {len(expired_consents)} согласий с просроченными дедлайнами.")
-
-            for consent_data in expired_consents:
-                consent_id = consent_data['consent_id']
-                consent_name = consent_data['consent_name']
-                teacher_telegram_id = consent_data['teacher_telegram_id']
-
-                # Обновляем статус всех незавершенных сдач на "Просрочено"
-                cursor.execute("""
-                    UPDATE consent_submissions
-                    SET status = 'Просрочено'
-                    WHERE consent_id = %s AND status NOT IN ('Сдано', 'Отказался');
-                """, (consent_id,))
-                updated_rows = cursor.rowcount
-                logger.info(f"Обновлено {updated_rows} записей для согласия '{consent_name}' (ID: {consent_id}) на статус 'Просрочено'.")
-
-                # Формируем и отправляем сводку учителю
-                if teacher_telegram_id and updated_rows > 0:
-                    try:
-                        # Получаем список учеников, которые не сдали согласие
-                        cursor.execute("""
-                            SELECT
-                                s.full_name
-                            FROM
-                                consent_submissions cs
-                            JOIN
-                                students s ON cs.student_id = s.id
-                            WHERE
-                                cs.consent_id = %s AND cs.status = 'Просрочено';
-                        """, (consent_id,))
-                        students_with_expired = cursor.fetchall()
-                        student_names = [s['full_name'] for s in students_with_expired]
-
-                        summary_text = (
-                            f"⚠️ Дедлайн по согласию '{consent_name}' (ID: {consent_id}) истек.\n"
-                            f"Следующие ученики не сдали согласие вовремя:\n"
-                            f"{chr(10).join(student_names)}"
-                        )
+                    e.summary_sent_at IS NULL
+                    AND e.expired_at > NOW() - %s * INTERVAL '1 day'
+                ORDER BY
+                    e.expired_at;
+            """, (EXPIRY_SUMMARY_RETRY_DAYS,))
+            return cursor.fetchall()
 
-                        await context.bot.send_message(chat_id=teacher_telegram_id, text=summary_text)
-                        logger.info(f"Сводка отправлена учителю с telegram_id {teacher_telegram_id}.")
-                    except Exception as e:
-                        logger.error(f"Не удалось отправить сводку учителю с telegram_id {teacher_telegram_id}: {e}")
 
+def _mark_expiry_summaries_sent(consent_ids: list):
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "UPDATE consent_expirations SET summary_sent_at = NOW() WHERE consent_id = ANY(%s);",
+                (consent_ids,)
+            )
             conn.commit()
 
+
+async def check_deadlines(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Периодически проверяет дедлайны согласий и обновляет статусы.
+    Обрабатываются только дедлайны, прошедшие с прошлого запуска; статусы фиксируются
+    в базе до отправки сводок, а отправленные сводки отмечаются, чтобы не повторять их после перезапуска.
+    """
+    logger.info("Начало проверки дедлайнов согласий...")
+    try:
+        processed = await run_db(_expire_due_consents)
+        if processed:
+            logger.info(f"Обработано {processed} согласий с истекшими дедлайнами.")
+        else:
+            logger.info("Нет согласий с просроченными дедлайнами.")
+
+        summaries = await run_db(_get_pending_expiry_summaries)
+        messages = []
+        consent_ids_by_chat = {}
+        for summary in summaries:
+            teacher_telegram_id = summary['teacher_telegram_id']
+            if not teacher_telegram_id:
+                continue
+            summary_text = (
+                f"⚠️ Дедлайн по согласию '{summary['consent_name']}' (ID: {summary['consent_id']}) истек.\n"
+                f"Следующие ученики не сдали согласие вовремя:\n"
+                f"{chr(10).join(summary['student_names'])}"
+            )
+            messages.append({'chat_id': teacher_telegram_id, 'text': summary_text})
+            consent_ids_by_chat.setdefault(teacher_telegram_id, []).append(summary['consent_id'])
+
+        if messages:
+            report = await get_dispatcher(context.bot).send_bulk(messages)
+            # Ошибки в сводке учитываются по чатам: сводки в чат с ошибкой будут отправлены повторно
+            delivered = [
+                consent_id
+                for chat_id, consent_ids in consent_ids_by_chat.items() if chat_id not in report['errors']
+                for consent_id in consent_ids
+            ]
+            if delivered:
+                await run_db(_mark_expiry_summaries_sent, delivered)
+            logger.info(f"Сводки по истекшим дедлайнам: отправлено {report['sent']}, не доставлено {report['failed']}.")
+
     except Exception as e:
         logger.error(f"Ошибка при проверке дедлайнов согласий: {e}")
-        conn.rollback()
     finally:
-        conn.close()
         logger.info("Проверка дедлайнов согласий завершена.")
 
 
+# Несдавшие ученики согласий, их родители и учителя - для напоминаний
+_REMINDERS_SQL = """
+    SELECT
+        c.id AS consent_id,
+        c.name AS consent_name,
+        c.deadline,
+        cl.name AS class_name,
+        t.telegram_id AS teacher_telegram_id,
+        s.full_name AS student_name,
+        pu.telegram_id AS parent_telegram_id
+    FROM
+        consents c
+    JOIN
+        classes cl ON c.class_id = cl.id
+    JOIN
+        users t ON cl.teacher_id = t.id
+    JOIN
+        consent_submissions cs ON cs.consent_id = c.id AND cs.status = 'Не сдано'
+    JOIN
+        students s ON cs.student_id = s.id
+    LEFT JOIN
+        parents p ON s.id = p.student_id
+    LEFT JOIN
+        users pu ON p.user_id = pu.id
+    WHERE
+        c.id = ANY(%s)
+    ORDER BY
+        c.id, s.full_name;
+"""
+
+
+def get_reminder_messages(consent_ids: list) -> list:
+    """
+    Готовит напоминания родителям учеников, еще не сдавших согласия из consent_ids,
+    и сводки учителям. Все данные получаются одним запросом.
+    Возвращает список сообщений для MessageDispatcher.send_bulk.
+    """
+    if not consent_ids:
+        return []
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(_REMINDERS_SQL, (consent_ids,))
+            rows = cursor.fetchall()
+
+    # Группируем строки по согласиям
+    consents = {}
+    for row in rows:
+        consent = consents.setdefault(row['consent_id'], {'info': row, 'students': {}, 'parents': []})
+        consent['students'][row['student_name']] = None  # dict сохраняет порядок и убирает повторы
+        if row['parent_telegram_id']:
+            consent['parents'].append(row['parent_telegram_id'])
+        else:
+            logger.warning(f"Родитель ученика {row['student_name']} не зарегистрирован в боте (нет telegram_id).")
+
+    messages = []
+    for consent_id, consent in consents.items():
+        info = consent['info']
+        deadline_text = info['deadline'].strftime('%d.%m.%Y')
+        logger.info(f"Найдено {len(consent['students'])} учеников, которые еще не сдали согласие '{info['consent_name']}'.")
+
+        # Напоминания родителям
+        reminder_text_to_parents = (
+            f"📅 Напоминание!\n"
+            f"Согласие '{info['consent_name']}' для класса {info['class_name']} должно быть сдано до {deadline_text}.\n"
+            f"Пожалуйста, не забудьте сдать согласие вовремя."
+        )
+        for parent_telegram_id in dict.fromkeys(consent['parents']):
+            messages.append({'chat_id': parent_telegram_id, 'text': reminder_text_to_parents})
+
+        # Сводка учителю
+        if info['teacher_telegram_id']:
+            summary_text_to_teacher = (
+                f"📅 Сводка по приближающимся дедлайнам!\n"
+                f"Согласие '{info['consent_name']}' для класса {info['class_name']} должно быть сдано до {deadline_text}.\n"
+                f"Следующие ученики еще не сдали согласие:\n"
+                f"{chr(10).join(consent['students'])}"
+            )
+            messages.append({'chat_id': info['teacher_telegram_id'], 'text': summary_text_to_teacher})
+    return messages
+
+
+async def send_deadline_reminders(context: ContextTypes.DEFAULT_TYPE, consent_ids: list):
+    """Отправляет напоминания по указанным согласиям через общий диспетчер рассылок."""
+    messages = await run_db(get_reminder_messages, consent_ids)
+    if not messages:
+        logger.info(f"Все ученики сдали согласия {consent_ids} или отказались от них.")
+        return None
+    report = await get_dispatcher(context.bot).send_bulk(messages)
+    logger.info(f"Напоминания о дедлайнах: отправлено {report['sent']}, не доставлено {report['failed']}.")
+    return report
+
+
+# Согласия с дедлайном в заданном диапазоне (границы суток в UTC)
+_DEADLINES_BETWEEN_SQL = "SELECT id FROM consents WHERE deadline >= %s AND deadline < %s;"
+
+
+def _get_consent_ids_with_deadline_on(target_date) -> list:
+    # Границы суток в UTC: сравнение с диапазоном позволяет использовать индекс по deadline
+    day_start = datetime.combine(target_date, datetime.min.time(), tzinfo=timezone.utc)
+    day_end = day_start + timedelta(days=1)
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute(_DEADLINES_BETWEEN_SQL, (day_start, day_end))
+            return [row['id'] for row in cursor.fetchall()]
+
+
 async def check_upcoming_deadlines(context: ContextTypes.DEFAULT_TYPE):
     """
-    Периодически проверяет приближающиеся дедлайны и отправляет напоминания.
+    Проверяет дедлайны, наступающие через 3 дня, и отправляет напоминания.
+    Бот отправляет напоминания по таймерам utils.deadline_timers; функция оставлена
+    для ручного запуска и совместимости.
     """
     logger.info("Начало проверки приближающихся дедлайнов согласий...")
-    conn = get_db_connection()
     try:
-        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Определяем дату, за 3 дня до которой нужно искать дедлайны
-            # Например, если сегодня 2023-10-20, то ищем дедлайны 2023-10-23
-            target_date = datetime.utcnow().date() + timedelta(days=3)
-            logger.info(f"Проверяем дедлайны, приходящиеся на {target_date}.")
+        # Например, если сегодня 2023-10-20, то ищем дедлайны 2023-10-23
+        target_date = datetime.utcnow().date() + timedelta(days=3)
+        logger.info(f"Проверяем дедлайны, приходящиеся на {target_date}.")
+        consent_ids = await run_db(_get_consent_ids_with_deadline_on, target_date)
 
-            # Получаем все согласия, у которых дедлайн приходится на target_date
-            # Также получаем информацию о классе, учителе и родителях учеников
-            cursor.execute("""
-                SELECT
-                    c.id AS consent_id,
-                    c.name AS consent_name,
-                    c.deadline,
-                    cl.id AS class_id,
-                    cl.name AS class_name,
-                    cl.teacher_id,
-                    t.telegram_id AS teacher_telegram_id
-                FROM
-                    consents c
-                JOIN
-                    classes cl ON c.class_id = cl.id
-                JOIN
-                    users t ON cl.teacher_id = t.id
-                WHERE
-                    DATE(c.deadline AT TIME ZONE 'UTC') = %s;
-            """, (target_date,))
-            upcoming_consents = cursor.fetchall()
-
-            if not upcoming_consents:
-                logger.info("Нет согласий с дедлайнами на указанную дату.")
-                return
-
-            logger.info(f"Найдено {len(upcoming_consents)} согласий с дедлайнами на {target_date}.")
-
-            for consent_data in upcoming_consents:
-                consent_id = consent_data['consent_id']
-                consent_name = consent_data['consent_name']
-                class_name = consent_data['class_name']
-                teacher_telegram_id = consent_data['teacher_telegram_id']
-
-                # Получаем список учеников, которые еще не сдали согласие (статус "Не сдано")
-                cursor.execute("""
-                    SELECT
-                        s.id AS student_id,
-                        s.full_name AS student_name,
-                        p.user_id AS parent_user_id,
-                        pu.telegram_id AS parent_telegram_id
-                    FROM
-                        consent_submissions cs
-                    JOIN
-                        students s ON cs.student_id = s.id
-                    LEFT JOIN
-                        parents p ON s.id = p.student_id
-                    LEFT JOIN
-                        users pu ON p.user_id = pu.id
-                    WHERE
-                        cs.consent_id = %s AND cs.status = 'Не сдано';
-                """, (consent_id,))
-                students_not_submitted = cursor.fetchall()
-
-                if not students_not_submitted:
-                    logger.info(f"Все ученики сдали согласие '{consent_name}' (ID: {consent_id}) или отказались от него.")
-                    continue
-
-                logger.info(f"Найдено {len(students_not_submitted)} учеников, которые еще не сдали согласие '{consent_name}'.")
-
-                # Отправляем напоминания родителям
-                reminder_text_to_parents = (
-                    f"📅 Напоминание!\n"
-                    f"Согласие '{consent_name}' для класса {class_name} должно быть сдано до {target_date.strftime('%d.%m.%Y')}.\n"
-                    f"Пожалуйста, не забудьте сдать согласие вовремя."
-                )
-
-                for student_data in students_not_submitted:
-                    parent_telegram_id = student_data['parent_telegram_id']
-                    student_name = student_data['student_name']
-                    if parent_telegram_id:
-                        try:
-                            await context.bot.send_message(chat_id=parent_telegram_id, text=reminder_text_to_parents)
-                            logger.info(f"Напоминание отправлено родителю ученика {student_name} (telegram_id {parent_telegram_id}).")
-                        except Exception as e:
-                            logger.error(f"Не удалось отправить напоминание родителю ученика {student_name} (telegram_id {parent_telegram_id}): {e}")
-                    else:
-                        logger.warning(f"Родитель ученика {student_name} не зарегистрирован в боте (нет telegram_id).")
-
-                # Отправляем сводку учителю
-                if teacher_telegram_id:
-                    try:
-                        student_names_list = [s['student_name'] for s in students_not_submitted]
-                        summary_text_to_teacher = (
-                            f"📅 Сводка по приближающимся дедлайнам!\n"
-                            f"Согласие '{consent_name}' для класса {class_name} должно быть сдано до {target_date.strftime('%d.%m.%Y')}.\n"
-                            f"Следующие ученики еще не сдали согласие:\n"
-                            f"{chr(10).join(student_names_list)}"
-                        )
-                        await context.bot.send_message(chat_id=teacher_telegram_id, text=summary_text_to_teacher)
-                        logger.info(f"Сводка отправлена учителю с telegram_id {teacher_telegram_id}.")
-                    except Exception as e:
-                        logger.error(f"Не удалось отправить сводку учителю с telegram_id {teacher_telegram_id}: {e}")
+        if not consent_ids:
+            logger.info("Нет согласий с дедлайнами на указанную дату.")
+            return
 
+        logger.info(f"Найдено {len(consent_ids)} согласий с дедлайнами на {target_date}.")
+        await send_deadline_reminders(context, consent_ids)
     except Exception as e:
         logger.error(f"Ошибка при проверке приближающихся дедлайнов согласий: {e}")
-        # conn.rollback() не нужен, так как мы только читаем данные
     finally:
-        conn.close()
-        logger.info("Проверка приближающихся дедлайнов согласий завершена.")
\ No newline at end of file
+        logger.info("Проверка приближающихся дедлайнов согласий завершена.")
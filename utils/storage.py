@@ -0,0 +1,128 @@
+"""
+Хранилище загруженных файлов с адресацией по содержимому.
+
+Файл сохраняется один раз под ключом <sha256[:2]>/<sha256[2:4]>/<sha256><расширение>
+внутри UPLOADS_DIR; в consents.file_path и consent_submissions.submitted_file_path
+хранится этот ключ. Число ссылок на файл (file_blobs.ref_count) поддерживают триггеры
+базы данных, файлы без ссылок удаляет collect_unreferenced_blobs.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from db.connection import db_connection, run_db
+from psycopg2.extras import RealDictCursor
+from utils.analysis_cache import file_sha256
+
+logger = logging.getLogger(__name__)
+
+UPLOADS_DIR = os.getenv('UPLOADS_DIR', 'uploads')
+# Через сколько часов удалять файлы, на которые так и не сослалась ни одна запись
+BLOB_GC_GRACE_HOURS = float(os.getenv('BLOB_GC_GRACE_HOURS', '24'))
+
+_TMP_DIR_NAME = 'tmp'
+# Так начинались пути файлов, сохраненных до появления хранилища
+_LEGACY_PREFIX = 'uploads/'
+
+
+def blob_key_for(sha256: str, extension: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}{extension.lower()}"
+
+
+def blob_sha256(blob_key: str) -> str:
+    """Возвращает SHA-256 содержимого по ключу файла."""
+    return os.path.splitext(os.path.basename(blob_key))[0]
+
+
+def blob_path(blob_key: str) -> str:
+    """
+    Возвращает путь к файлу на диске по ключу внутри UPLOADS_DIR.
+    Пути старого формата "uploads/имя" (до появления хранилища) тоже ищутся в UPLOADS_DIR,
+    а не относительно текущего каталога процесса.
+    """
+    if blob_key.startswith(_LEGACY_PREFIX):
+        blob_key = blob_key[len(_LEGACY_PREFIX):]
+    return os.path.join(UPLOADS_DIR, blob_key)
+
+
+def new_temp_path(extension: str) -> str:
+    """Путь для временного файла внутри UPLOADS_DIR (на той же файловой системе, что и хранилище)."""
+    tmp_dir = os.path.join(UPLOADS_DIR, _TMP_DIR_NAME)
+    os.makedirs(tmp_dir, exist_ok=True)
+    return os.path.join(tmp_dir, f"{uuid.uuid4().hex}{extension.lower()}")
+
+
+def place_temp_file(temp_path: str, blob_key: str) -> str:
+    """Переносит временный файл в хранилище под ключом blob_key; если такой файл уже есть, временный удаляется."""
+    final_path = os.path.join(UPLOADS_DIR, blob_key)
+    if os.path.exists(final_path):
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        # Атомарная замена: параллельная загрузка того же содержимого не повредит файл
+        os.replace(temp_path, final_path)
+    return final_path
+
+
+def register_blob(blob_key: str, sha256: str, size: int):
+    """
+    Регистрирует файл в file_blobs (до того, как на него сошлется согласие или сдача).
+    Для уже известного файла обновляется created_at, чтобы очистка не удалила его до появления ссылки.
+    """
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO file_blobs (blob_key, sha256, size) VALUES (%s, %s, %s)
+                ON CONFLICT (blob_key) DO UPDATE SET created_at = NOW();
+            """, (blob_key, sha256, size))
+            conn.commit()
+
+
+async def save_upload(telegram_file, extension: str) -> tuple:
+    """
+    Скачивает файл Telegram во временный файл и сохраняет его в хранилище.
+    Возвращает (ключ, путь к файлу на диске).
+    """
+    temp_path = new_temp_path(extension)
+    try:
+        await telegram_file.download_to_drive(custom_path=temp_path)
+        sha256 = await asyncio.to_thread(file_sha256, temp_path)
+        blob_key = blob_key_for(sha256, extension)
+        # Сначала регистрация, затем перенос: очистка, удалившая запись раньше, не удалит новый файл
+        await run_db(register_blob, blob_key, sha256, os.path.getsize(temp_path))
+        final_path = await asyncio.to_thread(place_temp_file, temp_path, blob_key)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    return blob_key, final_path
+
+
+def collect_unreferenced_blobs(grace_hours: float = BLOB_GC_GRACE_HOURS) -> int:
+    """Удаляет файлы, на которые нет ссылок дольше grace_hours часов. Возвращает число удаленных файлов."""
+    with db_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            # Файлы удаляются до фиксации транзакции: параллельная регистрация того же файла
+            # ждет ее окончания и затем заново переносит файл в хранилище
+            cursor.execute("""
+                DELETE FROM file_blobs
+                WHERE ref_count <= 0 AND created_at < NOW() - %s * INTERVAL '1 hour'
+                RETURNING blob_key;
+            """, (grace_hours,))
+            blob_keys = [row['blob_key'] for row in cursor.fetchall()]
+            for blob_key in blob_keys:
+                try:
+                    os.remove(os.path.join(UPLOADS_DIR, blob_key))
+                except FileNotFoundError:
+                    pass
+            conn.commit()
+    if blob_keys:
+        logger.info(f"Удалено {len(blob_keys)} файлов без ссылок из хранилища.")
+    return len(blob_keys)
+
+
+async def collect_unreferenced_blobs_job(context):
+    """Задача JobQueue для периодической очистки хранилища."""
+    try:
+        await run_db(collect_unreferenced_blobs)
+    except Exception as e:
+        logger.error(f"Ошибка при очистке хранилища файлов: {e}")
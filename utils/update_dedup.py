@@ -0,0 +1,102 @@
+from collections import OrderedDict
+import logging
+import os
+import threading
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes
+from db.connection import db_connection, run_db
+
+logger = logging.getLogger(__name__)
+
+# Сколько последних update_id помнить для отсева повторов
+UPDATE_DEDUP_WINDOW = int(os.getenv('UPDATE_DEDUP_WINDOW', '10000'))
+# Сколько часов хранить принятые update_id в базе (режим нескольких процессов)
+UPDATE_DEDUP_RETENTION_HOURS = float(os.getenv('UPDATE_DEDUP_RETENTION_HOURS', '24'))
+
+
+class UpdateDeduplicator:
+    """
+    Помнит последние max_size значений update_id. Telegram повторяет доставку обновления
+    через webhook, если не получил ответ вовремя, поэтому одно обновление может прийти дважды.
+    """
+
+    def __init__(self, max_size: int = UPDATE_DEDUP_WINDOW):
+        self.max_size = max_size
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def is_duplicate(self, update_id: int) -> bool:
+        """Возвращает True, если обновление уже встречалось; иначе запоминает его."""
+        with self._lock:
+            if update_id in self._seen:
+                self.duplicates += 1
+                return True
+            self._seen[update_id] = None
+            while len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+            return False
+
+
+# Общий для процесса фильтр повторных обновлений
+update_deduplicator = UpdateDeduplicator()
+
+
+async def drop_duplicate_updates(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Обработчик группы -2 (выполняется раньше остальных): останавливает обработку
+    обновления, если такой update_id уже обрабатывался.
+    """
+    if isinstance(update, Update) and update_deduplicator.is_duplicate(update.update_id):
+        logger.info(f"Повторное обновление {update.update_id} пропущено.")
+        raise ApplicationHandlerStop
+
+
+def _claim_update(update_id: int) -> bool:
+    """Отмечает обновление как принятое. Возвращает False, если его уже принял другой процесс."""
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO processed_updates (update_id) VALUES (%s) ON CONFLICT (update_id) DO NOTHING;",
+                (update_id,)
+            )
+            claimed = cursor.rowcount == 1
+            conn.commit()
+            return claimed
+
+
+async def drop_duplicate_updates_shared(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Вариант drop_duplicate_updates для нескольких процессов: кроме памяти процесса
+    update_id проверяется по таблице processed_updates.
+    """
+    await drop_duplicate_updates(update, context)
+    if isinstance(update, Update):
+        try:
+            claimed = await run_db(_claim_update, update.update_id)
+        except Exception as e:
+            # Лучше обработать обновление дважды, чем потерять его
+            logger.error(f"Не удалось проверить обновление {update.update_id} на повтор: {e}")
+            return
+        if not claimed:
+            logger.info(f"Обновление {update.update_id} уже обработано другим процессом.")
+            raise ApplicationHandlerStop
+
+
+def purge_processed_updates(retention_hours: float = UPDATE_DEDUP_RETENTION_HOURS) -> int:
+    """Удаляет из processed_updates записи старше retention_hours часов."""
+    with db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM processed_updates WHERE received_at < NOW() - %s * INTERVAL '1 hour';",
+                           (retention_hours,))
+            deleted = cursor.rowcount
+            conn.commit()
+            return deleted
+
+
+async def purge_processed_updates_job(context: ContextTypes.DEFAULT_TYPE):
+    """Задача JobQueue для периодической очистки processed_updates."""
+    try:
+        await run_db(purge_processed_updates)
+    except Exception as e:
+        logger.error(f"Ошибка при очистке processed_updates: {e}")
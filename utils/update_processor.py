@@ -0,0 +1,58 @@
+"""
+Параллельная обработка обновлений с сохранением порядка для каждого пользователя.
+
+Обновления разных пользователей обрабатываются одновременно (запрос одного пользователя к базе
+данных не задерживает остальных), а обновления одного пользователя - строго по очереди:
+ConversationHandler и user_data не рассчитаны на два шага одного разговора одновременно.
+"""
+import asyncio
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Не больше max_concurrent_updates обновлений одновременно, по одному на пользователя (или чат).
+    Обновление, ждущее предыдущее обновление того же пользователя, занимает место в лимите;
+    Telegram присылает от одного пользователя лишь несколько обновлений подряд, поэтому
+    остальных пользователей это не задерживает.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # Ключ пользователя -> [блокировка, число обновлений в работе или в ожидании]
+        self._user_locks = {}
+
+    @staticmethod
+    def _user_key(update: object):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_user is not None:
+            return 'user', update.effective_user.id
+        if update.effective_chat is not None:
+            return 'chat', update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine):
+        key = self._user_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        entry = self._user_locks.get(key)
+        if entry is None:
+            entry = self._user_locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
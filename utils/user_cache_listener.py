@@ -0,0 +1,100 @@
+"""
+Сброс кэша пользователей по уведомлениям PostgreSQL (режим нескольких процессов).
+
+Каждое изменение таблицы users отправляет NOTIFY user_cache с telegram_id (миграция 0010).
+Процесс бота слушает канал в отдельном потоке на отдельном подключении и удаляет запись
+из user_cache, поэтому роль, снятая в одном процессе, перестает действовать и в остальных.
+Пока подключения нет, уведомления могут теряться: кэш выключен до повторного подключения.
+"""
+import logging
+import os
+import select
+import threading
+import time
+from db.connection import get_db_connection
+from utils.cache import user_cache
+
+logger = logging.getLogger(__name__)
+
+USER_CACHE_CHANNEL = 'user_cache'
+# Через сколько секунд переподключаться после обрыва и как часто проверять подключение
+USER_CACHE_LISTEN_RETRY = float(os.getenv('USER_CACHE_LISTEN_RETRY', '5'))
+USER_CACHE_LISTEN_CHECK_INTERVAL = float(os.getenv('USER_CACHE_LISTEN_CHECK_INTERVAL', '30'))
+
+
+class UserCacheListener:
+    """Слушает канал user_cache и сбрасывает записи кэша по telegram_id из уведомлений."""
+
+    def __init__(self, cache=user_cache, channel: str = USER_CACHE_CHANNEL,
+                 retry: float = USER_CACHE_LISTEN_RETRY, check_interval: float = USER_CACHE_LISTEN_CHECK_INTERVAL):
+        self.cache = cache
+        self.channel = channel
+        self.retry = retry
+        self.check_interval = check_interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Выключает кэш до подписки на канал и запускает поток прослушивания."""
+        if self._thread is not None:
+            return
+        self.cache.enabled = False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='user-cache-listener', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает поток прослушивания. Вызывается при остановке бота."""
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            self._stop.set()
+            thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = get_db_connection()
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel};")
+                # Изменения, сделанные до подписки, неизвестны: начинаем с пустого кэша
+                self.cache.clear()
+                self.cache.enabled = True
+                logger.info(f"Кэш пользователей сбрасывается по уведомлениям канала {self.channel}.")
+                self._listen(conn)
+            except Exception as e:
+                logger.warning(f"Подключение для уведомлений кэша пользователей потеряно: {e}")
+            finally:
+                self.cache.enabled = False
+                self.cache.clear()
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self._stop.wait(self.retry)
+
+    def _listen(self, conn):
+        checked_at = time.monotonic()
+        while not self._stop.is_set():
+            # Короткое ожидание, чтобы stop не ждал уведомления
+            if select.select([conn], [], [], 1.0) != ([], [], []):
+                conn.poll()
+                while conn.notifies:
+                    self._invalidate(conn.notifies.pop(0).payload)
+            elif time.monotonic() - checked_at >= self.check_interval:
+                # Обрыв без закрытия соединения select не замечает
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1;")
+                checked_at = time.monotonic()
+
+    def _invalidate(self, payload: str):
+        try:
+            self.cache.invalidate(int(payload))
+        except ValueError:
+            logger.warning(f"Некорректное уведомление кэша пользователей: {payload!r}")
+
+
+# Общий для процесса слушатель (запускается только при BOT_MULTI_WORKER=1)
+user_cache_listener = UserCacheListener()
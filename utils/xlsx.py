@@ -0,0 +1,108 @@
+"""
+Потоковая запись простых файлов XLSX (один лист) без сторонних библиотек.
+
+Строки пишутся сразу в сжатый поток листа внутри архива, поэтому память не зависит от числа строк.
+Строки хранятся как inline-строки (без общей таблицы sharedStrings, которую пришлось бы держать в памяти).
+"""
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+# Управляющие символы, недопустимые в XML 1.0
+_ILLEGAL_XML_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _column_letter(index: int) -> str:
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+class XlsxStreamWriter:
+    """
+    Пишет лист XLSX построчно:
+
+        with XlsxStreamWriter(path, sheet_name="Отчет") as writer:
+            writer.write_row(["ФИО", "Статус"])
+    """
+
+    def __init__(self, path: str, sheet_name: str = 'Лист1'):
+        self.path = path
+        self.sheet_name = sheet_name[:31]
+        self.rows_written = 0
+        self._archive = None
+        self._sheet = None
+        self._columns = []
+
+    def __enter__(self):
+        self._archive = zipfile.ZipFile(self.path, 'w', zipfile.ZIP_DEFLATED)
+        self._archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        self._archive.writestr('_rels/.rels', _ROOT_RELS)
+        self._archive.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(self.sheet_name, {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+        ))
+        self._archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        self._sheet = self._archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True)
+        self._sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+        )
+        return self
+
+    def write_row(self, values):
+        """Добавляет строку: числа пишутся числами, None - пустой ячейкой, остальное - текстом."""
+        self.rows_written += 1
+        row_number = self.rows_written
+        cells = []
+        for index, value in enumerate(values):
+            if value is None:
+                continue
+            while len(self._columns) <= index:
+                self._columns.append(_column_letter(len(self._columns)))
+            ref = f'{self._columns[index]}{row_number}'
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            else:
+                text = escape(_ILLEGAL_XML_CHARS_RE.sub('', str(value)))
+                cells.append(f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+        self._sheet.write(f'<row r="{row_number}">{"".join(cells)}</row>'.encode('utf-8'))
+
+    def close(self):
+        if self._sheet is not None:
+            self._sheet.write(b'</sheetData></worksheet>')
+            self._sheet.close()
+            self._sheet = None
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()